@@ -0,0 +1,64 @@
+# src/CRUD/migrations/unique_periodo.py
+"""
+Adiciona as restrições únicas (area_id, periodo_inicio, periodo_fim) de metricas e
+metricas_solo em bancos criados antes delas: Base.metadata.create_all não altera
+tabelas que já existem, e sem a restrição o INSERT ... ON CONFLICT do fill_missing
+não tem alvo. Linhas duplicadas de um mesmo período são removidas antes (fica a de
+menor id). Idempotente: tabelas que já têm a restrição são puladas.
+
+Uso (a partir de backend/):
+    python -m CRUD.migrations.unique_periodo            # aplica
+    python -m CRUD.migrations.unique_periodo --dry-run  # só conta as duplicatas
+"""
+import sys
+from typing import Dict
+
+from sqlalchemy import text
+
+from CRUD.database import engine
+
+# tabela -> nome da restrição (o mesmo de __table_args__ em CRUD/models.py)
+CONSTRAINTS = {
+    "metricas": "uq_metricas_area_periodo",
+    "metricas_solo": "uq_metricas_solo_area_periodo",
+}
+
+_DUPLICATES = """
+    SELECT count(*) FROM {table} a
+    WHERE EXISTS (SELECT 1 FROM {table} b
+                  WHERE b.area_id = a.area_id AND b.periodo_inicio = a.periodo_inicio
+                    AND b.periodo_fim = a.periodo_fim AND b.id < a.id)
+"""
+_DEDUPE = """
+    DELETE FROM {table} a USING {table} b
+    WHERE a.area_id = b.area_id AND a.periodo_inicio = b.periodo_inicio
+      AND a.periodo_fim = b.periodo_fim AND a.id > b.id
+"""
+
+
+def migrate(dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """Por tabela: {"duplicates": linhas removidas (ou a remover), "added": 1 se a restrição foi criada}."""
+    out: Dict[str, Dict[str, int]] = {}
+    for table, name in CONSTRAINTS.items():
+        # uma transação por tabela: o lock impede INSERTs entre a limpeza e o ALTER TABLE
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}).first()
+            if exists:
+                out[table] = {"duplicates": 0, "added": 0}
+                continue
+            if dry_run:
+                out[table] = {"duplicates": conn.execute(text(_DUPLICATES.format(table=table))).scalar(), "added": 0}
+                continue
+            conn.execute(text(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE"))
+            removed = conn.execute(text(_DEDUPE.format(table=table))).rowcount
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+                              f"UNIQUE (area_id, periodo_inicio, periodo_fim)"))
+            out[table] = {"duplicates": removed, "added": 1}
+    return out
+
+
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv[1:]
+    for table, counts in migrate(dry_run).items():
+        action = "duplicatas" if dry_run else "duplicatas removidas"
+        print(f"{table}: {counts['duplicates']} {action}, restrição {'criada' if counts['added'] else 'inalterada'}")
@@ -1,5 +1,5 @@
 # backend/CRUD/models.py
-from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, DECIMAL, Date, Text, Boolean
+from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, DECIMAL, Date, Text, Boolean, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, Mapped, mapped_column
@@ -73,6 +73,10 @@ class Area(Base):
 
 class Metricas(Base):
     __tablename__ = "metricas"
+    # um registro por área e período (fill_missing grava com ON CONFLICT DO NOTHING)
+    __table_args__ = (
+        UniqueConstraint("area_id", "periodo_inicio", "periodo_fim", name="uq_metricas_area_periodo"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     area_id: Mapped[int] = mapped_column(Integer, ForeignKey("area.id", ondelete="CASCADE"), nullable=False)
@@ -168,6 +172,10 @@ class MetricasPreditivas(Base):
 
 class MetricasSolo(Base):
     __tablename__ = "metricas_solo"
+    # um registro por área e período (fill_missing grava com ON CONFLICT DO NOTHING)
+    __table_args__ = (
+        UniqueConstraint("area_id", "periodo_inicio", "periodo_fim", name="uq_metricas_solo_area_periodo"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     area_id: Mapped[int] = mapped_column(Integer, ForeignKey("area.id", ondelete="CASCADE"), nullable=False)
@@ -215,6 +223,35 @@ class MetricasSolo(Base):
             f"<MetricasSolo id={self.id} area_id={self.area_id} "
             f"periodo=({self.periodo_inicio} → {self.periodo_fim})>"
         )
+
+
+class SoloArmazenado(Base):
+    """
+    Métricas de solo (estáticas) por geometria: calculadas uma vez e reaproveitadas
+    por todos os períodos, relatórios e áreas com o mesmo contorno.
+    """
+    __tablename__ = "solo_armazenado"
+    __table_args__ = (
+        UniqueConstraint("geometria_hash", "escala", "versao_dataset", name="uq_solo_armazenado_chave"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    geometria_hash: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    escala: Mapped[int] = mapped_column(Integer, nullable=False)
+    versao_dataset: Mapped[str] = mapped_column(String(200), nullable=False)
+    metricas: Mapped[Dict] = mapped_column(JSONB, nullable=False)  # {depth: {clay_mean, clay_min, clay_max}}
+    data_criacao: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False), server_default=func.now())
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __repr__(self):
+        return (
+            f"<SoloArmazenado id={self.id} hash={self.geometria_hash[:12]} "
+            f"escala={self.escala} versao='{self.versao_dataset}'>"
+        )
+
+
 class Relatorio(Base):
     __tablename__ = "relatorio"
 
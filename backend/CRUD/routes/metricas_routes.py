@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 from CRUD.database import SessionLocal, engine, get_db
 from CRUD.models import Base, Metricas
-from CRUD.services.metrics_manager import fill_missing_periodic_metrics
+from CRUD.services.metrics_manager import fill_missing_periodic_metrics, DEFAULT_MAX_CONCURRENCY
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import date
 
@@ -365,7 +365,9 @@ def fill_missing_metrics():
       - soil_depth (str, opcional) -> profundidade padrão para chamadas unitárias (caso necessário)
       - soil_scale (int, opcional)
       - soil_url (str, opcional) -> override da URL do serviço de solo
+      - max_concurrency (int, opcional, default=1) -> chamadas simultâneas ao serviço de métricas (1 = sequencial)
     Ele verifica quais janelas periódicas estão faltando para a área e insere somente os períodos faltantes.
+    Com include_soil_metrics, o resumo inclui "soil_store" (hit/fingerprint do cache de solo por geometria).
     """
     data = request.get_json()
     if not data:
@@ -385,6 +387,7 @@ def fill_missing_metrics():
         soil_depth = data.get("soil_depth", "0-5cm")
         soil_scale = int(data.get("soil_scale", 250))
         soil_url = data.get("soil_url", None)
+        max_concurrency = int(data.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
 
         summary = fill_missing_periodic_metrics(
             area_id=area_id,
@@ -395,7 +398,8 @@ def fill_missing_metrics():
             include_soil_metrics=include_soil_metrics,
             soil_depth=soil_depth,
             soil_scale=soil_scale,
-            soil_url=soil_url
+            soil_url=soil_url,
+            max_concurrency=max_concurrency
         )
         return jsonify(summary), 200
     except ValueError as ve:
@@ -0,0 +1,76 @@
+# src/CRUD/services/bench_http_client.py
+"""
+Backfill de `chunks` POSTs contra um stub HTTP/1.1 local: requests.post avulso
+(uma conexão TCP por chamada) x http_client.post_json (pool compartilhado e
+geometria serializada uma vez). Conta as conexões aceitas pelo stub.
+
+    python bench_http_client.py [n_chunks]     (a partir de CRUD/services, sem banco)
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+import requests
+
+from http_client import post_json, serialize_geometry
+
+
+def _benchmark(chunks: int = 37) -> Dict[str, Any]:
+    """
+    Backfill de `chunks` POSTs contra um stub HTTP/1.1 local: requests.post avulso
+    (uma conexão por chamada) x pool compartilhado. Conta as conexões TCP aceitas.
+    """
+    connections = []
+
+    class Stub(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers e corpo saem em writes separados
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            out = b'{"metrics":{"NDVI_mean":0.5}}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/compute"
+    ring = [[-47.0 + i * 1e-4, -15.0 + (i % 7) * 1e-4] for i in range(5000)]
+    geometry = {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+
+    out: Dict[str, Any] = {"chunks": chunks}
+    try:
+        del connections[:]
+        started = time.perf_counter()
+        for i in range(chunks):
+            requests.post(url, json={"geometry": geometry, "start_date": f"chunk-{i}"}, timeout=10)
+        out["requests_post"] = {"connections": len(connections), "seconds": round(time.perf_counter() - started, 3)}
+
+        del connections[:]
+        started = time.perf_counter()
+        geometry_json = serialize_geometry(geometry)
+        for i in range(chunks):
+            post_json(url, {"start_date": f"chunk-{i}"}, geometry_json=geometry_json, timeout=10)
+        out["pooled"] = {"connections": len(connections), "seconds": round(time.perf_counter() - started, 3)}
+    finally:
+        server.shutdown()
+    return out
+
+
+
+if __name__ == "__main__":
+    # uso: python bench_http_client.py [n_chunks]
+    print(json.dumps(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 37), indent=2))
@@ -0,0 +1,92 @@
+# src/CRUD/services/http_client.py
+"""
+Cliente HTTP compartilhado para os serviços de métricas (/compute e /clay).
+
+Uma requests.Session por URL base, com pool de conexões keep-alive e política de
+retry (429/503 com backoff exponencial e Retry-After) configurados aqui. As
+threads do fill_missing reaproveitam as mesmas conexões em vez de abrir uma
+conexão TCP por chamada. A geometria de uma área é serializada uma vez
+(serialize_geometry) e colada nos corpos de cada chunk; corpos grandes podem ir
+comprimidos com gzip (os serviços de métricas aceitam Content-Encoding: gzip).
+"""
+import gzip
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# conexões mantidas por URL base (>= max_concurrency do fill_missing)
+POOL_SIZE = int(os.getenv("METRICS_HTTP_POOL_SIZE", "16"))
+# retry quando os serviços de métricas respondem 429 (cota do EE) ou 503 (EE iniciando)
+RETRY_STATUS = (429, 503)
+MAX_RETRIES = int(os.getenv("METRICS_HTTP_MAX_RETRIES", "4"))
+BACKOFF_FACTOR = 2.0
+BACKOFF_MAX = 60.0
+# corpos maiores que isso vão com gzip (0 desativa)
+GZIP_MIN_BYTES = int(os.getenv("METRICS_HTTP_GZIP_MIN_BYTES", "65536"))
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _retry_policy() -> Retry:
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,  # um /compute que estourou o timeout não é repetido às cegas
+        status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=BACKOFF_FACTOR,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # devolve a última resposta (429/503) para o chamador tratar
+    )
+    # urllib3 >= 2 limita o backoff por instância; em 1.x o teto é fixo (120 s)
+    if hasattr(retry, "backoff_max"):
+        retry.backoff_max = BACKOFF_MAX
+    return retry
+
+
+def get_session(url: str) -> requests.Session:
+    """Session (thread-safe para POSTs simples) do scheme://host:porta de url, criada na primeira vez."""
+    parts = urlsplit(url)
+    base = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(base)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=_retry_policy(),
+                                  pool_block=True)
+            session.mount(base, adapter)
+            _sessions[base] = session
+        return session
+
+
+def serialize_geometry(geometry: Any) -> str:
+    """JSON da geometria, gerado uma vez por área e reutilizado em todos os corpos (json_body)."""
+    return json.dumps(geometry, separators=(",", ":"))
+
+
+def json_body(fields: Dict[str, Any], geometry_json: Optional[str] = None) -> bytes:
+    """Corpo JSON com os campos e, se dada, a geometria já serializada (sem re-serializá-la)."""
+    body = json.dumps(fields, separators=(",", ":"))
+    if geometry_json is not None:
+        body = '{"geometry":' + geometry_json + ("," + body[1:] if fields else "}")
+    return body.encode("utf-8")
+
+
+def post_json(url: str, payload: Optional[Dict[str, Any]] = None, geometry_json: Optional[str] = None,
+              timeout: float = 120, gzip_min_bytes: int = GZIP_MIN_BYTES) -> requests.Response:
+    """POST JSON pelo pool de url; 429/503 são repetidos pela política do adapter."""
+    body = json_body(payload or {}, geometry_json)
+    headers = {"Content-Type": "application/json"}
+    if gzip_min_bytes and len(body) >= gzip_min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return get_session(url).post(url, data=body, headers=headers, timeout=timeout)
+
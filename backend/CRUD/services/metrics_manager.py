@@ -1,11 +1,13 @@
 # src/CRUD/services/metrics_manager.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Any, Optional
-import requests
-
+from typing import List, Dict, Any, Optional, Tuple
 from CRUD.database import SessionLocal
 from CRUD.models import Area, Metricas, MetricasSolo
-from sqlalchemy import and_
+from CRUD.services import http_client, soil_store
+from sqlalchemy import and_, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # URL do endpoint local que implementa o cálculo (ajuste se necessário)
 COMPUTE_URL = "http://127.0.0.1:8000/compute"
@@ -14,6 +16,17 @@ CLAY_URL = "http://127.0.0.1:8001/clay"
 # timeout para requests (segundos) — ajuste de acordo com sua infra
 REQUEST_TIMEOUT = 120
 
+# chamadas HTTP simultâneas ao /compute por execução de fill_missing (1 = sequencial, como antes;
+# valores maiores são opt-in por chamada/requisição)
+DEFAULT_MAX_CONCURRENCY = 1
+MAX_CONCURRENCY_LIMIT = 16
+# chunks gravados por INSERT multi-linha (uma transação por lote)
+WRITE_BATCH_SIZE = 50
+# chave única de Metricas/MetricasSolo (alvo do ON CONFLICT); tabela -> restrição presente no banco
+PERIODO_KEY = ["area_id", "periodo_inicio", "periodo_fim"]
+_periodo_constraint: Dict[str, bool] = {}
+_periodo_constraint_lock = threading.Lock()
+
 # profundidades que o serviço clay suporta — ordem fixa
 SOIL_DEPTHS = ["0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"]
 
@@ -81,25 +94,27 @@ def _metrics_from_compute_response(resp_json: Dict[str, Any]) -> Dict[str, Any]:
         out[dest] = val
     return out
 
-def _call_clay_api(geometry: Any, depth: str = "0-5cm", scale: int = 250, soil_url: str = CLAY_URL, timeout: int = REQUEST_TIMEOUT) -> Dict[str, Optional[float]]:
+def _call_clay_api_depths(geometry: Any, depths: Any = "all", scale: int = 250, soil_url: str = CLAY_URL,
+                          timeout: int = REQUEST_TIMEOUT,
+                          geometry_json: Optional[str] = None) -> Dict[str, Dict[str, Optional[float]]]:
     """
-    Chama o endpoint /clay para obter métricas de argila para UMA profundidade.
-    Retorna dicionário com keys: clay_mean, clay_min, clay_max (float ou None)
+    Chama o endpoint /clay UMA vez para várias profundidades ("all" ou lista).
+    Retorna {depth: {clay_mean, clay_min, clay_max}}; profundidades ausentes na resposta vêm com None.
     """
 
     if not soil_url:
         soil_url = CLAY_URL
 
     payload = {
-        "geometry": geometry,
-        "depth": depth,
+        "depths": depths,
         "scale": scale
     }
-    r = requests.post(soil_url, json=payload, timeout=timeout)
+    r = http_client.post_json(soil_url, payload,
+                              geometry_json=geometry_json or http_client.serialize_geometry(geometry),
+                              timeout=timeout)
     if r.status_code != 200:
         raise RuntimeError(f"Clay API retornou status {r.status_code}: {r.text}")
-    resp_json = r.json()
-    metrics = resp_json.get("metrics", {})
+    by_depth = r.json().get("metrics", {})
 
     def _safe_float(v):
         try:
@@ -107,28 +122,57 @@ def _call_clay_api(geometry: Any, depth: str = "0-5cm", scale: int = 250, soil_u
         except Exception:
             return None
 
-    # suporte a chaves diferentes que o service pode retornar
-    # preferimos CLAY_mean_% mas aceitamos clay_pct_mean
-    clay_mean = _safe_float(metrics.get("CLAY_mean_%") if "CLAY_mean_%" in metrics else metrics.get("clay_pct_mean") or metrics.get("clay_mean"))
-    clay_min  = _safe_float(metrics.get("CLAY_min_%")  if "CLAY_min_%" in metrics else metrics.get("clay_pct_min") or metrics.get("clay_min"))
-    clay_max  = _safe_float(metrics.get("CLAY_max_%")  if "CLAY_max_%" in metrics else metrics.get("clay_pct_max") or metrics.get("clay_max"))
+    wanted = SOIL_DEPTHS if depths == "all" else list(depths)
+    out: Dict[str, Dict[str, Optional[float]]] = {}
+    for depth in wanted:
+        m = by_depth.get(depth) or {}
+        out[depth] = {
+            "clay_mean": _safe_float(m.get("CLAY_mean_%")),
+            "clay_min": _safe_float(m.get("CLAY_min_%")),
+            "clay_max": _safe_float(m.get("CLAY_max_%")),
+        }
+    return out
 
-    return {
-        "clay_mean": clay_mean,
-        "clay_min": clay_min,
-        "clay_max": clay_max
+def _fetch_chunk_metrics(geometry_json: str, s: date, e: date, collection: str) -> Dict[str, Any]:
+    """
+    Só HTTP (roda nas threads do pool): chama o /compute para um chunk.
+    geometry_json é a geometria da área já serializada (http_client.serialize_geometry).
+    Retorna {"metrics": ...} ou {"error": {...}} no mesmo formato dos erros do resumo.
+    """
+    payload = {
+        "start_date": s.isoformat(),
+        "end_date": e.isoformat(),
+        "collection": collection,
+        "timeseries": False,
     }
+    try:
+        r = http_client.post_json(COMPUTE_URL, payload, geometry_json=geometry_json, timeout=REQUEST_TIMEOUT)
+        if r.status_code != 200:
+            return {"error": {"start": str(s), "end": str(e), "status_code": r.status_code, "body": r.text}}
+        return {"metrics": _metrics_from_compute_response(r.json())}
+    except Exception as exc:
+        return {"error": {"start": str(s), "end": str(e), "error": str(exc)}}
 
 def fill_missing_periodic_metrics(area_id: int, start_date_str: str, end_date_str: str, period_days: int = 10,
                                   collection: str = "SENTINEL2", cloudy_threshold: int = 70,
                                   include_soil_metrics: bool = False, soil_depth: str = "0-5cm",
-                                  soil_scale: int = 250, soil_url: str = CLAY_URL) -> Dict[str, Any]:
+                                  soil_scale: int = 250, soil_url: str = CLAY_URL,
+                                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Insere as métricas dos períodos faltantes da área. As chamadas ao /compute rodam em até
+    max_concurrency threads; leituras/escritas no banco ficam na thread chamadora (uma session),
+    na ordem dos chunks, então o resumo é o mesmo de uma execução sequencial.
+    Com include_soil_metrics o resumo ganha "soil_store" ({"hit", "fingerprint"}: métricas de solo
+    vindas do cache por geometria ou recém-calculadas); falhas do /clay entram em "errors" por
+    chunk e profundidade ({"start", "end", "depth", "soil_error"}).
+    """
     start_date_py = datetime.fromisoformat(start_date_str).date()
     end_date_py = datetime.fromisoformat(end_date_str).date()
     if start_date_py > end_date_py:
         raise ValueError("start_date maior que end_date")
     
     soil_url = soil_url or CLAY_URL
+    max_concurrency = max(1, min(int(max_concurrency or 1), MAX_CONCURRENCY_LIMIT))
 
     chunks = _chunks_from_range(start_date_py, end_date_py, period_days)
 
@@ -173,104 +217,190 @@ def fill_missing_periodic_metrics(area_id: int, start_date_str: str, end_date_st
             raise ValueError(f"Area id={area_id} não encontrada.")
 
         geometry = area.coordenada
+        # serializada uma vez; cada chunk só acrescenta as datas ao corpo
+        geometry_json = http_client.serialize_geometry(geometry)
 
+        # 1) chunks faltantes: uma consulta carrega todos os períodos já gravados da área no intervalo
+        existing = _existing_periods(db, Metricas, area_id, start_date_py, end_date_py)
+        missing = []
         for ch in chunks:
             s = ch["start"]
             e = ch["end"]
-
-            # verifica existência nas metricas de vegetação
-            exists = db.query(Metricas).filter(
-                and_(Metricas.area_id == area_id,
-                     Metricas.periodo_inicio == s,
-                     Metricas.periodo_fim == e)
-            ).first()
-            if exists:
-                result["already_exists_metricas"].append({"start": str(s), "end": str(e), "id": exists.id})
-                continue
-
-            # chama compute para métricas de satélite
-            payload = {
-                "geometry": geometry,
-                "start_date": s.isoformat(),
-                "end_date": e.isoformat(),
-                "collection": collection,
-                "timeseries": False,
-            }
-            try:
-                r = requests.post(COMPUTE_URL, json=payload, timeout=REQUEST_TIMEOUT)
-                if r.status_code != 200:
-                    result["errors"].append({"start": str(s), "end": str(e), "status_code": r.status_code, "body": r.text})
-                    continue
-                resp_json = r.json()
-            except Exception as exc:
-                result["errors"].append({"start": str(s), "end": str(e), "error": str(exc)})
-                continue
-
-            metric_values = _metrics_from_compute_response(resp_json)
-
-            # prepare insert kwargs for Metricas (only columns present)
-            insert_kwargs: Dict[str, Any] = {"area_id": area_id, "periodo_inicio": s, "periodo_fim": e}
-            for k, v in metric_values.items():
-                if k in available_cols:
-                    insert_kwargs[k] = v
-
-            # create Metricas entry
-            try:
-                nova = Metricas(**insert_kwargs)
-                db.add(nova)
-                db.commit()
-                db.refresh(nova)
-                result["inserted_metricas"].append({"start": str(s), "end": str(e), "id": nova.id})
-            except Exception as exc:
-                db.rollback()
-                result["errors"].append({"start": str(s), "end": str(e), "error": str(exc), "insert_kwargs": insert_kwargs})
+            if (s, e) in existing:
+                result["already_exists_metricas"].append({"start": str(s), "end": str(e), "id": existing[(s, e)]})
                 continue
+            missing.append(ch)
 
-            # if requested, collect soil metrics for ALL depths and insert a single MetricasSolo row (if not exists)
-            if include_soil_metrics:
-                soil_aggregated: Dict[str, Dict[str, Optional[float]]] = {}
-                for depth in SOIL_DEPTHS:
-                    try:
-                        v = _call_clay_api(geometry=geometry, depth=depth, scale=soil_scale, soil_url=soil_url, timeout=REQUEST_TIMEOUT)
-                        soil_aggregated[depth] = v
-                    except Exception as exc:
-                        # register error and continue collecting other depths
-                        result["errors"].append({"start": str(s), "end": str(e), "depth": depth, "soil_error": str(exc)})
-                        soil_aggregated[depth] = {"clay_mean": None, "clay_min": None, "clay_max": None}
-
-                # only create MetricasSolo if not exists
+        # solo é estático: busca/calcula uma vez por geometria e reaproveita em todos os chunks,
+        # e só quando algum chunk (faltante ou já com Metricas) ainda não tem linha de MetricasSolo
+        soil_aggregated: Optional[Dict[str, Dict[str, Optional[float]]]] = None
+        soil_error: Optional[str] = None
+        existing_solo: Dict[Tuple[date, date], int] = {}
+        solo_backfill: List[Tuple[date, date]] = []
+        if include_soil_metrics:
+            existing_solo = _existing_periods(db, MetricasSolo, area_id, start_date_py, end_date_py)
+            solo_backfill = [(ch["start"], ch["end"]) for ch in chunks
+                             if (ch["start"], ch["end"]) in existing and (ch["start"], ch["end"]) not in existing_solo]
+            if solo_backfill or any((ch["start"], ch["end"]) not in existing_solo for ch in missing):
                 try:
-                    exists_solo = db.query(MetricasSolo).filter(
-                        and_(MetricasSolo.area_id == area_id,
-                             MetricasSolo.periodo_inicio == s,
-                             MetricasSolo.periodo_fim == e)
-                    ).first()
-                    if exists_solo:
-                        result["already_exists_solo"].append({"start": str(s), "end": str(e), "id": exists_solo.id})
-                    else:
-                        # build solo_kwargs including only columns present in the model
-                        solo_kwargs: Dict[str, Any] = {"area_id": area_id, "periodo_inicio": s, "periodo_fim": e}
-                        for depth, vals in soil_aggregated.items():
-                            prefix = DEPTH_TO_COL_PREFIX.get(depth)
-                            if not prefix:
-                                continue
-                            # map mean/min/max into columns like clay_0_5_mean etc.
-                            column_mean = f"{prefix}_mean"
-                            column_min = f"{prefix}_min"
-                            column_max = f"{prefix}_max"
-                            if column_mean in available_solo_cols:
-                                solo_kwargs[column_mean] = vals.get("clay_mean")
-                            if column_min in available_solo_cols:
-                                solo_kwargs[column_min] = vals.get("clay_min")
-                            if column_max in available_solo_cols:
-                                solo_kwargs[column_max] = vals.get("clay_max")
-
-                        solo = MetricasSolo(**solo_kwargs)
-                        db.add(solo)
-                        db.commit()
-                        db.refresh(solo)
-                        result["inserted_solo"].append({"start": str(s), "end": str(e), "id": solo.id})
+                    soil_aggregated, from_store = soil_store.get_or_compute(
+                        db, geometry, soil_scale,
+                        lambda: _call_clay_api_depths(geometry=geometry, depths="all", scale=soil_scale,
+                                                      soil_url=soil_url, timeout=REQUEST_TIMEOUT,
+                                                      geometry_json=geometry_json))
+                    result["soil_store"] = {"hit": from_store,
+                                            "fingerprint": soil_store.geometry_fingerprint(geometry)}
                 except Exception as exc:
-                    db.rollback()
-                    result["errors"].append({"start": str(s), "end": str(e), "soil_insert_error": str(exc)})
+                    # sem métricas de solo nesta execução; os chunks ficam sem MetricasSolo e a próxima
+                    # execução com include_soil_metrics os completa (via solo_backfill)
+                    soil_error = str(exc)
+
+        # chunks que já tinham Metricas mas não MetricasSolo (ex.: falha do /clay numa execução anterior)
+        if solo_backfill:
+            if soil_aggregated is not None:
+                _insert_solo_backfill(db, result, area_id, solo_backfill, soil_aggregated, available_solo_cols)
+            elif soil_error is not None:
+                for s, e in solo_backfill:
+                    _soil_errors(result, s, e, soil_error)
+
+        # 2) chamadas ao /compute em paralelo; 3) escritas em lote (INSERT multi-linha), na ordem dos chunks
+        pending: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="fill-missing") as pool:
+            futures = [pool.submit(_fetch_chunk_metrics, geometry_json, ch["start"], ch["end"], collection)
+                       for ch in missing]
+            for ch, fut in zip(missing, futures):
+                fetched = fut.result()
+                if "error" in fetched:
+                    result["errors"].append(fetched["error"])
+                    continue
+                row: Dict[str, Any] = {"area_id": area_id, "periodo_inicio": ch["start"], "periodo_fim": ch["end"]}
+                for k, v in fetched["metrics"].items():
+                    if k in available_cols:
+                        row[k] = v
+                pending.append(row)
+                if len(pending) >= WRITE_BATCH_SIZE:
+                    _insert_batch(db, result, area_id, pending, soil_aggregated, existing_solo, available_solo_cols,
+                                  soil_error)
+                    pending = []
+            if pending:
+                _insert_batch(db, result, area_id, pending, soil_aggregated, existing_solo, available_solo_cols,
+                              soil_error)
     return result
+
+def _existing_periods(db, model, area_id: int, start: date, end: date) -> Dict[Tuple[date, date], int]:
+    """{(periodo_inicio, periodo_fim): id} de todas as linhas da área dentro do intervalo, numa só consulta."""
+    rows = db.query(model.id, model.periodo_inicio, model.periodo_fim).filter(
+        and_(model.area_id == area_id,
+             model.periodo_inicio >= start,
+             model.periodo_fim <= end)
+    ).all()
+    return {(r.periodo_inicio, r.periodo_fim): r.id for r in rows}
+
+def _has_periodo_constraint(db, model) -> bool:
+    """
+    A tabela tem restrição/índice único em (area_id, periodo_inicio, periodo_fim)? Bancos
+    criados antes dela não têm (create_all não altera tabelas existentes) até rodar
+    CRUD/migrations/unique_periodo.py. Verificado uma vez por tabela e processo.
+    """
+    table = model.__tablename__
+    with _periodo_constraint_lock:
+        if table not in _periodo_constraint:
+            insp = inspect(db.connection())
+            uniques = [c["column_names"] for c in insp.get_unique_constraints(table)]
+            uniques += [i["column_names"] for i in insp.get_indexes(table) if i.get("unique")]
+            found = any(sorted(cols) == sorted(PERIODO_KEY) for cols in uniques)
+            if not found:
+                print(f"Aviso: {table} sem restrição única {PERIODO_KEY}; gravando sem ON CONFLICT "
+                      f"(rode python -m CRUD.migrations.unique_periodo e reinicie)")
+            _periodo_constraint[table] = found
+        return _periodo_constraint[table]
+
+def _bulk_insert(db, model, rows: List[Dict[str, Any]]) -> Dict[Tuple[date, date], int]:
+    """
+    INSERT ... ON CONFLICT (area_id, periodo_inicio, periodo_fim) DO NOTHING RETURNING.
+    Retorna {(inicio, fim): id} das linhas realmente inseridas (as em conflito ficam de fora).
+    Sem a restrição única no banco, é um INSERT simples: as linhas já foram filtradas pela
+    consulta de _existing_periods, como antes do ON CONFLICT.
+    """
+    stmt = pg_insert(model).values(rows)
+    if _has_periodo_constraint(db, model):
+        stmt = stmt.on_conflict_do_nothing(index_elements=PERIODO_KEY)
+    stmt = stmt.returning(model.id, model.periodo_inicio, model.periodo_fim)
+    return {(r.periodo_inicio, r.periodo_fim): r.id for r in db.execute(stmt)}
+
+def _solo_row(area_id: int, s: date, e: date, soil_aggregated: Dict[str, Dict[str, Optional[float]]],
+              available_solo_cols: set) -> Dict[str, Any]:
+    # build solo kwargs including only columns present in the model (clay_0_5_mean etc.)
+    row: Dict[str, Any] = {"area_id": area_id, "periodo_inicio": s, "periodo_fim": e}
+    for depth, vals in soil_aggregated.items():
+        prefix = DEPTH_TO_COL_PREFIX.get(depth)
+        if not prefix:
+            continue
+        for stat in ("mean", "min", "max"):
+            column = f"{prefix}_{stat}"
+            if column in available_solo_cols:
+                row[column] = vals.get(f"clay_{stat}")
+    return row
+
+def _insert_batch(db, result: Dict[str, Any], area_id: int, rows: List[Dict[str, Any]],
+                  soil_aggregated: Optional[Dict[str, Dict[str, Optional[float]]]],
+                  existing_solo: Dict[Tuple[date, date], int], available_solo_cols: set,
+                  soil_error: Optional[str] = None) -> None:
+    """Grava um lote de Metricas (e as MetricasSolo correspondentes) numa transação; registra o desfecho em result."""
+    periods = [(row["periodo_inicio"], row["periodo_fim"]) for row in rows]
+    try:
+        inserted = _bulk_insert(db, Metricas, rows)
+        solo_rows = []
+        if soil_aggregated is not None:
+            solo_rows = [_solo_row(area_id, s, e, soil_aggregated, available_solo_cols)
+                         for s, e in periods if (s, e) in inserted and (s, e) not in existing_solo]
+        inserted_solo = _bulk_insert(db, MetricasSolo, solo_rows) if solo_rows else {}
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        for s, e in periods:
+            result["errors"].append({"start": str(s), "end": str(e), "error": str(exc)})
+        return
+
+    # linhas em conflito foram gravadas por outra execução entre a consulta e o INSERT
+    conflicts = [p for p in periods if p not in inserted]
+    raced = _existing_periods(db, Metricas, area_id, min(conflicts)[0], max(p[1] for p in conflicts)) if conflicts else {}
+    for s, e in periods:
+        if (s, e) in inserted:
+            result["inserted_metricas"].append({"start": str(s), "end": str(e), "id": inserted[(s, e)]})
+        else:
+            result["already_exists_metricas"].append({"start": str(s), "end": str(e), "id": raced.get((s, e))})
+            continue
+        if soil_aggregated is None:
+            if soil_error is not None and (s, e) not in existing_solo:
+                _soil_errors(result, s, e, soil_error)
+            continue
+        if (s, e) in inserted_solo:
+            result["inserted_solo"].append({"start": str(s), "end": str(e), "id": inserted_solo[(s, e)]})
+        else:
+            result["already_exists_solo"].append({"start": str(s), "end": str(e), "id": existing_solo.get((s, e))})
+
+def _soil_errors(result: Dict[str, Any], s: date, e: date, error: str) -> None:
+    # uma entrada por chunk e profundidade, como quando o /clay era chamado por profundidade
+    for depth in SOIL_DEPTHS:
+        result["errors"].append({"start": str(s), "end": str(e), "depth": depth, "soil_error": error})
+
+def _insert_solo_backfill(db, result: Dict[str, Any], area_id: int, periods: List[Tuple[date, date]],
+                          soil_aggregated: Dict[str, Dict[str, Optional[float]]], available_solo_cols: set) -> None:
+    """Grava MetricasSolo dos períodos que já têm Metricas, em lotes de WRITE_BATCH_SIZE; registra o desfecho em result."""
+    for i in range(0, len(periods), WRITE_BATCH_SIZE):
+        batch = periods[i:i + WRITE_BATCH_SIZE]
+        try:
+            inserted_solo = _bulk_insert(db, MetricasSolo, [_solo_row(area_id, s, e, soil_aggregated, available_solo_cols)
+                                                            for s, e in batch])
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            for s, e in batch:
+                result["errors"].append({"start": str(s), "end": str(e), "soil_insert_error": str(exc)})
+            continue
+        for s, e in batch:
+            if (s, e) in inserted_solo:
+                result["inserted_solo"].append({"start": str(s), "end": str(e), "id": inserted_solo[(s, e)]})
+            else:
+                result["already_exists_solo"].append({"start": str(s), "end": str(e), "id": None})
@@ -0,0 +1,92 @@
+# src/CRUD/services/soil_store.py
+"""
+Armazém permanente das métricas de solo.
+
+O OpenLandMap é estático: as métricas de argila de uma geometria não mudam entre
+períodos. Elas ficam na tabela solo_armazenado, indexadas por
+(hash da geometria, escala, versão do dataset), e são calculadas no serviço /clay
+apenas na primeira vez. Alterar Area.coordenada muda o hash, então a área passa
+a usar (ou calcular) outra entrada — essa é a única invalidação necessária.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from CRUD.models import SoloArmazenado
+
+# troque (ou defina SOIL_DATASET_VERSION) quando o asset do OpenLandMap mudar de versão
+SOIL_DATASET_VERSION = os.getenv("SOIL_DATASET_VERSION", "OpenLandMap/SOL/SOL_CLAY-WFRACTION_USDA-3A1A1A_M/v02")
+# casas decimais mantidas no hash (~1 cm): diferenças de ponto flutuante não geram outra entrada
+FINGERPRINT_DECIMALS = 7
+
+
+def _round_coords(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return [_round_coords(v) for v in value]
+    if isinstance(value, float):
+        return round(value, FINGERPRINT_DECIMALS)
+    return value
+
+
+def geometry_fingerprint(geometry: Any) -> str:
+    """sha256 do GeoJSON canônico (Feature/FeatureCollection -> geometria, coordenadas arredondadas)."""
+    if isinstance(geometry, str):
+        geometry = json.loads(geometry)
+    if isinstance(geometry, dict) and geometry.get("type") == "Feature":
+        geometry = geometry.get("geometry")
+    elif isinstance(geometry, dict) and geometry.get("type") == "FeatureCollection":
+        geometry = {"type": "GeometryCollection",
+                    "geometries": [f.get("geometry") for f in geometry.get("features", [])]}
+    canonical = json.dumps(_canonical(geometry), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _canonical(geometry: Any) -> Any:
+    if not isinstance(geometry, dict):
+        return geometry
+    out = {"type": geometry.get("type")}
+    if "coordinates" in geometry:
+        out["coordinates"] = _round_coords(geometry["coordinates"])
+    if "geometries" in geometry:
+        out["geometries"] = [_canonical(g) for g in geometry["geometries"]]
+    return out
+
+
+def lookup(db: Session, fingerprint: str, scale: int,
+           dataset_version: str = SOIL_DATASET_VERSION) -> Optional[SoloArmazenado]:
+    return db.query(SoloArmazenado).filter(
+        and_(SoloArmazenado.geometria_hash == fingerprint,
+             SoloArmazenado.escala == scale,
+             SoloArmazenado.versao_dataset == dataset_version)
+    ).first()
+
+
+def get_or_compute(db: Session, geometry: Any, scale: int, compute: Callable[[], Dict[str, Any]],
+                   dataset_version: str = SOIL_DATASET_VERSION) -> Tuple[Dict[str, Any], bool]:
+    """
+    Métricas de solo da geometria: do armazém se existirem, senão compute() (uma chamada
+    ao /clay) e grava. Retorna (métricas por profundidade, veio_do_armazem).
+    Erros de compute() são propagados e nada é gravado.
+    """
+    fingerprint = geometry_fingerprint(geometry)
+    stored = lookup(db, fingerprint, scale, dataset_version)
+    if stored:
+        return stored.metricas, True
+
+    metrics = compute()
+    try:
+        db.add(SoloArmazenado(geometria_hash=fingerprint, escala=scale,
+                              versao_dataset=dataset_version, metricas=metrics))
+        db.commit()
+    except IntegrityError:
+        # outra requisição gravou a mesma chave primeiro; usa a dela
+        db.rollback()
+        stored = lookup(db, fingerprint, scale, dataset_version)
+        if stored:
+            return stored.metricas, False
+    return metrics, False
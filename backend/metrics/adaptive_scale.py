@@ -0,0 +1,112 @@
+# adaptive_scale.py
+"""
+Adaptive scale/tileScale for reduceRegion in agro_metrics.py and soil_metrics.py.
+
+The reduction scale starts at the dataset's native resolution and is coarsened
+only when the polygon would cover more pixels than the budget; tileScale grows
+with the pixel count and the vertex count. If EE still fails with a memory or
+timeout error, the request is retried with the next, coarser setting of the
+plan. The setting that succeeded is reported back so responses can record the
+effective scale.
+"""
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+MAX_TILE_SCALE = 16
+
+# substrings of EE errors that a coarser scale / larger tileScale can fix
+RESOURCE_ERRORS = (
+    "memory limit",
+    "timed out",
+    "timeout",
+    "too many pixels",
+    "too large",
+)
+
+
+def target_pixels() -> float:
+    """Pixels por redução acima dos quais a escala nativa é engrossada (lido a cada chamada, após o load_dotenv)."""
+    return float(os.getenv("ADAPTIVE_TARGET_PIXELS", "2e7"))
+
+
+def max_degrade_steps() -> int:
+    """Configurações extras (mais grossas) tentadas após erro de memória/timeout."""
+    return int(os.getenv("ADAPTIVE_MAX_DEGRADE_STEPS", "2"))
+
+
+def choose_reduction(area_m2: float, vertices: int, base_scale: float,
+                     base_tile_scale: int = 4) -> Dict[str, Any]:
+    """Primeira tentativa: escala nativa (ou a menor múltipla que cabe no orçamento) e tileScale."""
+    budget = target_pixels()
+    scale = base_scale
+    while area_m2 / (scale * scale) > budget:
+        scale *= 2
+    pixels = area_m2 / (scale * scale)
+    tile_scale = base_tile_scale
+    if pixels > budget / 4 or vertices > 2000:
+        tile_scale = max(tile_scale, 8)
+    if pixels > budget / 2 or vertices > 10000:
+        tile_scale = MAX_TILE_SCALE
+    return {"scale": scale, "tile_scale": tile_scale}
+
+
+def reduction_plan(area_m2: float, vertices: int, base_scale: float, base_tile_scale: int = 4,
+                   degrade_steps: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Sequência de configurações, da mais fina à mais grossa, tentadas em ordem."""
+    if degrade_steps is None:
+        degrade_steps = max_degrade_steps()
+    first = choose_reduction(area_m2, vertices, base_scale, base_tile_scale)
+    plan = [first]
+    for _ in range(degrade_steps):
+        prev = plan[-1]
+        plan.append({"scale": prev["scale"] * 2, "tile_scale": min(prev["tile_scale"] * 2, MAX_TILE_SCALE)})
+    return plan
+
+
+def is_resource_error(exc: BaseException) -> bool:
+    if isinstance(exc, TimeoutError):
+        return True
+    msg = str(exc).lower()
+    return any(s in msg for s in RESOURCE_ERRORS)
+
+
+def _effective(opts: Dict[str, Any], attempt: int) -> Dict[str, Any]:
+    return {"scale_m": opts["scale"], "tile_scale": opts["tile_scale"], "attempts": attempt}
+
+
+def run_adaptive(fn: Callable[..., Any], plan: List[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    fn(scale=..., tile_scale=...) é executada com cada configuração do plano até
+    funcionar. Retorna (resultado, {"scale_m", "tile_scale", "attempts"}).
+    """
+    for attempt, opts in enumerate(plan, 1):
+        try:
+            return fn(**opts), _effective(opts, attempt)
+        except Exception as e:
+            if attempt == len(plan) or not is_resource_error(e):
+                raise
+            print(f"reduceRegion falhou com scale={opts['scale']} tileScale={opts['tile_scale']} ({e}); "
+                  f"tentando scale={plan[attempt]['scale']}")
+
+
+def iter_adaptive(make_iter: Callable[..., Iterator], plan: List[Dict[str, Any]],
+                  info: Optional[Dict[str, Any]] = None) -> Iterator:
+    """
+    Versão em streaming de run_adaptive: só troca de configuração se o erro ocorrer
+    antes do primeiro item (depois disso os itens já foram entregues com a escala anterior).
+    `info` recebe a configuração efetiva.
+    """
+    info = info if info is not None else {}
+    for attempt, opts in enumerate(plan, 1):
+        info.update(_effective(opts, attempt))
+        started = False
+        try:
+            for item in make_iter(**opts):
+                started = True
+                yield item
+            return
+        except Exception as e:
+            if started or attempt == len(plan) or not is_resource_error(e):
+                raise
+            print(f"reduceRegion falhou com scale={opts['scale']} tileScale={opts['tile_scale']} ({e}); "
+                  f"tentando scale={plan[attempt]['scale']}")
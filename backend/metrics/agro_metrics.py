@@ -1,12 +1,30 @@
 # app.py
-from flask import Flask, request, jsonify, make_response
+import time
+_t0 = time.perf_counter()  # startup clock: import -> first request
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
 from typing import Optional, Any, Dict
 import ee
 import os
-import re
 import json
+import functools
+import threading
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from result_cache import ResultCache, make_cache_key
+from geometry_utils import normalize_max_vertices, prepare_geometry, geometry_area_m2
+from adaptive_scale import reduction_plan, run_adaptive, iter_adaptive
+from histogram_stats import summarize as summarize_histogram
+from pixel_cache import NODATA, PixelCache, download_pixels, local_stats, pixel_grid
+from local_indices import (load_band_stack, calc_indices_from_array, median_composite, polygon_mask,
+                           reduce_array_over_region)
+from index_formulas import INDEX_BANDS, INDEX_FORMULAS, S2_BANDS, ImageBands
+from kml_parser import KML_MIMETYPES, kml_to_geojson, kmz_to_geojson, parse_query_fields, read_request_body
+from compute_jobs import ComputeJobs
+from ee_executor import get_executor
+from ee_throttle import EEQuotaExceeded
+from instrumentation import instrument_app, register_gauge, span
+from gzip_requests import accept_gzip_requests
+from ee_init import StartupClock, register_startup_hooks, requires_ee, ensure_ee
 
 app = Flask(__name__)
 app.config["JSON_SORT_KEYS"] = False  # keep keys ordering
@@ -16,64 +34,76 @@ basedir = os.path.dirname(__file__)
 env_path = os.path.join(basedir, ".env")
 load_dotenv(env_path)
 
-# Earth Engine init
-def init_ee():
-    service_account = os.getenv("SERVICE_ACCOUNT_EMAIL")
-    key_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_PATH")
-    project = os.getenv("GEE_PROJECT")
+# Earth Engine is initialized once per process, in the background (see ee_init.py)
+startup_clock = StartupClock(_t0)
+register_startup_hooks(app, startup_clock)
+# per-request spans, GET /metrics and the X-Debug-Timing header (see instrumentation.py)
+instrument_app(app)
+# Content-Encoding: gzip request bodies (large polygons sent by the CRUD backfill)
+accept_gzip_requests(app)
 
-    # try to extract key and user from .env
-    if (not project) and key_path and os.path.exists(key_path):
-        try:
-            with open(key_path, "r") as f:
-                jd = json.load(f)
-                if not service_account:
-                    service_account = jd.get("client_email")
-                if not project:
-                    project = jd.get("project_id")
-        except Exception as e:
-            print("Erro lendo JSON da chave:", e)
+# bounded pool for independent getInfo calls (EE_MAX_IN_FLIGHT / EE_CALL_TIMEOUT)
+ee_executor = get_executor()
 
-    # try to initialize with service account
-    if service_account and key_path and os.path.exists(key_path):
-        try:
-            creds = ee.ServiceAccountCredentials(service_account, key_path)
-            if project:
-                ee.Initialize(creds, project=project)
-            else:
-                ee.Initialize(creds)
-            print("EE initialized with Service Account:", service_account, "project:", project)
-            return
-        except Exception as e:
-            print("Falha ao inicializar EE com service account:", e)
+# "server" evaluates the whole series in one (or a few batched) round trips,
+# "client" sends one small graph per image/period (useful when a single graph
+# gets too big)
+TIMESERIES_ENGINES = ("server", "client")
+# number of periods evaluated per getInfo call by the server engine
+PERIOD_BATCH_SIZE = int(os.getenv("PERIOD_BATCH_SIZE", "40"))
 
-    # fallback: check if there is local credentials available
-    try:
-        ee.Initialize()
-        print("EE initialized with existing application-default/interactive credentials.")
-    except Exception:
-        print("Attempting interactive ee.Authenticate() - only for local dev.")
-        ee.Authenticate()
-        ee.Initialize()
+# NDJSON streaming of time series (Accept: application/x-ndjson or "stream": true);
+# smaller batches so the first entries are flushed early
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "10"))
 
-init_ee()
+# async /compute/jobs: worker pool size and where job state/results are persisted
+COMPUTE_JOB_WORKERS = int(os.getenv("COMPUTE_JOB_WORKERS", "2"))
+COMPUTE_JOBS_DIR = os.getenv("COMPUTE_JOBS_DIR") or os.path.join(basedir, "jobs")
+COMPUTE_JOBS_RETENTION_DAYS = int(os.getenv("COMPUTE_JOBS_RETENTION_DAYS", "7"))
 
-# Helpers
-def kml_to_polygon_coords(kml_text: str):
-    m = re.search(r"<coordinates>(.*?)</coordinates>", kml_text, re.DOTALL | re.IGNORECASE)
-    if not m:
-        raise ValueError("KML does not contains tag <coordinates>")
-    coords_text = m.group(1).strip()
-    parts = re.split(r"\s+", coords_text.strip())
-    polygon = []
-    for p in parts:
-        if not p.strip():
-            continue
-        pieces = p.split(",")
-        lon = float(pieces[0]); lat = float(pieces[1])
-        polygon.append([lon, lat])
-    return [polygon]
+# /compute/batch chunking limits (features and total vertices per reduceRegions call)
+BATCH_MAX_FEATURES = int(os.getenv("BATCH_MAX_FEATURES", "200"))
+BATCH_MAX_VERTICES = int(os.getenv("BATCH_MAX_VERTICES", "50000"))
+
+# vertex budget for polygons sent to EE (see geometry_utils.prepare_geometry)
+GEOMETRY_MAX_VERTICES = int(os.getenv("GEOMETRY_MAX_VERTICES", "5000"))
+
+# native Sentinel-2 scale and default tileScale; coarsened per request by adaptive_scale
+BASE_SCALE = 10
+BASE_TILE_SCALE = 4
+
+# /compute/pixels: index rasters downloaded once per area/period and kept as
+# memory-mapped .npy files (size-bounded, LRU); later stats are computed locally
+PIXEL_CACHE_DIR = os.getenv("PIXEL_CACHE_DIR") or os.path.join(basedir, "pixel_cache")
+PIXEL_CACHE_MAX_MB = int(os.getenv("PIXEL_CACHE_MAX_MB", "2048"))
+# pixels per band above which the download is refused (ask for a coarser scale)
+PIXEL_CACHE_MAX_PIXELS = int(float(os.getenv("PIXEL_CACHE_MAX_PIXELS", "25e6")))
+pixel_cache = PixelCache(PIXEL_CACHE_DIR, max_bytes=PIXEL_CACHE_MAX_MB << 20)
+
+# index backend of /compute: "ee" (default) or "local" (band stacks mirrored in INDEX_LOCAL_DIR,
+# see local_indices.py); each request may pick one with the "backend" field
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "ee")
+INDEX_BACKENDS = ("ee", "local")
+INDEX_LOCAL_DIR = os.getenv("INDEX_LOCAL_DIR") or os.path.join(basedir, "index_stacks")
 
+# zoning mode: most zones (grid cells or user polygons) reduced in one reduceRegions call
+ZONING_MAX_ZONES = int(os.getenv("ZONING_MAX_ZONES", "2500"))
+
+# /compute response cache: LRU in memory + optional disk tier (RESULT_CACHE_DIR)
+CACHE_KEY_FIELDS = ("start_date", "end_date", "collection", "timeseries", "timeseries_unit",
+                    "timeseries_period_days", "max_images", "max_biomass", "simplify", "max_vertices",
+                    "indices", "stats", "histogram", "percentiles", "zones", "zone_grid_m")
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "512")),
+    disk_dir=os.getenv("RESULT_CACHE_DIR") or None,
+    recent_ttl=int(os.getenv("RESULT_CACHE_RECENT_TTL", "900")),
+    settle_days=int(os.getenv("RESULT_CACHE_SETTLE_DAYS", "0")),
+    # results reduced at a coarser fallback setting are not kept forever
+    degraded_ttl=int(os.getenv("RESULT_CACHE_DEGRADED_TTL", "900")),
+)
+
+# Helpers
 def geojson_to_ee_geometry(geojson):
     geom_type = geojson.get("type")
     if geom_type == "Feature":
@@ -92,164 +122,988 @@ def select_sentinel_collection(collection_name: str):
         return ee.ImageCollection("COPERNICUS/S2_SR")
     raise ValueError("Collection not available: " + str(collection_name))
 
-def calc_indices_from_image(img):
-    scaled = img.select(["B2","B3","B4","B5","B6","B7","B8","B8A","B11","B12"]).divide(10000.0)
-    B2 = scaled.select("B2"); B3 = scaled.select("B3"); B4 = scaled.select("B4")
-    B5 = scaled.select("B5"); B6 = scaled.select("B6"); B7 = scaled.select("B7")
-    B8 = scaled.select("B8"); B8A = scaled.select("B8A"); B11 = scaled.select("B11"); B12 = scaled.select("B12")
-
-    ndvi = B8.subtract(B4).divide(B8.add(B4)).rename("NDVI")
-    evi = B8.subtract(B4).multiply(2.5).divide(B8.add(B4.multiply(6)).subtract(B2.multiply(7.5)).add(1)).rename("EVI")
-    ndwi = B3.subtract(B8).divide(B3.add(B8)).rename("NDWI")
-    ndmi = B8.subtract(B11).divide(B8.add(B11)).rename("NDMI")
-    gndvi = B8.subtract(B3).divide(B8.add(B3)).rename("GNDVI")
-    ndre = B8.subtract(B5).divide(B8.add(B5)).rename("NDRE")
-    rendvi = B8.subtract(B6).divide(B8.add(B6)).rename("RENDVI")
-    biomass_proxy = ndvi.add(1).divide(2).rename("BIOMASSA_PROXY")
-
-    out = ndvi.addBands([evi, ndwi, ndmi, gndvi, ndre, rendvi, biomass_proxy])
+# reducers are built lazily: ee.Reducer.* only exists after ee.Initialize()
+STAT_REDUCERS = {
+    "mean": lambda: ee.Reducer.mean(),
+    "median": lambda: ee.Reducer.median(),
+    "stdDev": lambda: ee.Reducer.stdDev(),
+}
+
+def normalize_indices(indices):
+    if not indices:
+        return list(INDEX_BANDS)
+    if isinstance(indices, str):
+        indices = [indices]
+    wanted = {str(i).upper() for i in indices}
+    unknown = wanted - set(INDEX_BANDS)
+    if unknown:
+        raise ValueError(f"Índices inválidos: {sorted(unknown)}. Use: {list(INDEX_BANDS)}")
+    return [i for i in INDEX_BANDS if i in wanted]
+
+# optional fixed-bin histogram per index, evaluated in the same round trip as the stats
+# (percentiles/IQR/CV are derived from it locally, see histogram_stats.py).
+# Bins span each index's own range: normalized differences live in [-1, 1], EVI
+# leaves it over bright or poorly masked pixels and BIOMASSA_PROXY is in [0, 1].
+HISTOGRAM_RANGES = {
+    "NDVI": (-1.0, 1.0),
+    "EVI": (-1.0, 2.0),
+    "NDWI": (-1.0, 1.0),
+    "NDMI": (-1.0, 1.0),
+    "GNDVI": (-1.0, 1.0),
+    "NDRE": (-1.0, 1.0),
+    "RENDVI": (-1.0, 1.0),
+    "BIOMASSA_PROXY": (0.0, 1.0),
+}
+DEFAULT_HISTOGRAM_BINS = 20
+MAX_HISTOGRAM_BINS = 200
+
+def normalize_histogram(histogram):
+    """False/None -> None; True -> DEFAULT_HISTOGRAM_BINS; int -> number of bins."""
+    if histogram is None or histogram is False:
+        return None
+    if histogram is True:
+        return DEFAULT_HISTOGRAM_BINS
+    try:
+        bins = int(histogram)
+    except (TypeError, ValueError):
+        raise ValueError("histogram deve ser true/false ou o número de bins.")
+    if not 2 <= bins <= MAX_HISTOGRAM_BINS:
+        raise ValueError(f"histogram: use entre 2 e {MAX_HISTOGRAM_BINS} bins.")
+    return bins
+
+def normalize_percentiles(percentiles):
+    if not percentiles:
+        return None
+    try:
+        qs = sorted({float(q) for q in percentiles})
+    except (TypeError, ValueError):
+        raise ValueError("percentiles deve ser uma lista de números entre 0 e 100.")
+    if qs[0] < 0 or qs[-1] > 100:
+        raise ValueError("percentiles deve ser uma lista de números entre 0 e 100.")
+    return qs
+
+def normalize_stats(stats):
+    if not stats:
+        return list(STAT_REDUCERS)
+    if isinstance(stats, str):
+        stats = [stats]
+    unknown = set(stats) - set(STAT_REDUCERS)
+    if unknown:
+        raise ValueError(f"Estatísticas inválidas: {sorted(unknown)}. Use: {list(STAT_REDUCERS)}")
+    return [st for st in STAT_REDUCERS if st in stats]
+
+def required_bands(indices=None):
+    needed = {b for i in normalize_indices(indices) for b in INDEX_BANDS[i]}
+    return [b for b in S2_BANDS if b in needed]
+
+def calc_indices_from_image(img, indices=None, backend="ee"):
+    """
+    Index bands (INDEX_FORMULAS) of a Sentinel-2 image. backend="ee": ee.Image in
+    digital numbers -> ee.Image; backend="local": NumPy stack (..., 10, H, W) in
+    reflectance -> array (..., len(indices), H, W), see local_indices.py.
+    """
+    indices = normalize_indices(indices)
+    if backend == "local":
+        return calc_indices_from_array(img, indices)
+    scaled = ImageBands(img.select(required_bands(indices)).divide(10000.0))
+
+    # only the requested index bands are built
+    bands = [INDEX_FORMULAS[i](scaled).image.rename(i) for i in indices]
+    out = bands[0]
+    if len(bands) > 1:
+        out = out.addBands(bands[1:])
     return out
 
-def reduce_image_over_region(img, geom, scale=10):
-    reducer = ee.Reducer.mean().combine(ee.Reducer.median(), "", True).combine(ee.Reducer.stdDev(), "", True)
-    stats = img.reduceRegion(reducer=reducer, geometry=geom, scale=scale, maxPixels=1e13, tileScale=4)
-    return stats
+def stats_reducer(stats=None):
+    stats = normalize_stats(stats)
+    reducer = STAT_REDUCERS[stats[0]]()
+    for st in stats[1:]:
+        reducer = reducer.combine(STAT_REDUCERS[st](), "", True)
+    return reducer
+
+def prepare_for_reduction(img, stats=None):
+    """
+    Returns (image, reducer). A single-output reducer names results after the band
+    only ("NDVI"), so bands are suffixed to keep the usual "NDVI_mean" keys.
+    """
+    stats = normalize_stats(stats)
+    if len(stats) == 1:
+        img = img.rename(img.bandNames().map(lambda b: ee.String(b).cat("_" + stats[0])))
+    return img, stats_reducer(stats)
 
-def per_image_timeseries(collection, geom, max_images=100):
-    size = collection.size().getInfo()
+def histogram_image(img, indices=None):
+    """
+    Each index band rescaled from its HISTOGRAM_RANGES entry to [0, 1] and named
+    "<INDEX>_histogram", so one fixedHistogram(0, 1, bins) bins every band over its own range.
+    Bins are [lo, hi): values equal to hi are left out, as in pixel_cache.histogram_counts.
+    """
+    bands = []
+    for i in normalize_indices(indices):
+        lo, hi = HISTOGRAM_RANGES[i]
+        bands.append(img.select(i).subtract(lo).divide(hi - lo).rename(i + "_histogram"))
+    return ee.Image.cat(bands)
+
+def split_histograms(metrics, histogram=None):
+    """
+    Moves the "<INDEX>_histogram" outputs out of the metrics dict. Returns
+    (metrics, histograms) with histograms keyed by index: {"range", "bins", "counts"}.
+    """
+    if not histogram or not metrics:
+        return metrics, None
+    plain, histograms = {}, {}
+    for key, value in metrics.items():
+        if key.endswith("_histogram"):
+            # EE weights edge pixels by their covered fraction: counts are fractional
+            counts = [float(row[1]) for row in value] if value else [0.0] * histogram
+            index = key[:-len("_histogram")]
+            histograms[index] = {"range": list(HISTOGRAM_RANGES[index]), "bins": histogram, "counts": counts}
+        else:
+            plain[key] = value
+    return plain, histograms
+
+def _with_histograms(entry, histogram=None, percentiles=None):
+    # entry["metrics"] -> entry["metrics"] + entry["histograms"] (+ "histogram_stats" when percentiles are requested)
+    metrics, histograms = split_histograms(entry.get("metrics"), histogram)
+    if histograms is None:
+        return entry
+    entry = {**entry, "metrics": metrics, "histograms": histograms}
+    if percentiles:
+        entry["histogram_stats"] = {k: summarize_histogram(h, percentiles) for k, h in histograms.items()}
+    return entry
+
+def reduce_image_over_region(img, geom, scale=BASE_SCALE, stats=None, tile_scale=BASE_TILE_SCALE, histogram=None,
+                             indices=None):
+    stats_img, reducer = prepare_for_reduction(img, stats)
+    result = stats_img.reduceRegion(reducer=reducer, geometry=geom, scale=scale, maxPixels=1e13, tileScale=tile_scale)
+    if histogram:
+        # outputs "<INDEX>_histogram": [[bin_start, count], ...] (bins over the rescaled band)
+        hist = histogram_image(img, indices).reduceRegion(reducer=ee.Reducer.fixedHistogram(0, 1, histogram),
+                                                          geometry=geom, scale=scale, maxPixels=1e13,
+                                                          tileScale=tile_scale)
+        result = result.combine(hist)
+    return result
+
+def _limit_note(size, max_images):
+    if size > max_images:
+        return f"Limited to {max_images} images out of {size} available. Increase max_images to include more."
+    return None
+
+def iter_per_image_timeseries(collection, geom, max_images=100, engine="server", batch_size=None, summary=None,
+                              indices=None, stats=None, scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    """
+    Yields per-image entries ({"date", "metrics"}) as soon as each batch is evaluated.
+    `summary` (dict) receives count_available/note once the collection size is known.
+    """
+    summary = summary if summary is not None else {}
+    if engine == "client":
+        yield from _iter_per_image_client(collection, geom, max_images, summary, indices, stats, scale, tile_scale,
+                                          histogram)
+        return
+
+    # builds size + dates + stats as one server-side graph per batch; with the
+    # default batch (= max_images) the whole series comes back in one getInfo
+    batch_size = batch_size or max_images
+    imgs = collection.sort('system:time_start').toList(max_images)
+
+    first = ee_executor.get_info(ee.Dictionary({"size": collection.size(), "series": imgs.slice(0, batch_size).map(lambda img: _image_entry(img, geom, indices, stats, scale, tile_scale, histogram))}))
+    size = first["size"]
+    limit = min(size, max_images)
+    summary.update({"count_available": size, "note": _limit_note(size, max_images)})
+    for e in first["series"]:
+        yield {"date": e["date"], "metrics": e["metrics"]}
+    # remaining batches are independent: evaluated concurrently, yielded in order
+    batches = (imgs.slice(b, min(b + batch_size, limit)).map(lambda img: _image_entry(img, geom, indices, stats, scale, tile_scale, histogram))
+               for b in range(batch_size, limit, batch_size))
+    for rows in ee_executor.imap_get_info(batches):
+        for e in rows:
+            yield {"date": e["date"], "metrics": e["metrics"]}
+
+def _image_entry(img, geom, indices=None, stats=None, scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    img = ee.Image(img)
+    indices_img = calc_indices_from_image(img, indices)
+    result = reduce_image_over_region(indices_img, geom, scale=scale, stats=stats, tile_scale=tile_scale,
+                                      histogram=histogram, indices=indices)
+    return ee.Dictionary({"date": img.date().format('YYYY-MM-dd'), "metrics": result})
+
+def _iter_per_image_client(collection, geom, max_images, summary, indices=None, stats=None,
+                           scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    # one getInfo per image (N+1 round trips), dispatched through the bounded executor
+    size = ee_executor.get_info(collection.size())
+    summary.update({"count_available": size, "note": _limit_note(size, max_images)})
     if size == 0:
-        return []
+        return
     limit = min(size, max_images)
     imgs = collection.sort('system:time_start').toList(limit)
-    result = []
-    for i in range(limit):
-        img = ee.Image(imgs.get(i))
-        date = img.date().format('YYYY-MM-dd').getInfo()
-        indices_img = calc_indices_from_image(img)
-        stats = reduce_image_over_region(indices_img, geom)
-        stats_dict = stats.getInfo()
-        entry = {"date": date, "metrics": stats_dict}
-        result.append(entry)
-    note = None
-    if size > max_images:
-        note = f"Limited to {max_images} images out of {size} available. Increase max_images to include more."
-    return {"count_available": size, "returned_count": len(result), "note": note, "series": result}
+    entries = (_image_entry(imgs.get(i), geom, indices, stats, scale, tile_scale, histogram) for i in range(limit))
+    for e in ee_executor.imap_get_info(entries):
+        yield {"date": e["date"], "metrics": e["metrics"]}
 
-def period_timeseries(collection, geom, start_date, end_date, period_days=10):
+def per_image_timeseries(collection, geom, max_images=100, engine="server", indices=None, stats=None):
+    summary = {}
+    result = list(iter_per_image_timeseries(collection, geom, max_images=max_images, engine=engine, summary=summary,
+                                            indices=indices, stats=stats))
+    return {"count_available": summary["count_available"], "returned_count": len(result), "note": summary["note"], "series": result}
+
+def _period_windows(start_date, end_date, period_days):
     start = datetime.fromisoformat(start_date)
     end = datetime.fromisoformat(end_date)
+    windows = []
     current = start
-    result = []
     while current <= end:
-        period_start = ee.Date(current.strftime("%Y-%m-%d"))
         next_dt = current + timedelta(days=period_days)
-        period_end_py = next_dt - timedelta(days=1)
-        # filter up to next_dt (exclusive)
-        col = collection.filterDate(period_start, ee.Date(next_dt.strftime("%Y-%m-%d"))).filterBounds(geom).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70))
-        count = col.size().getInfo()
-        if count == 0:
-            result.append({"period_start": current.strftime("%Y-%m-%d"), "period_end": period_end_py.strftime("%Y-%m-%d"), "count": 0})
-        else:
-            comp = col.median()
-            indices_img = calc_indices_from_image(comp)
-            stats = reduce_image_over_region(indices_img, geom)
-            stats_dict = stats.getInfo()
-            result.append({"period_start": current.strftime("%Y-%m-%d"), "period_end": period_end_py.strftime("%Y-%m-%d"), "count": count, "metrics": stats_dict})
+        windows.append((current, next_dt - timedelta(days=1)))
         current = next_dt
-    return result
+    return windows
 
-# Endpoint (Flask) 
-@app.route("/compute", methods=["POST"])
-def compute_metrics():
-    try:
-        req = request.get_json(force=True)
-    except Exception:
-        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+def iter_period_timeseries(collection, geom, start_date, end_date, period_days=10, engine="server",
+                           batch_size=None, summary=None, indices=None, stats=None,
+                           scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    """
+    Yields one entry per period ({"period_start", "period_end", "count"[, "metrics"]}) as
+    soon as its batch is evaluated. `summary` receives count_available (number of periods).
+    """
+    windows = _period_windows(start_date, end_date, period_days)
+    if summary is not None:
+        summary.update({"count_available": len(windows), "note": None})
+    if engine == "client":
+        yield from _iter_period_client(collection, geom, windows, period_days, indices, stats, scale, tile_scale,
+                                       histogram)
+        return
+    if not windows:
+        return
+
+    batch_size = batch_size or PERIOD_BATCH_SIZE
+    base = ee.Date(windows[0][0].strftime("%Y-%m-%d"))
+    col = collection.filterBounds(geom).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70)).select(required_bands(indices))
+
+    # every period window is derived from a list of day offsets on the server;
+    # periods are fetched in batches to keep each graph within EE limits and the
+    # batches are evaluated concurrently
+    def _batch(b):
+        first = b * period_days
+        last = first + (len(windows[b:b + batch_size]) - 1) * period_days
+        return ee.List.sequence(first, last, period_days).map(
+            lambda offset: _period_entry(col, base.advance(offset, 'day'), period_days, geom, indices, stats,
+                                         scale, tile_scale, histogram))
+
+    starts = range(0, len(windows), batch_size)
+    for b, rows in zip(starts, ee_executor.imap_get_info(_batch(b) for b in starts)):
+        for (p_start, p_end), row in zip(windows[b:b + batch_size], rows):
+            yield _period_result(p_start, p_end, row)
+
+def _period_entry(col, period_start, period_days, geom, indices=None, stats=None,
+                  scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    period_col = col.filterDate(period_start, period_start.advance(period_days, 'day'))
+    count = period_col.size()
+    # the composite branch is only evaluated for non-empty periods
+    stats = ee.Algorithms.If(
+        count.gt(0),
+        reduce_image_over_region(calc_indices_from_image(period_col.median(), indices), geom, scale=scale,
+                                 stats=stats, tile_scale=tile_scale, histogram=histogram, indices=indices),
+        None,
+    )
+    return ee.Dictionary({"count": count, "metrics": stats})
+
+def _period_result(p_start, p_end, row):
+    entry = {"period_start": p_start.strftime("%Y-%m-%d"), "period_end": p_end.strftime("%Y-%m-%d"), "count": row["count"]}
+    if row["count"]:
+        entry["metrics"] = row["metrics"]
+    return entry
+
+def _iter_period_client(collection, geom, windows, period_days, indices=None, stats=None,
+                        scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE, histogram=None):
+    # one small graph (count + composite stats) per period, dispatched through the bounded executor
+    col = collection.filterBounds(geom).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70)).select(required_bands(indices))
+    rows = (_period_entry(col, ee.Date(p_start.strftime("%Y-%m-%d")), period_days, geom, indices, stats,
+                          scale, tile_scale, histogram)
+            for p_start, _ in windows)
+    for (p_start, p_end), row in zip(windows, ee_executor.imap_get_info(rows)):
+        yield _period_result(p_start, p_end, row)
+
+def period_timeseries(collection, geom, start_date, end_date, period_days=10, engine="server", indices=None, stats=None):
+    return list(iter_period_timeseries(collection, geom, start_date, end_date, period_days=period_days, engine=engine,
+                                       indices=indices, stats=stats))
+
+# Request handling shared by /compute, its NDJSON stream and /compute/jobs
+def _parse_compute_request(req):
+    """Validates a /compute body. Returns the normalized params; raises ValueError (HTTP 400)."""
+    if not isinstance(req, dict):
+        raise ValueError("JSON inválido no corpo da requisição.")
 
     # Extract fields with defaults similar ao Pydantic model original
     geometry = req.get("geometry")
     kml = req.get("kml")
+    kmz = req.get("kmz")  # base64
     start_date = req.get("start_date")
     end_date = req.get("end_date")
-    collection = req.get("collection", "SENTINEL2")
-    max_biomass = req.get("max_biomass")
-    timeseries = req.get("timeseries", False)
-    timeseries_unit = req.get("timeseries_unit", "per_image")
-    timeseries_period_days = req.get("timeseries_period_days", 10)
-    max_images = req.get("max_images", 100)
+    p = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "collection": req.get("collection", "SENTINEL2"),
+        "max_biomass": req.get("max_biomass"),
+        "timeseries": req.get("timeseries", False),
+        "timeseries_unit": req.get("timeseries_unit", "per_image"),
+        "timeseries_period_days": req.get("timeseries_period_days", 10),
+        "max_images": req.get("max_images", 100),
+        "timeseries_engine": req.get("timeseries_engine", "server"),
+        "simplify": req.get("simplify", True),
+        "max_vertices": req.get("max_vertices", GEOMETRY_MAX_VERTICES),
+        "use_cache": req.get("cache", True),
+    }
+    # optional subset of index bands / reducers (default: all, same output as before)
+    p["indices"] = normalize_indices(req.get("indices"))
+    p["stats"] = normalize_stats(req.get("stats"))
+    # optional per-index histogram (bins) and percentiles derived from it
+    p["histogram"] = normalize_histogram(req.get("histogram"))
+    p["percentiles"] = normalize_percentiles(req.get("percentiles"))
+    # zoning: user sub-polygons ("zones") or a regular grid of zone_grid_m cells
+    p["zones"] = _parse_zones(req.get("zones"), req.get("id_property", "id"))
+    p["zone_grid_m"] = req.get("zone_grid_m")
 
     # Validate required dates
     if not start_date or not end_date:
-        return make_response(jsonify({"detail": "Forneça 'start_date' e 'end_date' no formato YYYY-MM-DD."}), 400)
+        raise ValueError("Forneça 'start_date' e 'end_date' no formato YYYY-MM-DD.")
     try:
         datetime.fromisoformat(start_date)
         datetime.fromisoformat(end_date)
     except Exception:
-        return make_response(jsonify({"detail": "Formato de data inválido. Use YYYY-MM-DD."}), 400)
+        raise ValueError("Formato de data inválido. Use YYYY-MM-DD.")
+    if p["timeseries_engine"] not in TIMESERIES_ENGINES:
+        raise ValueError(f"timeseries_engine inválido. Use um de: {list(TIMESERIES_ENGINES)}")
+    select_sentinel_collection(p["collection"])
 
-    # Geometry handling
-    ee_geom = None
-    if geometry:
-        try:
-            ee_geom = geojson_to_ee_geometry(geometry)
-        except ValueError as e:
-            return make_response(jsonify({"detail": str(e)}), 400)
-    elif kml:
+    # Geometry handling (normalized + simplified before going to EE)
+    with span("geometry"):
+        if geometry:
+            key_geom = geometry
+        elif kml:
+            key_geom = kml_to_geojson(kml)
+        elif kmz:
+            key_geom = kmz_to_geojson(kmz)
+        else:
+            raise ValueError("Forneça 'geometry' (GeoJSON), 'kml' (string) ou 'kmz' (base64).")
+        p["geometry"], p["vertex_info"] = prepare_geometry(key_geom, scale=BASE_SCALE, simplify=p["simplify"],
+                                                           max_vertices=p["max_vertices"])
+        # scale/tileScale attempts, from the finest that fits the area to coarser fallbacks
+        p["reduction_plan"] = reduction_plan(geometry_area_m2(p["geometry"]), p["vertex_info"]["simplified"],
+                                             BASE_SCALE, BASE_TILE_SCALE)
+
+    if p["zone_grid_m"] is not None:
         try:
-            coords = kml_to_polygon_coords(kml)
-            ee_geom = ee.Geometry.Polygon(coords)
-        except ValueError as e:
-            return make_response(jsonify({"detail": str(e)}), 400)
-    else:
-        return make_response(jsonify({"detail": "Forneça 'geometry' (GeoJSON) ou 'kml' (string)."}), 400)
+            p["zone_grid_m"] = float(p["zone_grid_m"])
+        except (TypeError, ValueError):
+            raise ValueError("zone_grid_m deve ser o tamanho da célula em metros.")
+        if p["zone_grid_m"] < 2 * BASE_SCALE:
+            raise ValueError(f"zone_grid_m deve ser >= {2 * BASE_SCALE} m.")
+        _, grid_shape = pixel_grid(p["geometry"], p["zone_grid_m"])
+        if grid_shape[0] * grid_shape[1] > ZONING_MAX_ZONES:
+            raise ValueError(f"Grade com {grid_shape[0] * grid_shape[1]} células (máx. {ZONING_MAX_ZONES}); aumente zone_grid_m.")
+    if p["zones"] and len(p["zones"]) > ZONING_MAX_ZONES:
+        raise ValueError(f"Máximo de {ZONING_MAX_ZONES} zonas por requisição.")
+    p["zoning"] = "grid" if p["zone_grid_m"] else ("zones" if p["zones"] else None)
+    if p["zoning"] and p["timeseries"]:
+        raise ValueError("Zoneamento (zones/zone_grid_m) não é suportado com timeseries.")
 
-    # pick collection
-    try:
-        col = select_sentinel_collection(collection)
-    except ValueError as e:
-        return make_response(jsonify({"detail": str(e)}), 400)
+    if p["timeseries"]:
+        p["mode"] = "per_image" if p["timeseries_unit"] == "per_image" else f"{p['timeseries_period_days'] or 10}d_periods"
+    p["cache_key"] = make_cache_key(key_geom, {f: p[f] for f in CACHE_KEY_FIELDS})
+    return p
 
+def _filtered_collection(p):
+    ee_geom = geojson_to_ee_geometry(p["geometry"])
+    col = select_sentinel_collection(p["collection"])
     # filter by date and bounds
-    col = col.filterDate(start_date, end_date).filterBounds(ee_geom)
+    col = col.filterDate(p["start_date"], p["end_date"]).filterBounds(ee_geom)
+    return col, ee_geom
+
+def _iter_timeseries(p, batch_size=None, summary=None, scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE):
+    col, ee_geom = _filtered_collection(p)
+    if p["mode"] == "per_image":
+        entries = iter_per_image_timeseries(col, ee_geom, max_images=p["max_images"] or 100, engine=p["timeseries_engine"],
+                                            batch_size=batch_size, summary=summary, indices=p["indices"], stats=p["stats"],
+                                            scale=scale, tile_scale=tile_scale, histogram=p["histogram"])
+    else:
+        entries = iter_period_timeseries(col, ee_geom, p["start_date"], p["end_date"], period_days=p["timeseries_period_days"] or 10,
+                                         engine=p["timeseries_engine"], batch_size=batch_size, summary=summary,
+                                         indices=p["indices"], stats=p["stats"], scale=scale, tile_scale=tile_scale,
+                                         histogram=p["histogram"])
+    if not p["histogram"]:
+        return entries
+    return (_with_histograms(e, p["histogram"], p["percentiles"]) for e in entries)
+
+def _run_compute(p, progress=None, batch_size=None):
+    """
+    Runs the EE pipeline for validated params and returns (body, status, cache_state).
+    `progress(done, total)` is called as images/periods complete.
+    """
+    if p["use_cache"]:
+        with span("cache"):
+            cached = result_cache.get(p["cache_key"])
+        if cached is not None:
+            return cached, 200, "HIT"
 
     # timeseries handling
-    if timeseries:
-        if timeseries_unit == "per_image":
-            ts = per_image_timeseries(col, ee_geom, max_images=max_images or 100)
-            resp = {"timeseries_mode": "per_image", **ts}
-            return make_response(jsonify(resp), 200)
-        else:
-            days = timeseries_period_days or 10
-            ts = period_timeseries(col, ee_geom, start_date, end_date, period_days=days)
-            resp = {"timeseries_mode": f"{days}d_periods", "series": ts}
-            return make_response(jsonify(resp), 200)
+    if p["timeseries"]:
+        summary = {}
+
+        def _series(scale, tile_scale):
+            series = []
+            for entry in _iter_timeseries(p, batch_size=batch_size, summary=summary, scale=scale, tile_scale=tile_scale):
+                series.append(entry)
+                if progress:
+                    progress(len(series), min(summary["count_available"], p["max_images"] or 100)
+                             if p["mode"] == "per_image" else summary["count_available"])
+            return series
+
+        # the whole series is recomputed at a coarser setting on memory/timeout errors
+        with span("timeseries"):
+            series, reduction = run_adaptive(_series, p["reduction_plan"])
+        trailer = {"count_available": summary.get("count_available"), "returned_count": len(series), "note": summary.get("note")}
+        response = _timeseries_response(p["mode"], series, trailer, p["vertex_info"], reduction)
+        return _store_result(p, response), 200, "MISS" if p["use_cache"] else "BYPASS"
 
     # single composite summarizing whole period
+    col, ee_geom = _filtered_collection(p)
     col = col.filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70))
-    size = col.size().getInfo()
+    with span("collection_size"):
+        size = ee_executor.get_info(col.size())
     if size == 0:
-        return make_response(jsonify({"detail": "Nenhuma imagem disponível para o período/área com filtro atual (verificar nuvens)."}), 404)
+        return {"detail": "Nenhuma imagem disponível para o período/área com filtro atual (verificar nuvens)."}, 404, None
 
-    comp = col.median()
-    indices_img = calc_indices_from_image(comp)
-    stats = reduce_image_over_region(indices_img, ee_geom, scale=10)
-    stats_dict = stats.getInfo()
+    # only the bands the requested indices read are composited
+    comp = col.select(required_bands(p["indices"])).median()
+    indices_img = calc_indices_from_image(comp, p["indices"])
+    zones_fc = _zone_collection(p, ee_geom) if p["zoning"] else None
+
+    def _reduce(scale, tile_scale):
+        field = reduce_image_over_region(indices_img, ee_geom, scale=scale, stats=p["stats"], tile_scale=tile_scale,
+                                         histogram=p["histogram"], indices=p["indices"])
+        if zones_fc is None:
+            return ee_executor.get_info(field), None
+        # whole field + every zone come back in the same round trip
+        row = ee_executor.get_info(ee.Dictionary({
+            "field": field,
+            "zones": _reduce_zones(indices_img, zones_fc, p["stats"], scale, tile_scale),
+        }))
+        return row["field"], row["zones"]
+
+    with span("reduce_region"):
+        (stats_dict, zones_result), reduction = run_adaptive(_reduce, p["reduction_plan"])
 
     response = {
         "image_count": size,
-        "requested_period": {"start": start_date, "end": end_date},
-        "metrics": stats_dict
+        "requested_period": {"start": p["start_date"], "end": p["end_date"]},
+        "metrics": stats_dict,
+        "geometry_vertices": p["vertex_info"],
+        **_reduction_fields(reduction),
     }
+    # "<INDEX>_histogram" outputs go to "histograms" (metrics keeps the usual keys)
+    response.update(_with_histograms({"metrics": stats_dict}, p["histogram"], p["percentiles"]))
+    if zones_fc is not None:
+        response["zoning"] = {"mode": p["zoning"], "cell_size_m": p["zone_grid_m"]}
+        response["zones"] = _columnar_zones(zones_result)
 
+    max_biomass = p["max_biomass"]
     if max_biomass is not None:
         proxy_key = "BIOMASSA_PROXY_mean"
         if proxy_key in stats_dict and stats_dict[proxy_key] is not None:
             response["BIOMASSA_EST_mean"] = stats_dict[proxy_key] * max_biomass
         else:
             response["BIOMASSA_EST_mean"] = None
+    if progress:
+        progress(1, 1)
+
+    return _store_result(p, response), 200, "MISS" if p["use_cache"] else "BYPASS"
+
+# Zoning: grid cells / user zones clipped to the field and reduced together
+def _grid_cells(geojson, cell_m):
+    transform, (rows, cols) = pixel_grid(geojson, cell_m)
+    sx, _, x0, _, sy, y0 = transform
+    return [(f"{r}_{c}", [x0 + c * sx, y0 + (r + 1) * sy, x0 + (c + 1) * sx, y0 + r * sy])
+            for r in range(rows) for c in range(cols)]
+
+def _zone_collection(p, ee_geom):
+    if p["zoning"] == "grid":
+        feats = [ee.Feature(ee.Geometry.Rectangle(bounds), {"zone_id": zid})
+                 for zid, bounds in _grid_cells(p["geometry"], p["zone_grid_m"])]
+    else:
+        feats = [ee.Feature(geojson_to_ee_geometry(geom), {"zone_id": zid}) for zid, geom in p["zones"]]
+    return ee.FeatureCollection(feats).map(lambda f: f.intersection(ee_geom, ee.ErrorMargin(1)))
+
+def _reduce_zones(indices_img, zones_fc, stats=None, scale=BASE_SCALE, tile_scale=BASE_TILE_SCALE):
+    img, reducer = prepare_for_reduction(indices_img, stats)
+    reduced = img.reduceRegions(collection=zones_fc, reducer=reducer, scale=scale, tileScale=tile_scale)
+
+    def _row(f):
+        geom = f.geometry()
+        # only stats + centroid + area travel back, not the clipped polygons
+        return ee.Feature(None, f.toDictionary().set("centroid", geom.centroid(1).coordinates())
+                                                .set("area_m2", geom.area(1)))
 
+    return reduced.map(_row).filter(ee.Filter.gt("area_m2", 0))
+
+def _columnar_zones(fc):
+    """FeatureCollection de zonas -> arrays paralelos (zone_ids, centroids, area_m2, metrics por chave)."""
+    rows = [f.get("properties") or {} for f in (fc or {}).get("features", [])]
+    keys = sorted({k for row in rows for k in row} - {"zone_id", "centroid", "area_m2"})
+    return {
+        "zone_ids": [row.get("zone_id") for row in rows],
+        "centroids": [row.get("centroid") for row in rows],
+        "area_m2": [round(row["area_m2"], 1) if row.get("area_m2") is not None else None for row in rows],
+        "metrics": {k: [row.get(k) for row in rows] for k in keys},
+    }
+
+def _store_result(p, response):
+    if p["use_cache"]:
+        result_cache.put(p["cache_key"], response, p["end_date"], response.get("reduction"))
+    return response
+
+def request_backend():
+    if request.mimetype in KML_MIMETYPES:
+        body = parse_query_fields(request.args)  # corpo é o KML/KMZ, lido só pela rota
+    else:
+        body = request.get_json(force=True, silent=True)
+    return (body.get("backend") if isinstance(body, dict) else None) or INDEX_BACKEND
+
+def requires_ee_backend(view):
+    """requires_ee only when the request uses the EE backend (the local one works offline)."""
+    ee_view = requires_ee(view)
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request_backend() == "local":
+            return view(*args, **kwargs)
+        return ee_view(*args, **kwargs)
+    return wrapper
+
+def _local_stack_path(p, stack):
+    # composite from a local band stack: one file of INDEX_LOCAL_DIR, named in "stack"
+    if p["timeseries"] or p["zoning"] or p["histogram"]:
+        raise ValueError("backend local: só o composto (sem timeseries, zonas ou histogram).")
+    if not stack or not isinstance(stack, str) or os.path.basename(stack) != stack:
+        raise ValueError(f"backend local: informe 'stack', nome de um arquivo em {INDEX_LOCAL_DIR}.")
+    return os.path.join(INDEX_LOCAL_DIR, stack)
+
+def _run_local_compute(p, path):
+    """Same composite as _run_compute, from a local (time, bands, H, W) stack: median -> indices -> stats."""
+    with span("local_read"):
+        stack, transform = load_band_stack(path)
+        if transform is None:
+            raise ValueError("Stack sem transform: forneça o sidecar <arquivo>.json.")
+    image_count = stack.shape[0] if stack.ndim == 4 else 1
+    with span("local_reduce"):
+        indices = calc_indices_from_image(median_composite(stack), p["indices"], backend="local")
+        mask = polygon_mask(p["geometry"], transform, indices.shape[-2:])
+        stats = reduce_array_over_region(indices, mask, names=p["indices"])[0]
+    metrics = {k: v for k, v in stats.items() if k.rsplit("_", 1)[1] in p["stats"]}
+    response = {
+        "image_count": image_count,
+        "requested_period": {"start": p["start_date"], "end": p["end_date"]},
+        "backend": "local",
+        "metrics": metrics,
+        "geometry_vertices": p["vertex_info"],
+        "scale_m": None,  # resolução nativa do stack local
+    }
+    if p["max_biomass"] is not None:
+        proxy = metrics.get("BIOMASSA_PROXY_mean")
+        response["BIOMASSA_EST_mean"] = proxy * p["max_biomass"] if proxy is not None else None
+    return response
+
+# Endpoint (Flask) 
+@app.route("/compute", methods=["POST"])
+@requires_ee_backend
+def compute_metrics():
+    try:
+        req = read_request_body(request)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+    except Exception:
+        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+    backend = request_backend()
+    if backend not in INDEX_BACKENDS:
+        return make_response(jsonify({"detail": f"backend inválido. Use um de: {list(INDEX_BACKENDS)}"}), 400)
+    try:
+        p = _parse_compute_request(req)
+        stack_path = _local_stack_path(p, req.get("stack")) if backend == "local" else None
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+
+    if backend == "local":
+        try:
+            body = _run_local_compute(p, stack_path)
+        except (OSError, ValueError) as e:
+            return make_response(jsonify({"detail": f"Erro no backend local de índices: {e}"}), 500)
+        return make_response(jsonify(body), 200)
+
+    if p["timeseries"] and _wants_ndjson(req):
+        return _stream_compute(p)
+
+    body, status, cache_state = _run_compute(p)
+    resp = make_response(jsonify(body), status)
+    if cache_state:
+        resp.headers["X-Cache"] = cache_state
+    return resp
+
+def _stream_compute(p):
+    # NDJSON: entries are flushed as soon as each batch is evaluated
+    header = {"timeseries_mode": p["mode"], "geometry_vertices": p["vertex_info"]}
+    cached = result_cache.get(p["cache_key"]) if p["use_cache"] else None
+    if cached is not None:
+        series = cached.get("series") or []
+        summary = {"count_available": cached.get("count_available", len(series)), "note": cached.get("note"),
+                   "reduction": cached.get("reduction")}
+        resp = _stream_timeseries(header, iter(series), summary)
+        resp.headers["X-Cache"] = "HIT"
+        return resp
+
+    summary = {}
+    reduction = {}
+    # a coarser setting is only tried if EE fails before the first entry is sent
+    entries = iter_adaptive(
+        lambda scale, tile_scale: _iter_timeseries(p, batch_size=STREAM_BATCH_SIZE, summary=summary,
+                                                   scale=scale, tile_scale=tile_scale),
+        p["reduction_plan"], reduction)
+    summary["reduction"] = reduction
+
+    def _store(series, trailer):
+        _store_result(p, _timeseries_response(p["mode"], series, trailer, p["vertex_info"], reduction))
+
+    return _stream_timeseries(header, entries, summary, _store)
+
+def _wants_ndjson(req):
+    return req.get("stream") is True or NDJSON_MIMETYPE in (request.headers.get("Accept") or "")
+
+def _ndjson(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def _reduction_fields(reduction):
+    # effective scale/tileScale after adaptive_scale (absent in responses cached before it)
+    return {"scale_m": reduction["scale_m"], "reduction": reduction} if reduction else {}
+
+def _timeseries_response(mode, series, trailer, vertex_info, reduction=None):
+    extra = _reduction_fields(reduction)
+    if mode == "per_image":
+        return {"timeseries_mode": mode, **trailer, "series": series, "geometry_vertices": vertex_info, **extra}
+    return {"timeseries_mode": mode, "series": series, "geometry_vertices": vertex_info, **extra}
+
+def _stream_timeseries(header, entries, summary, on_complete=None):
+    """
+    NDJSON stream: one "header" record, one "entry" record per image/period and a
+    final "trailer" with count_available/returned_count/note ("error" if EE fails midway).
+    """
+    def _gen():
+        series = []
+        yield _ndjson({"record": "header", **header})
+        try:
+            for entry in entries:
+                series.append(entry)
+                yield _ndjson({"record": "entry", **entry})
+        except Exception as e:
+            yield _ndjson({"record": "error", "detail": f"Erro ao calcular a série temporal: {e}"})
+            return
+        trailer = {"count_available": summary.get("count_available"), "returned_count": len(series), "note": summary.get("note")}
+        yield _ndjson({"record": "trailer", **trailer, **_reduction_fields(summary.get("reduction"))})
+        if on_complete:
+            on_complete(series, trailer)
+    return Response(stream_with_context(_gen()), mimetype=NDJSON_MIMETYPE)
+
+# Multi-field batch: one composite + one reduceRegions call per chunk of features
+@app.route("/compute/batch", methods=["POST"])
+@requires_ee
+def compute_batch():
+    """
+    Body: {"features": FeatureCollection (cada feature com "id" ou properties[id_property]),
+           "start_date", "end_date", "collection"?, "id_property"? (default "id")}
+    Retorna as métricas do composite do período para cada feature, indexadas pelo id.
+    """
+    try:
+        req = request.get_json(force=True)
+    except Exception:
+        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+
+    fc = req.get("features") or req.get("geometry")
+    start_date = req.get("start_date")
+    end_date = req.get("end_date")
+    collection = req.get("collection", "SENTINEL2")
+    id_property = req.get("id_property", "id")
+    try:
+        max_vertices = normalize_max_vertices(req.get("max_vertices", GEOMETRY_MAX_VERTICES))
+        indices = normalize_indices(req.get("indices"))
+        stats = normalize_stats(req.get("stats"))
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+
+    if not start_date or not end_date:
+        return make_response(jsonify({"detail": "Forneça 'start_date' e 'end_date' no formato YYYY-MM-DD."}), 400)
+    try:
+        datetime.fromisoformat(start_date)
+        datetime.fromisoformat(end_date)
+    except Exception:
+        return make_response(jsonify({"detail": "Formato de data inválido. Use YYYY-MM-DD."}), 400)
+    if not isinstance(fc, dict) or fc.get("type") != "FeatureCollection" or not fc.get("features"):
+        return make_response(jsonify({"detail": "Forneça 'features' como GeoJSON FeatureCollection não vazio."}), 400)
+    try:
+        col = select_sentinel_collection(collection)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+
+    # per-feature geometry prep; bad features are reported instead of failing the batch
+    prepared, errors, seen = [], {}, set()
+    for i, feat in enumerate(fc["features"]):
+        fid = feat.get("id")
+        if fid is None:
+            fid = (feat.get("properties") or {}).get(id_property)
+        if fid is None:
+            return make_response(jsonify({"detail": f"Feature na posição {i} sem id ('id' ou properties.{id_property})."}), 400)
+        fid = str(fid)
+        if fid in seen:
+            return make_response(jsonify({"detail": f"id de feature duplicado: {fid}"}), 400)
+        seen.add(fid)
+        try:
+            geom, vertex_info = prepare_geometry(feat, scale=BASE_SCALE, max_vertices=max_vertices)
+        except ValueError as e:
+            errors[fid] = str(e)
+            continue
+        prepared.append((fid, geom, vertex_info["simplified"]))
+
+    col = col.filterDate(start_date, end_date).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70))
+    chunks = _batch_chunks(prepared)
+    metrics = {fid: None for fid, _, _ in prepared}
+    chunk_info = []
+    for chunk, row in zip(chunks, ee_executor.imap_get_info(_batch_chunk_stats(col, chunk, indices, stats) for chunk in chunks)):
+        chunk_info.append({"features": len(chunk), "image_count": row["image_count"]})
+        for feat in (row["features"] or {}).get("features", []):
+            props = dict(feat.get("properties") or {})
+            metrics[props.pop("batch_id")] = props
+
+    for fid, value in metrics.items():
+        if value is None and fid not in errors:
+            errors[fid] = "Nenhuma imagem disponível para o período/área com filtro atual (verificar nuvens)."
+
+    response = {
+        "requested_period": {"start": start_date, "end": end_date},
+        "feature_count": len(fc["features"]),
+        "chunks": chunk_info,
+        "metrics": {fid: value for fid, value in metrics.items() if value is not None},
+        "errors": errors,
+    }
     return make_response(jsonify(response), 200)
 
+def _batch_chunks(prepared):
+    # chunks stay under BATCH_MAX_FEATURES features and BATCH_MAX_VERTICES vertices
+    chunks, current, vertices = [], [], 0
+    for item in prepared:
+        if current and (len(current) >= BATCH_MAX_FEATURES or vertices + item[2] > BATCH_MAX_VERTICES):
+            chunks.append(current)
+            current, vertices = [], 0
+        current.append(item)
+        vertices += item[2]
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _batch_chunk_stats(col, chunk, indices=None, stats=None):
+    fc = ee.FeatureCollection([ee.Feature(geojson_to_ee_geometry(geom), {"batch_id": fid}) for fid, geom, _ in chunk])
+    chunk_col = col.filterBounds(fc.geometry())
+    count = chunk_col.size()
+
+    def _reduced():
+        indices_img = calc_indices_from_image(chunk_col.select(required_bands(indices)).median(), indices)
+        indices_img, reducer = prepare_for_reduction(indices_img, stats)
+        reduced = indices_img.reduceRegions(collection=fc, reducer=reducer, scale=BASE_SCALE, tileScale=BASE_TILE_SCALE)
+        # geometries are dropped so only the stats travel back
+        return reduced.map(lambda f: ee.Feature(None, f.toDictionary()))
+
+    return ee.Dictionary({"image_count": count, "features": ee.Algorithms.If(count.gt(0), _reduced(), None)})
+
+# Pixel cache: the first query for an area/period downloads the index pixels,
+# every later query (other stats, zones, histograms) is answered from the mmap
+@app.route("/compute/pixels", methods=["POST"])
+@requires_ee
+def compute_from_pixels():
+    """
+    Body: the /compute fields (geometry/kml/kmz, start_date, end_date, collection, indices,
+    stats, histogram, percentiles) plus "scale"? (m, default 10) and "zones"? (FeatureCollection
+    of sub-polygons, ids in "id" or properties[id_property]).
+    Returns the composite stats for the area and for each zone, computed from the local pixel cache.
+    """
+    try:
+        req = read_request_body(request)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+    except Exception:
+        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+    try:
+        p = _parse_compute_request(req)
+        zones = p["zones"]
+        scale = float(req.get("scale") or BASE_SCALE)
+    except (TypeError, ValueError) as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+    if scale < BASE_SCALE:
+        return make_response(jsonify({"detail": f"scale deve ser >= {BASE_SCALE} m."}), 400)
+
+    key = make_cache_key(p["geometry"], {"start_date": p["start_date"], "end_date": p["end_date"],
+                                         "collection": p["collection"], "indices": p["indices"], "scale": scale})
+    with span("pixel_cache"):
+        entry = pixel_cache.get(key)
+    cache_state = "HIT"
+    if entry is None:
+        cache_state = "MISS"
+        transform, shape = pixel_grid(p["geometry"], scale)
+        if shape[0] * shape[1] > PIXEL_CACHE_MAX_PIXELS:
+            return make_response(jsonify({"detail": f"Área grande demais para o cache de pixels ({shape[1]}x{shape[0]} px); "
+                                                    f"aumente 'scale'."}), 400)
+        col, ee_geom = _filtered_collection(p)
+        col = col.filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 70))
+        size = ee_executor.get_info(col.size())
+        if size == 0:
+            return make_response(jsonify({"detail": "Nenhuma imagem disponível para o período/área com filtro atual (verificar nuvens)."}), 404)
+        img = calc_indices_from_image(col.select(required_bands(p["indices"])).median(), p["indices"])
+        img = img.clip(ee_geom).unmask(NODATA).toFloat()
+        with span("pixel_download"):
+            data = download_pixels(lambda r: ee_executor.call(lambda: ee.data.computePixels(r)),
+                                   img, p["indices"], transform, shape)
+        mask = polygon_mask(p["geometry"], transform, shape)
+        pixel_cache.put(key, data, mask, {"bands": p["indices"], "transform": list(transform), "scale_m": scale,
+                                          "image_count": size})
+        entry = pixel_cache.get(key)
+        if entry is None:
+            # evicted right away (entry larger than PIXEL_CACHE_MAX_MB): serve from memory
+            entry = (data, mask, {"bands": p["indices"], "transform": list(transform), "scale_m": scale,
+                                  "image_count": size, "shape": list(data.shape)})
+
+    data, mask, meta = entry
+    with span("local_stats"):
+        result = local_stats(data, mask, meta, zones=zones, histogram=p["histogram"],
+                             value_ranges=HISTOGRAM_RANGES)
+    response = {
+        "image_count": meta["image_count"],
+        "requested_period": {"start": p["start_date"], "end": p["end_date"]},
+        "scale_m": meta["scale_m"],
+        "pixel_shape": meta["shape"][1:],
+        "metrics": _select_stats(result["metrics"], p["stats"]),
+        "geometry_vertices": p["vertex_info"],
+    }
+    if zones:
+        response["zones"] = {zid: _select_stats(m, p["stats"]) for zid, m in result["zones"].items()}
+    if "histograms" in result:
+        response["histograms"] = result["histograms"]
+        if p["percentiles"]:
+            response["histogram_stats"] = {k: summarize_histogram(h, p["percentiles"])
+                                           for k, h in result["histograms"].items()}
+    resp = make_response(jsonify(response), 200)
+    resp.headers["X-Pixel-Cache"] = cache_state
+    return resp
+
+def _parse_zones(fc, id_property="id"):
+    """FeatureCollection of sub-polygons -> [(id, geometry)]; None when no zones were sent."""
+    if not fc:
+        return None
+    if not isinstance(fc, dict) or fc.get("type") != "FeatureCollection" or not fc.get("features"):
+        raise ValueError("'zones' deve ser um GeoJSON FeatureCollection não vazio.")
+    zones, seen = [], set()
+    for i, feat in enumerate(fc["features"]):
+        zid = feat.get("id")
+        if zid is None:
+            zid = (feat.get("properties") or {}).get(id_property)
+        zid = str(zid) if zid is not None else str(i)
+        if zid in seen:
+            raise ValueError(f"id de zona duplicado: {zid}")
+        seen.add(zid)
+        geom = feat.get("geometry") or {}
+        if geom.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Zona {zid}: geometria deve ser Polygon/MultiPolygon.")
+        zones.append((zid, geom))
+    return zones
+
+def _select_stats(metrics, stats):
+    # local reductions always produce mean/median/stdDev; keep the requested ones
+    return {k: v for k, v in metrics.items() if k.rsplit("_", 1)[-1] in stats}
+
+@app.route("/compute/pixels/stats", methods=["GET"])
+def pixel_cache_stats():
+    return make_response(jsonify(pixel_cache.stats()), 200)
+
+# Async jobs: the job manager (and the resubmission of jobs interrupted by a
+# restart) starts on first use, so the debug reloader's parent process never
+# runs jobs twice
+_compute_jobs = None
+_compute_jobs_lock = threading.Lock()
+
+def _get_compute_jobs():
+    global _compute_jobs
+    with _compute_jobs_lock:
+        if _compute_jobs is None:
+            _compute_jobs = ComputeJobs(
+                runner=_run_compute_job,
+                store_dir=COMPUTE_JOBS_DIR,
+                workers=COMPUTE_JOB_WORKERS,
+                retention_days=COMPUTE_JOBS_RETENTION_DAYS,
+            )
+        return _compute_jobs
+
+def _run_compute_job(p, progress):
+    # jobs resubmitted after a restart may run before any request initialized EE
+    ensure_ee()
+    try:
+        body, status, _ = _run_compute(p, progress=progress, batch_size=STREAM_BATCH_SIZE)
+    except EEQuotaExceeded as e:
+        return {"detail": str(e)}, 429
+    return body, status
+
+@app.route("/compute/jobs", methods=["POST"])
+@requires_ee
+def submit_compute_job():
+    try:
+        req = read_request_body(request)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+    except Exception:
+        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+    try:
+        p = _parse_compute_request(req)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+
+    job = _get_compute_jobs().submit(p)
+    resp = make_response(jsonify({"job_id": job["id"], "status": job["status"],
+                                  "status_url": f"/compute/jobs/{job['id']}"}), 202)
+    resp.headers["Location"] = f"/compute/jobs/{job['id']}"
+    return resp
+
+@app.route("/compute/jobs/<job_id>", methods=["GET"])
+def get_compute_job(job_id):
+    job = _get_compute_jobs().describe(job_id)
+    if job is None:
+        return make_response(jsonify({"detail": "Job não encontrado."}), 404)
+    return make_response(jsonify(job), 200)
+
+register_gauge("result_cache_hit_ratio", "Hit ratio of the /compute result cache.",
+               lambda: result_cache.stats()["hit_ratio"])
+register_gauge("result_cache_entries", "Entries in the in-memory /compute result cache.",
+               lambda: result_cache.stats()["entries"])
+register_gauge("ee_throttle_retried", "getInfo attempts retried after a quota error.",
+               lambda: ee_executor.stats()["retried"])
+register_gauge("ee_throttle_throttled", "getInfo calls delayed by the rate/concurrency limits.",
+               lambda: ee_executor.stats()["throttled"])
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return make_response(jsonify(result_cache.stats()), 200)
+
+@app.route("/ee/stats", methods=["GET"])
+def ee_stats():
+    # throttled/retried/failed getInfo counters (see ee_throttle.py)
+    return make_response(jsonify(ee_executor.stats()), 200)
+
+@app.errorhandler(EEQuotaExceeded)
+def ee_quota_exceeded(e):
+    # EE quota retries exhausted: tell the caller to back off instead of a 500
+    resp = make_response(jsonify({"detail": str(e)}), 429)
+    resp.headers["Retry-After"] = str(int(e.retry_after))
+    return resp
+
+startup_clock.mark("import")
+
 if __name__ == "__main__":
     # execution
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,94 @@
+# bench_executor.py
+"""
+Times the real EE paths that go through ee_executor with one call in flight
+(sequential) and with --in-flight calls in flight (default 4, like EE_MAX_IN_FLIGHT):
+
+- agro_metrics.per_image_timeseries ("client": one getInfo per image; "server":
+  one per batch of STREAM_BATCH_SIZE images, the first one carrying the size);
+- agro_metrics.period_timeseries ("client": one per period; "server": one per
+  batch of PERIOD_BATCH_SIZE periods);
+- soil_metrics.clay_stats for each depth (one getInfo each) vs
+  soil_metrics.clay_stats_depths (all depths in one getInfo).
+
+Uses the same stand-in as bench_getinfo.py: no credentials, every getInfo sleeps
+`latency` seconds and the graph is evaluated locally.
+
+    python bench_executor.py [n_images] [--latency 0.05] [--in-flight 4]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from bench_getinfo import DAYS_BETWEEN_IMAGES, EPOCH, _evaluate, _fake_ee, _Node
+
+DEFAULT_IMAGES = 40
+DEFAULT_LATENCY = 0.05
+DEFAULT_IN_FLIGHT = 4
+
+
+def _benchmark(n_images: int = DEFAULT_IMAGES, latency: float = DEFAULT_LATENCY,
+               in_flight: int = DEFAULT_IN_FLIGHT) -> List[Dict[str, Any]]:
+    os.environ.setdefault("EE_INIT_MODE", "lazy")  # nada de ee.Initialize() no import
+    os.environ["EE_RATE_LIMIT"] = "0"
+    sys.modules["ee"] = _fake_ee()
+    import agro_metrics
+    import soil_metrics
+    from ee_executor import EEExecutor
+    from ee_throttle import EEThrottle
+
+    counter = {"calls": 0}
+    lock = threading.Lock()
+
+    def _stub_evaluate(self, obj):
+        with lock:
+            counter["calls"] += 1
+        time.sleep(latency)
+        return _evaluate(obj, n_images)
+
+    EEExecutor._evaluate = _stub_evaluate
+    end_date = (date.fromisoformat(EPOCH) + timedelta(days=n_images * DAYS_BETWEEN_IMAGES - 1)).isoformat()
+    depths = list(soil_metrics.DEPTH_TO_BAND)
+    clay = soil_metrics.get_clay_image_depths(depths)
+    paths = {
+        "per_image_client": lambda: agro_metrics.per_image_timeseries(
+            _Node("collection"), _Node("geometry"), max_images=n_images, engine="client")["returned_count"],
+        "per_image_server_batched": lambda: sum(1 for _ in agro_metrics.iter_per_image_timeseries(
+            _Node("collection"), _Node("geometry"), max_images=n_images,
+            batch_size=agro_metrics.STREAM_BATCH_SIZE)),
+        "period_client": lambda: len(agro_metrics.period_timeseries(
+            _Node("collection"), _Node("geometry"), EPOCH, end_date, period_days=DAYS_BETWEEN_IMAGES, engine="client")),
+        "period_server": lambda: len(agro_metrics.period_timeseries(
+            _Node("collection"), _Node("geometry"), EPOCH, end_date, period_days=DAYS_BETWEEN_IMAGES)),
+        "clay_per_depth": lambda: len([soil_metrics.clay_stats(soil_metrics.get_clay_image(d), _Node("geometry"))
+                                       for d in depths]),
+        "clay_all_depths": lambda: len(soil_metrics.clay_stats_depths(clay, _Node("geometry"), depths)),
+    }
+
+    rows = []
+    for name, run in paths.items():
+        for limit in (1, in_flight):
+            executor = EEExecutor(max_in_flight=limit, throttle=EEThrottle(rate=0, max_concurrent=limit))
+            agro_metrics.ee_executor = soil_metrics.ee_executor = executor
+            counter["calls"] = 0
+            started = time.perf_counter()
+            returned = run()
+            rows.append({"path": name, "max_in_flight": limit, "getinfo_calls": counter["calls"],
+                         "returned": returned, "seconds": round(time.perf_counter() - started, 3)})
+    return rows
+
+
+if __name__ == "__main__":
+    # uso: python bench_executor.py [n_imagens] [--latency s] [--in-flight n]
+    argv = sys.argv[1:]
+    opts = {"--latency": DEFAULT_LATENCY, "--in-flight": DEFAULT_IN_FLIGHT}
+    for flag, default in list(opts.items()):
+        if flag in argv:
+            i = argv.index(flag)
+            opts[flag] = type(default)(argv[i + 1])
+            del argv[i:i + 2]
+    n = int(argv[0]) if argv else DEFAULT_IMAGES
+    print(json.dumps(_benchmark(n, opts["--latency"], opts["--in-flight"]), indent=2))
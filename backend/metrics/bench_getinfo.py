@@ -0,0 +1,162 @@
+# bench_getinfo.py
+"""
+Counts the Earth Engine round trips of the per-image time series for the
+"server" engine (size + series in one graph per batch) and the "client" engine
+(one getInfo for the size plus one per image).
+
+No credentials are needed: a minimal stand-in for the `ee` module builds the
+graphs agro_metrics creates, and EEExecutor._evaluate is replaced by a counter
+that evaluates them locally after sleeping `latency` seconds (one simulated
+round trip). Calls still go through the executor's bounded pool.
+
+    python bench_getinfo.py [n_images ...] [--latency 0.05]
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+from datetime import date
+from typing import Any, Dict, List
+
+N_IMAGES = (5, 20, 50, 100)
+DEFAULT_LATENCY = 0.05
+
+
+class _Node:
+    """Nó do grafo: qualquer atributo vira uma chamada encadeada (op, alvo, args)."""
+
+    def __init__(self, op: str, target: Any = None, *args: Any):
+        self.op, self.target, self.args = op, target, args
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: _Node(name, self, *args, *kwargs.values())
+
+    def __call__(self, *args, **kwargs):
+        return _Node("new", self, *args, *kwargs.values())
+
+
+def _fake_ee() -> types.ModuleType:
+    module = types.ModuleType("ee")
+    module.__getattr__ = lambda name: _Node(name)
+    return module
+
+
+# image i of the stand-in collection was taken DAYS_BETWEEN_IMAGES * i days after EPOCH
+EPOCH = "2024-01-01"
+DAYS_BETWEEN_IMAGES = 5
+
+
+class _Stats(dict):
+    """reduceRegion result: any "<band>_<stat>" key the caller asks for has a value."""
+
+    def get(self, key, default=None):
+        return super().get(key, 0.5)
+
+
+def _day(value: str) -> int:
+    return (date.fromisoformat(value[:10]) - date.fromisoformat(EPOCH)).days
+
+
+def _evaluate(obj: Any, n_images: int) -> Any:
+    """
+    Avalia o subconjunto do grafo usado pelas séries e pelo solo. Imagens são representadas
+    pelo índice, datas por dias desde EPOCH e composições pela imagem mediana.
+    """
+    if isinstance(obj, dict):
+        return {k: _evaluate(v, n_images) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_evaluate(v, n_images) for v in obj]
+    if not isinstance(obj, _Node):
+        return obj
+    op, args = obj.op, obj.args
+    if op == "collection":
+        return list(range(n_images))
+    if op == "literal":
+        return args[0]
+    if op == "new":
+        # ee.Date("YYYY-MM-DD"), ee.Dictionary({...}), ee.Image(img), ee.String(b)
+        if obj.target.op == "Date":
+            return _day(args[0])
+        return _evaluate(args[0], n_images) if args else None
+    if op == "If":
+        # ee.Algorithms.If: only the branch taken is evaluated
+        return _evaluate(args[1] if _evaluate(args[0], n_images) else args[2], n_images)
+    if op == "sequence":
+        first, last, step = (_evaluate(a, n_images) for a in args)
+        return list(range(first, last + 1, step))
+    target = _evaluate(obj.target, n_images)
+    if op == "size":
+        return len(target)
+    if op == "gt":
+        return target > args[0]
+    if op == "toList":
+        return target[:args[0]]
+    if op == "slice":
+        return target[args[0]:args[1] if len(args) > 1 else None]
+    if op == "get":
+        return target[_evaluate(args[0], n_images)]
+    if op == "map":
+        return [_evaluate(args[0](_Node("literal", None, v)), n_images) for v in target]
+    if op == "advance":
+        return target + _evaluate(args[0], n_images)
+    if op == "filterDate":
+        start, end = (_evaluate(a, n_images) for a in args)
+        return [i for i in target if start <= i * DAYS_BETWEEN_IMAGES < end]
+    if op == "median":
+        return target[len(target) // 2] if isinstance(target, list) else target
+    if op == "reduceRegion":
+        return _Stats(NDVI_mean=0.5 + target / 1000.0) if isinstance(target, int) else _Stats()
+    if op == "date":
+        return ("date", target)
+    if op == "format":
+        return time.strftime("%Y-%m-%d", time.gmtime(1704067200 + target[1] * DAYS_BETWEEN_IMAGES * 86400))
+    # select/divide/rename/sort/filterBounds/...: same image or collection
+    return target
+
+
+def _benchmark(n_images=N_IMAGES, latency: float = DEFAULT_LATENCY) -> List[Dict[str, Any]]:
+    os.environ.setdefault("EE_INIT_MODE", "lazy")  # nada de ee.Initialize() no import
+    os.environ["EE_RATE_LIMIT"] = "0"
+    sys.modules["ee"] = _fake_ee()
+    import agro_metrics
+    from ee_executor import EEExecutor
+
+    counter = {"calls": 0}
+    lock = threading.Lock()
+
+    def _stub_evaluate(self, obj):
+        with lock:
+            counter["calls"] += 1
+        time.sleep(latency)
+        return _evaluate(obj, current["n"])
+
+    current = {"n": 0}
+    EEExecutor._evaluate = _stub_evaluate
+    rows = []
+    for n in n_images:
+        current["n"] = n
+        for engine in agro_metrics.TIMESERIES_ENGINES:
+            counter["calls"] = 0
+            started = time.perf_counter()
+            series = agro_metrics.per_image_timeseries(_Node("collection"), _Node("geometry"), max_images=n,
+                                                       engine=engine)
+            rows.append({"images": n, "engine": engine, "getinfo_calls": counter["calls"],
+                         "returned": series["returned_count"],
+                         "seconds": round(time.perf_counter() - started, 3)})
+    return rows
+
+
+if __name__ == "__main__":
+    # uso: python bench_getinfo.py [n_imagens ...] [--latency s]
+    argv = sys.argv[1:]
+    latency = DEFAULT_LATENCY
+    if "--latency" in argv:
+        i = argv.index("--latency")
+        latency = float(argv[i + 1])
+        del argv[i:i + 2]
+    counts = tuple(int(a) for a in argv) or N_IMAGES
+    print(json.dumps(_benchmark(counts, latency), indent=2))
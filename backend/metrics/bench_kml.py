@@ -0,0 +1,63 @@
+# bench_kml.py
+"""
+Time and peak memory of kml_to_geojson on a synthetic KML with n_vertices 3D
+vertices split into n_placemarks Placemarks, next to the regex extraction of the
+first <coordinates> block that the service used before the streaming parser.
+
+    python bench_kml.py [n_vertices] [n_placemarks]
+"""
+import json
+import re
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict
+
+import numpy as np
+
+from kml_parser import kml_to_geojson
+
+
+def _benchmark(n_vertices: int = 100_000, n_placemarks: int = 1) -> Dict[str, Any]:
+    """
+    KML sintético com n_vertices (3D, divididos em n_placemarks): extração por regex
+    do primeiro <coordinates> (parser antigo) x kml_to_geojson. Tempo e pico de memória.
+    """
+    per = n_vertices // n_placemarks
+    placemarks = []
+    for p in range(n_placemarks):
+        coords = " ".join(f"{-47.0 + p * 0.01 + 1e-3 * np.cos(2 * np.pi * i / per):.8f},"
+                          f"{-15.0 + 1e-3 * np.sin(2 * np.pi * i / per):.8f},0" for i in range(per))
+        placemarks.append(f"<Placemark><Polygon><outerBoundaryIs><LinearRing><coordinates>{coords}"
+                          f"</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>")
+    kml = ('<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+           + "".join(placemarks) + "</Document></kml>")
+
+    def _regex(text):
+        m = re.search(r"<coordinates>(.*?)</coordinates>", text, re.DOTALL | re.IGNORECASE)
+        return [[[float(t.split(",")[0]), float(t.split(",")[1])] for t in re.split(r"\s+", m.group(1).strip())]]
+
+    out: Dict[str, Any] = {"vertices": n_vertices, "placemarks": n_placemarks, "kml_bytes": len(kml)}
+    for name, fn in (("regex", _regex), ("streaming", kml_to_geojson)):
+        started = time.perf_counter()
+        result = fn(kml)
+        elapsed = time.perf_counter() - started
+        # second run only for the peak: tracemalloc slows the parse down
+        tracemalloc.start()
+        fn(kml)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rings = result["coordinates"] if isinstance(result, dict) else result
+        if isinstance(result, dict) and result["type"] == "MultiPolygon":
+            rings = [r for poly in rings for r in poly]
+        # the regex parser only ever read the first <coordinates> block
+        out[name] = {"seconds": round(elapsed, 3), "peak_mb": round(peak / (1 << 20), 1),
+                     "vertices_read": sum(len(r) for r in rings)}
+    return out
+
+
+
+if __name__ == "__main__":
+    # uso: python bench_kml.py [n_vertices] [n_placemarks]
+    print(json.dumps(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+                                int(sys.argv[2]) if len(sys.argv) > 2 else 1), indent=2))
@@ -0,0 +1,50 @@
+# bench_local_soil.py
+"""
+Throughput of LocalSoilBackend.profile_stats: n_fields random fields (5-50
+pixels across) read from a synthetic size x size .npy raster with `depths` bands.
+
+    python bench_local_soil.py [n_fields]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from local_soil import LocalSoilBackend
+
+
+def _benchmark(n_fields: int = 5000, size: int = 4000, depths: int = 6) -> Dict[str, Any]:
+    """Raster sintético (.npy) de size x size pixels e n_fields talhões aleatórios de 5-50 pixels de lado."""
+    rng = np.random.default_rng(0)
+    pixel = 0.0025  # ~250 m
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clay.npy")
+        np.save(path, rng.integers(5, 60, size=(depths, size, size), dtype=np.int16))
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"transform": [pixel, 0, -50.0, 0, -pixel, -10.0], "nodata": -1}, f)
+        labels = [f"d{i}" for i in range(depths)]
+        backend = LocalSoilBackend(tmp, {"clay": {"scale_factor": 1}}, labels)
+
+        fields = []
+        for _ in range(n_fields):
+            x0 = -50.0 + rng.uniform(0, size - 60) * pixel
+            y0 = -10.0 - rng.uniform(60, size) * pixel
+            w, h = rng.uniform(5, 50, 2) * pixel
+            fields.append({"type": "Polygon", "coordinates": [[[x0, y0], [x0 + w, y0], [x0 + w / 2, y0 + h],
+                                                               [x0, y0 + h / 2], [x0, y0]]]})
+        started = time.perf_counter()
+        for geom in fields:
+            backend.profile_stats(geom, ["clay"], labels)
+        elapsed = time.perf_counter() - started
+    return {"fields": n_fields, "raster_px": size * size * depths, "seconds": round(elapsed, 3),
+            "ms_per_field": round(elapsed / n_fields * 1000, 3)}
+
+
+
+if __name__ == "__main__":
+    # uso: python bench_local_soil.py [n_talhoes]
+    print(json.dumps(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000), indent=2))
@@ -0,0 +1,130 @@
+# compute_jobs.py
+"""
+Asynchronous jobs for long /compute requests.
+
+POST /compute/jobs hands the validated request to a local worker pool and
+returns a job id right away; clients poll GET /compute/jobs/<id> for status,
+progress and the final result. Every job is persisted as JSON under the jobs
+directory, so finished results survive a restart and jobs that were still
+queued or running are resubmitted when the manager starts again.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+PENDING_STATES = ("queued", "running")
+
+
+class ComputeJobs:
+    def __init__(self, runner: Callable[..., Any], store_dir: str, workers: int = 2,
+                 retention_days: int = 7):
+        """
+        runner(params, progress) -> (body, status) executa o job;
+        progress(done, total) é repassado para atualizar o andamento.
+        """
+        self.runner = runner
+        self.store_dir = store_dir
+        self.retention_days = retention_days
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute-job")
+        os.makedirs(store_dir, exist_ok=True)
+        self._load()
+
+    # ---------- persistence ----------
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.store_dir, job_id + ".json")
+
+    def _save(self, job: Dict[str, Any]):
+        fd, tmp = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(job, f, default=str)
+            os.replace(tmp, self._path(job["id"]))
+        except OSError as e:
+            print("Falha ao gravar job:", e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _load(self):
+        cutoff = time.time() - self.retention_days * 86400
+        for name in os.listdir(self.store_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.store_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job.get("status") not in PENDING_STATES and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                continue
+            self._jobs[job["id"]] = job
+            if job.get("status") in PENDING_STATES:
+                # interrupted by a restart: run it again from scratch
+                job["status"] = "queued"
+                job["progress"] = {"done": 0, "total": None}
+                self._save(job)
+                self._pool.submit(self._execute, job["id"])
+
+    # ---------- public API ----------
+    def submit(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": {"done": 0, "total": None},
+            "params": params,
+            "status_code": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._save(job)
+        self._pool.submit(self._execute, job["id"])
+        return self.describe(job["id"])
+
+    def describe(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            out = {k: v for k, v in job.items() if k != "params"}
+            if not include_result:
+                out.pop("result", None)
+            return out
+
+    # ---------- worker ----------
+    def _update(self, job_id: str, persist: bool = True, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if persist:
+                self._save(job)
+
+    def _execute(self, job_id: str):
+        params = self._jobs[job_id]["params"]
+        self._update(job_id, status="running", started_at=datetime.utcnow().isoformat())
+
+        def _progress(done, total):
+            self._update(job_id, persist=False, progress={"done": done, "total": total})
+
+        try:
+            body, status = self.runner(params, _progress)
+            self._update(job_id, status="done" if status == 200 else "failed", status_code=status,
+                         result=body, finished_at=datetime.utcnow().isoformat())
+        except Exception as e:
+            self._update(job_id, status="failed", status_code=500, error=str(e),
+                         finished_at=datetime.utcnow().isoformat())
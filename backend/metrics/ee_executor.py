@@ -0,0 +1,116 @@
+# ee_executor.py
+"""
+Bounded-concurrency executor for independent Earth Engine getInfo calls.
+
+Per-period / per-image reductions don't depend on each other, so instead of
+evaluating them one after another they are dispatched to a shared thread pool
+whose size caps the number of EE requests in flight for the whole process.
+Results always come back in submission order. Each call is also rate limited
+and retried on quota errors by the process-wide throttle (ee_throttle.py).
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from ee_throttle import EEThrottle, throttle_from_env
+from instrumentation import record_ee_call
+
+
+class EEExecutor:
+    def __init__(self, max_in_flight: int = 4, timeout: Optional[float] = None,
+                 throttle: Optional[EEThrottle] = None):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.timeout = timeout
+        self.throttle = throttle or EEThrottle(max_concurrent=self.max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="ee-getinfo")
+
+    def _run(self, fn):
+        def _timed():
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception:
+                record_ee_call(time.perf_counter() - started, ok=False)
+                raise
+            record_ee_call(time.perf_counter() - started, result)
+            return result
+        return self.throttle.call(_timed)
+
+    def _evaluate(self, obj):
+        return self._run(obj.getInfo)
+
+    def _submit(self, obj):
+        # the worker runs in the caller's context so the request trace sees the call
+        return self._pool.submit(contextvars.copy_context().run, self._evaluate, obj)
+
+    def _result(self, future, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # the EE request keeps its worker until it returns; we just stop waiting
+            future.cancel()
+            raise TimeoutError(f"Earth Engine call exceeded {timeout}s")
+
+    def call(self, fn, timeout: Optional[float] = None) -> Any:
+        """Outra chamada ao EE (ex.: ee.data.computePixels) sob o mesmo limite, throttle e métricas."""
+        future = self._pool.submit(contextvars.copy_context().run, self._run, fn)
+        return self._result(future, timeout or self.timeout)
+
+    def get_info(self, obj, timeout: Optional[float] = None) -> Any:
+        """getInfo() de um único objeto EE respeitando o limite de chamadas em voo."""
+        return self._result(self._submit(obj), timeout or self.timeout)
+
+    def imap_get_info(self, objs: Iterable, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        Avalia os objetos concorrentemente e devolve os resultados na ordem de entrada,
+        assim que cada um (e os anteriores) fica pronto. No máximo max_in_flight
+        chamadas ficam pendentes por iterador.
+        """
+        timeout = timeout or self.timeout
+        pending = []
+        it = iter(objs)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.max_in_flight:
+                try:
+                    pending.append(self._submit(next(it)))
+                except StopIteration:
+                    exhausted = True
+            if not pending:
+                return
+            future = pending.pop(0)
+            try:
+                yield self._result(future, timeout)
+            except BaseException:
+                for f in pending:
+                    f.cancel()
+                raise
+
+    def map_get_info(self, objs: Iterable, timeout: Optional[float] = None) -> List[Any]:
+        return list(self.imap_get_info(objs, timeout=timeout))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_in_flight": self.max_in_flight, **self.throttle.stats()}
+
+
+_executor: Optional[EEExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> EEExecutor:
+    """Executor compartilhado do processo (EE_MAX_IN_FLIGHT / EE_CALL_TIMEOUT / EE_RATE_* no .env)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            timeout = os.getenv("EE_CALL_TIMEOUT")
+            max_in_flight = int(os.getenv("EE_MAX_IN_FLIGHT", "4"))
+            _executor = EEExecutor(
+                max_in_flight=max_in_flight,
+                timeout=float(timeout) if timeout else None,
+                throttle=throttle_from_env(default_concurrency=max_in_flight),
+            )
+        return _executor
+
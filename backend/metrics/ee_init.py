@@ -0,0 +1,183 @@
+# ee_init.py
+"""
+Earth Engine initialization shared by agro_metrics.py and soil_metrics.py.
+
+Initialization runs once per process, either in a background thread started at
+import (EE_INIT_MODE=background, default) or on the first request that needs EE
+(EE_INIT_MODE=lazy), so importing a service never blocks on authentication.
+Interactive ee.Authenticate() is never attempted by the services; it is only
+available by running this module directly for local development:
+
+    python ee_init.py
+"""
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import ee
+from flask import jsonify, make_response
+
+_lock = threading.Lock()
+_done = threading.Event()
+_state: Dict[str, Any] = {
+    "status": "not_started",  # not_started | initializing | ready | failed
+    "method": None,
+    "project": None,
+    "error": None,
+    "init_seconds": None,
+}
+# a failed init is retried by the next caller after this many seconds
+RETRY_AFTER_S = 30
+_last_attempt = 0.0
+
+
+def init_ee(allow_interactive: bool = False) -> str:
+    """Inicializa o EE (service account -> credenciais locais). Retorna o método usado."""
+    service_account = os.getenv("SERVICE_ACCOUNT_EMAIL")
+    key_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_PATH")
+    project = os.getenv("GEE_PROJECT")
+
+    # try to extract key and user from key JSON if path exists
+    if (not project or not service_account) and key_path and os.path.exists(key_path):
+        try:
+            with open(key_path, "r") as f:
+                jd = json.load(f)
+                if not service_account:
+                    service_account = jd.get("client_email")
+                if not project:
+                    project = jd.get("project_id")
+        except Exception as e:
+            print("Erro lendo JSON da chave:", e)
+    _state["project"] = project
+
+    # try to initialize with service account credentials
+    if service_account and key_path and os.path.exists(key_path):
+        try:
+            creds = ee.ServiceAccountCredentials(service_account, key_path)
+            if project:
+                ee.Initialize(creds, project=project)
+            else:
+                ee.Initialize(creds)
+            print("EE initialized with Service Account:", service_account, "project:", project)
+            return "service_account"
+        except Exception as e:
+            print("Falha ao inicializar EE com service account:", e)
+
+    # fallback: existing application-default credentials
+    try:
+        _initialize_default(project)
+        print("EE initialized with existing application-default credentials.")
+        return "application_default"
+    except Exception:
+        if not allow_interactive:
+            raise
+    print("Attempting interactive ee.Authenticate() - only for local dev.")
+    ee.Authenticate()
+    _initialize_default(project)
+    return "interactive"
+
+
+def _initialize_default(project: Optional[str]) -> None:
+    if project:
+        ee.Initialize(project=project)
+    else:
+        ee.Initialize()
+
+
+def _run_init():
+    global _last_attempt
+    started = time.perf_counter()
+    try:
+        method = init_ee(allow_interactive=False)
+        _state.update(status="ready", method=method, error=None)
+    except Exception as e:
+        _state.update(status="failed", error=str(e))
+        print("Earth Engine indisponível:", e)
+    finally:
+        _state["init_seconds"] = round(time.perf_counter() - started, 3)
+        _last_attempt = time.time()
+        _done.set()
+
+
+def start_background_init() -> None:
+    """Dispara a inicialização numa thread (uma vez por processo)."""
+    with _lock:
+        if _state["status"] in ("initializing", "ready"):
+            return
+        if _state["status"] == "failed" and time.time() - _last_attempt < RETRY_AFTER_S:
+            return
+        _state["status"] = "initializing"
+        _done.clear()
+    threading.Thread(target=_run_init, name="ee-init", daemon=True).start()
+
+
+def ensure_ee(timeout: Optional[float] = None) -> None:
+    """Bloqueia até o EE estar pronto; RuntimeError se a inicialização falhar."""
+    if _state["status"] == "ready":
+        return
+    start_background_init()
+    if not _done.wait(timeout):
+        raise RuntimeError("Inicialização do Earth Engine ainda em andamento.")
+    if _state["status"] != "ready":
+        raise RuntimeError(f"Falha ao inicializar o Earth Engine: {_state['error']}")
+
+
+def ee_status() -> Dict[str, Any]:
+    return dict(_state)
+
+
+def requires_ee(view):
+    """Decorator de rota: garante o EE inicializado ou responde 503."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            ensure_ee(timeout=float(os.getenv("EE_INIT_TIMEOUT", "60")))
+        except RuntimeError as e:
+            return make_response(jsonify({"detail": str(e), "ee": ee_status()}), 503)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class StartupClock:
+    """Tempo desde o início do import do serviço até o módulo carregado e a primeira resposta."""
+
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        if name not in self.marks:
+            self.marks[name] = round(time.perf_counter() - self.t0, 3)
+            print(f"startup: {name} after {self.marks[name]}s")
+
+    def as_dict(self) -> Dict[str, float]:
+        return {f"{k}_seconds": v for k, v in self.marks.items()}
+
+
+def register_startup_hooks(app, clock: StartupClock) -> None:
+    """Adiciona GET /ready e mede import -> primeira requisição atendida."""
+    @app.after_request
+    def _first_request(resp):
+        clock.mark("first_request")
+        return resp
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        status = ee_status()
+        if status["status"] == "not_started":
+            start_background_init()
+        body = {"ready": status["status"] == "ready", "ee": status, "startup": clock.as_dict()}
+        return make_response(jsonify(body), 200 if body["ready"] else 503)
+
+    if os.getenv("EE_INIT_MODE", "background") == "background":
+        start_background_init()
+
+
+if __name__ == "__main__":
+    # local dev only: allows the interactive browser login
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+    print("method:", init_ee(allow_interactive=True))
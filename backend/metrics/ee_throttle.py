@@ -0,0 +1,146 @@
+# ee_throttle.py
+"""
+Process-wide throttling of Earth Engine requests.
+
+Every getInfo goes through EEThrottle.call (see ee_executor.py): a token bucket
+caps the request rate, a semaphore caps the requests actually running, and
+quota/concurrency errors ("Too many concurrent aggregations", HTTP 429, rate
+limits) are retried with jittered exponential backoff instead of failing the
+whole request. When the retries run out, EEQuotaExceeded is raised and the
+services answer HTTP 429 so callers can back off too.
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# substrings of EE errors worth retrying (quota, rate and transient backend errors)
+RETRYABLE_ERRORS = (
+    "too many concurrent aggregations",
+    "too many requests",
+    "quota",
+    "rate limit",
+    "429",
+    "503",
+    "service unavailable",
+    "backend error",
+)
+
+
+class EEQuotaExceeded(RuntimeError):
+    """Retries exhausted on a quota/rate error; mapped to HTTP 429 by the services."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return any(s in msg for s in RETRYABLE_ERRORS)
+
+
+class TokenBucket:
+    """rate tokens/s com rajada de até `burst`; rate <= 0 desativa o limite."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Consome um token, esperando se necessário. Retorna o tempo esperado (s)."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EEThrottle:
+    def __init__(self, rate: float = 10.0, burst: int = 10, max_concurrent: int = 4, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 32.0, sleep: Callable[[float], None] = time.sleep):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._sem = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "succeeded": 0, "throttled": 0, "retried": 0, "failed": 0, "quota_exhausted": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniforme em [0, min(max_delay, base * 2^attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Executa fn() (ex.: obj.getInfo) respeitando taxa/concorrência, com retry em erros de cota."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            throttled = self.bucket.acquire() > 0
+            if not self._sem.acquire(blocking=False):
+                throttled = True
+                self._sem.acquire()
+            if throttled:
+                self._count("throttled")
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+            else:
+                self._count("succeeded")
+                return result
+            finally:
+                self._sem.release()
+
+            if not is_retryable(error):
+                self._count("failed")
+                raise error
+            if attempt >= self.max_retries:
+                self._count("failed")
+                self._count("quota_exhausted")
+                raise EEQuotaExceeded(f"Cota do Earth Engine excedida após {attempt + 1} tentativas: {error}",
+                                      retry_after=self.max_delay) from error
+            delay = self.backoff(attempt)
+            self._count("retried")
+            print(f"EE: erro de cota ({error}); nova tentativa {attempt + 1}/{self.max_retries} em {delay:.1f}s")
+            self._sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.counters)
+        out.update({"rate": self.bucket.rate, "burst": self.bucket.burst, "max_concurrent": self.max_concurrent,
+                    "max_retries": self.max_retries})
+        return out
+
+
+def throttle_from_env(default_concurrency: Optional[int] = None) -> EEThrottle:
+    """EE_RATE_LIMIT (req/s, 0 = sem limite), EE_RATE_BURST, EE_MAX_CONCURRENT, EE_MAX_RETRIES, EE_BACKOFF_*."""
+    concurrency = os.getenv("EE_MAX_CONCURRENT") or default_concurrency or 4
+    return EEThrottle(
+        rate=float(os.getenv("EE_RATE_LIMIT", "10")),
+        burst=int(os.getenv("EE_RATE_BURST", "10")),
+        max_concurrent=int(concurrency),
+        max_retries=int(os.getenv("EE_MAX_RETRIES", "5")),
+        base_delay=float(os.getenv("EE_BACKOFF_BASE", "1")),
+        max_delay=float(os.getenv("EE_BACKOFF_MAX", "32")),
+    )
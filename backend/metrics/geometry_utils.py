@@ -0,0 +1,194 @@
+# geometry_utils.py
+"""
+Geometry preprocessing shared by agro_metrics.py and soil_metrics.py.
+
+Client polygons (GPS traces, drawn boundaries) can carry thousands of vertices,
+which bloats Earth Engine payloads and slows reduceRegion. Before a polygon is
+sent to EE it is closed, deduplicated, stripped of collinear points, simplified
+with a tolerance scaled to the reduction scale and capped at a vertex budget.
+"""
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# simplification tolerance as a fraction of the reduction scale (10 m -> 2.5 m)
+DEFAULT_TOLERANCE_FACTOR = 0.25
+DEFAULT_MAX_VERTICES = 5000
+# meters per degree of latitude (mean)
+METERS_PER_DEGREE = 111320.0
+
+
+def geojson_polygons(geojson: Dict[str, Any]) -> List[List[List[List[float]]]]:
+    """Lista de polígonos (cada um uma lista de anéis) de um Polygon/MultiPolygon/Feature."""
+    if not isinstance(geojson, dict):
+        raise ValueError("GeoJSON is not Polygon/MultiPolygon.")
+    if geojson.get("type") == "Feature":
+        geojson = geojson.get("geometry") or {}
+    geom_type = geojson.get("type")
+    if geom_type == "Polygon":
+        return [geojson.get("coordinates") or []]
+    if geom_type == "MultiPolygon":
+        return list(geojson.get("coordinates") or [])
+    raise ValueError("GeoJSON is not Polygon/MultiPolygon.")
+
+
+def polygons_to_geojson(polygons) -> Dict[str, Any]:
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def normalize_max_vertices(value: Any) -> int:
+    """Orçamento de vértices validado (0/None = sem limite); ValueError para valores não inteiros."""
+    if value is None:
+        return 0
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError("max_vertices deve ser um inteiro >= 0.")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("max_vertices deve ser um inteiro >= 0.")
+    if value < 0:
+        raise ValueError("max_vertices deve ser um inteiro >= 0.")
+    return value
+
+
+def count_vertices(polygons) -> int:
+    """Vértices distintos (o ponto de fechamento de cada anel não conta)."""
+    total = 0
+    for poly in polygons:
+        for ring in poly:
+            n = len(ring)
+            if n > 1 and list(ring[0][:2]) == list(ring[-1][:2]):
+                n -= 1
+            total += n
+    return total
+
+
+def geometry_area_m2(geojson: Dict[str, Any]) -> float:
+    """Área aproximada (m²) de um Polygon/MultiPolygon: anéis externos menos furos."""
+    total = 0.0
+    for poly in geojson_polygons(geojson):
+        for i, ring in enumerate(poly):
+            pts = np.asarray(ring, dtype=np.float64)[:, :2]
+            area = abs(_signed_area(_to_local_meters(pts, float(pts[:, 1].mean()))))
+            total += area if i == 0 else -area
+    return max(total, 0.0)
+
+
+def _to_local_meters(pts: np.ndarray, lat0: float) -> np.ndarray:
+    """Equirectangular projection around lat0, good enough for field-sized distances."""
+    return np.column_stack((pts[:, 0] * METERS_PER_DEGREE * math.cos(math.radians(lat0)),
+                            pts[:, 1] * METERS_PER_DEGREE))
+
+
+def _signed_area(xy: np.ndarray) -> float:
+    x, y = xy[:, 0], xy[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _dedupe(pts: np.ndarray, xy: np.ndarray, eps: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Remove pontos repetidos consecutivos e pontos colineares (ring aberto)."""
+    keep = np.ones(len(xy), dtype=bool)
+    keep[1:] = np.any(np.abs(np.diff(xy, axis=0)) > eps, axis=1)
+    pts, xy = pts[keep], xy[keep]
+    if len(xy) > 1 and np.all(np.abs(xy[0] - xy[-1]) <= eps):
+        pts, xy = pts[:-1], xy[:-1]
+    if len(xy) < 3:
+        return pts, xy
+    prev_xy, next_xy = np.roll(xy, 1, axis=0), np.roll(xy, -1, axis=0)
+    cross = (xy[:, 0] - prev_xy[:, 0]) * (next_xy[:, 1] - xy[:, 1]) - \
+            (xy[:, 1] - prev_xy[:, 1]) * (next_xy[:, 0] - xy[:, 0])
+    seg = np.hypot(*(next_xy - prev_xy).T)
+    # triangle height below eps -> collinear
+    keep = np.abs(cross) > eps * np.maximum(seg, eps)
+    if keep.sum() < 3:
+        return pts, xy
+    return pts[keep], xy[keep]
+
+
+def _douglas_peucker(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """Índices mantidos por Douglas-Peucker (iterativo) numa polilinha aberta."""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        rel = xy[start + 1:end] - xy[start]
+        seg_len = math.hypot(seg[0], seg[1])
+        if seg_len == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            idx = start + 1 + i
+            keep[idx] = True
+            stack.append((start, idx))
+            stack.append((idx, end))
+    return np.flatnonzero(keep)
+
+
+def _clean_ring(ring, tolerance_m: float, exterior: bool, lat0: float) -> List[List[float]]:
+    pts = np.asarray(ring, dtype=np.float64)
+    if pts.ndim != 2 or pts.shape[0] < 3 or pts.shape[1] < 2:
+        raise ValueError("Anel de polígono inválido (menos de 3 vértices).")
+    pts = pts[:, :2]
+    xy = _to_local_meters(pts, lat0)
+    pts, xy = _dedupe(pts, xy, eps=1e-6)
+    if len(xy) < 3:
+        raise ValueError("Anel de polígono inválido (menos de 3 vértices distintos).")
+
+    if tolerance_m > 0 and len(xy) > 3:
+        # split the ring at its farthest point from the first vertex so both
+        # halves are open polylines for Douglas-Peucker
+        far = int(np.argmax(np.hypot(*(xy - xy[0]).T)))
+        idx = np.concatenate((_douglas_peucker(xy[:far + 1], tolerance_m),
+                              far + _douglas_peucker(np.vstack((xy[far:], xy[:1])), tolerance_m)[1:-1]))
+        if len(idx) >= 3:
+            pts, xy = pts[idx], xy[idx]
+
+    # RFC 7946: exterior rings counterclockwise, holes clockwise
+    if (_signed_area(xy) > 0) != exterior:
+        pts = pts[::-1]
+    out = pts.tolist()
+    out.append(out[0])
+    return out
+
+
+def prepare_geometry(geojson: Dict[str, Any], scale: float = 10,
+                     tolerance_factor: float = DEFAULT_TOLERANCE_FACTOR,
+                     max_vertices: int = DEFAULT_MAX_VERTICES,
+                     simplify: bool = True) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Normaliza e simplifica um Polygon/MultiPolygon antes de enviá-lo ao Earth Engine.
+    Retorna (geojson_preparado, info) com as contagens de vértices original e simplificada.
+    """
+    max_vertices = normalize_max_vertices(max_vertices)
+    polygons = geojson_polygons(geojson)
+    if not polygons or not all(polygons):
+        raise ValueError("GeoJSON sem coordenadas.")
+    original = count_vertices(polygons)
+    lat0 = float(np.mean([pt[1] for pt in polygons[0][0]]))
+
+    tolerance_m = scale * tolerance_factor if simplify else 0.0
+    while True:
+        prepared = [[_clean_ring(ring, tolerance_m, i == 0, lat0) for i, ring in enumerate(poly)]
+                    for poly in polygons]
+        simplified = count_vertices(prepared)
+        if not max_vertices or simplified <= max_vertices or tolerance_m > scale * 1000:
+            break
+        # over budget: coarsen the tolerance until the polygon fits
+        tolerance_m = max(tolerance_m * 2, scale * DEFAULT_TOLERANCE_FACTOR)
+
+    info = {
+        "original": original,
+        "simplified": simplified,
+        "tolerance_m": round(tolerance_m, 3),
+    }
+    return polygons_to_geojson(prepared), info
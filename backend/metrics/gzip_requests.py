@@ -0,0 +1,57 @@
+# gzip_requests.py
+"""
+Accepts gzip-compressed request bodies (Content-Encoding: gzip).
+
+The CRUD backfill sends large polygons compressed (see CRUD/services/http_client.py).
+accept_gzip_requests() wraps the WSGI app so the body is inflated before Flask
+reads it; views keep using request.get_json() unchanged. The inflated size is
+capped (REQUEST_MAX_INFLATED_MB) so a small compressed body can't expand without
+bound.
+"""
+import io
+import os
+import zlib
+
+DEFAULT_MAX_INFLATED_MB = 64
+
+
+def _error(start_response, status: str, detail: str):
+    body = ('{"detail": "%s"}' % detail).encode("utf-8")
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+class GzipRequestMiddleware:
+    def __init__(self, wsgi_app, max_bytes: int = DEFAULT_MAX_INFLATED_MB << 20):
+        self.wsgi_app = wsgi_app
+        self.max_bytes = max_bytes
+
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").strip().lower() != "gzip":
+            return self.wsgi_app(environ, start_response)
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        raw = environ["wsgi.input"].read(length) if length else environ["wsgi.input"].read()
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip header
+        try:
+            body = inflater.decompress(raw, self.max_bytes + 1)
+        except zlib.error:
+            return _error(start_response, "400 BAD REQUEST", "Corpo gzip inválido.")
+        if len(body) > self.max_bytes or inflater.unconsumed_tail:
+            return _error(start_response, "413 REQUEST ENTITY TOO LARGE",
+                          f"Corpo descomprimido excede {self.max_bytes} bytes.")
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+
+def accept_gzip_requests(app) -> None:
+    """
+    Descomprime corpos Content-Encoding: gzip antes do Flask. O limite REQUEST_MAX_INFLATED_MB
+    é lido aqui (depois do load_dotenv dos serviços), não no import.
+    """
+    max_mb = float(os.getenv("REQUEST_MAX_INFLATED_MB", str(DEFAULT_MAX_INFLATED_MB)))
+    app.wsgi_app = GzipRequestMiddleware(app.wsgi_app, max_bytes=int(max_mb * (1 << 20)))
@@ -0,0 +1,85 @@
+# histogram_stats.py
+"""
+Statistics derived locally from the fixed-bin histograms returned by /compute.
+
+With "histogram" enabled, /compute stores, per index, the pixel counts of
+`bins` equal-width bins over the index's range (see agro_metrics.HISTOGRAM_RANGES;
+each histogram carries its own "range").
+Any percentile, the IQR or the coefficient of variation can then be computed
+from stored responses without asking Earth Engine again. All functions accept a
+single histogram (1-D counts) or many stacked as rows (2-D) and are vectorized
+over the rows.
+"""
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def bin_edges(bins: int, value_range: Sequence[float] = (-1.0, 1.0)) -> np.ndarray:
+    return np.linspace(float(value_range[0]), float(value_range[1]), int(bins) + 1)
+
+
+def _counts(counts) -> np.ndarray:
+    arr = np.asarray(counts, dtype=np.float64)
+    return np.nan_to_num(arr)[None, :] if arr.ndim == 1 else np.nan_to_num(arr)
+
+
+def _squeeze(out: np.ndarray, counts) -> np.ndarray:
+    return out[0] if np.ndim(counts) == 1 else out
+
+
+def percentiles(counts, qs: Iterable[float], value_range: Sequence[float] = (-1.0, 1.0)) -> np.ndarray:
+    """
+    Percentis (0-100) por interpolação linear dentro do bin. counts (B,) -> (Q,);
+    counts (N, B) -> (N, Q). Histogramas vazios dão NaN.
+    """
+    c = _counts(counts)
+    q = np.asarray(list(qs), dtype=np.float64) / 100.0
+    edges = bin_edges(c.shape[1], value_range)
+    cdf = np.cumsum(c, axis=1)
+    total = cdf[:, -1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        target = q[None, :] * total                                     # (N, Q)
+        # first bin whose cumulative count reaches the target
+        idx = np.minimum((cdf[:, None, :] < target[:, :, None]).sum(axis=2), c.shape[1] - 1)
+        before = np.take_along_axis(np.concatenate((np.zeros_like(total), cdf[:, :-1]), axis=1), idx, axis=1)
+        in_bin = np.take_along_axis(c, idx, axis=1)
+        frac = np.where(in_bin > 0, (target - before) / in_bin, 0.0)
+        out = edges[idx] + np.clip(frac, 0.0, 1.0) * (edges[1] - edges[0])
+    out[(total[:, 0] == 0)] = np.nan
+    return _squeeze(out, counts)
+
+
+def mean_std(counts, value_range: Sequence[float] = (-1.0, 1.0)) -> Tuple[np.ndarray, np.ndarray]:
+    """Média e desvio padrão aproximados pelos centros dos bins."""
+    c = _counts(counts)
+    edges = bin_edges(c.shape[1], value_range)
+    centers = (edges[:-1] + edges[1:]) / 2
+    total = c.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (c @ centers) / total
+        var = (c @ (centers ** 2)) / total - mean ** 2
+    std = np.sqrt(np.maximum(var, 0.0))
+    return _squeeze(mean, counts), _squeeze(std, counts)
+
+
+def iqr(counts, value_range: Sequence[float] = (-1.0, 1.0)) -> np.ndarray:
+    p = np.atleast_2d(percentiles(counts, (25, 75), value_range))
+    return _squeeze(p[:, 1] - p[:, 0], counts)
+
+
+def coefficient_of_variation(counts, value_range: Sequence[float] = (-1.0, 1.0)) -> np.ndarray:
+    """desvio / |média| (índice de uniformidade: menor = talhão mais uniforme)."""
+    mean, std = mean_std(counts, value_range)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return std / np.abs(mean)
+
+
+def summarize(histogram: Dict[str, Any], qs: Iterable[float] = (10, 25, 50, 75, 90)) -> Dict[str, Optional[float]]:
+    """Resumo de um histograma no formato da resposta ({"range", "bins", "counts"})."""
+    counts, value_range = histogram["counts"], histogram["range"]
+    qs = list(qs)
+    out = {f"p{q:g}": v for q, v in zip(qs, percentiles(counts, qs, value_range).tolist())}
+    out["iqr"] = float(iqr(counts, value_range))
+    out["cv"] = float(coefficient_of_variation(counts, value_range))
+    return {k: (None if v is None or np.isnan(v) else v) for k, v in out.items()}
@@ -0,0 +1,75 @@
+# index_formulas.py
+"""
+Vegetation index formulas shared by the Earth Engine and the NumPy backends.
+
+Each entry of INDEX_FORMULAS is written once, with Python operators, over a
+mapping of Sentinel-2 bands in reflectance. The NumPy backend
+(local_indices.py) passes arrays; agro_metrics.calc_indices_from_image passes
+ImageBands, whose ImageExpr operators build the same ee.Image graph (add, subtract,
+multiply, divide). Formulas only put a band on the left of an operator, so
+ee.Image methods can express every step.
+"""
+from typing import Any, Callable, Dict, List
+
+S2_BANDS = ["B2", "B3", "B4", "B5", "B6", "B7", "B8", "B8A", "B11", "B12"]
+
+# bands each index reads (BIOMASSA_PROXY is derived from NDVI); key order is the output band order
+INDEX_BANDS: Dict[str, List[str]] = {
+    "NDVI": ["B4", "B8"],
+    "EVI": ["B2", "B4", "B8"],
+    "NDWI": ["B3", "B8"],
+    "NDMI": ["B8", "B11"],
+    "GNDVI": ["B3", "B8"],
+    "NDRE": ["B5", "B8"],
+    "RENDVI": ["B6", "B8"],
+    "BIOMASSA_PROXY": ["B4", "B8"],
+}
+
+
+def normalized_difference(x, y):
+    return (x - y) / (x + y)
+
+
+INDEX_FORMULAS: Dict[str, Callable[[Any], Any]] = {
+    "NDVI": lambda b: normalized_difference(b["B8"], b["B4"]),
+    "EVI": lambda b: (b["B8"] - b["B4"]) * 2.5 / (b["B8"] + b["B4"] * 6 - b["B2"] * 7.5 + 1),
+    "NDWI": lambda b: normalized_difference(b["B3"], b["B8"]),
+    "NDMI": lambda b: normalized_difference(b["B8"], b["B11"]),
+    "GNDVI": lambda b: normalized_difference(b["B8"], b["B3"]),
+    "NDRE": lambda b: normalized_difference(b["B8"], b["B5"]),
+    "RENDVI": lambda b: normalized_difference(b["B8"], b["B6"]),
+    "BIOMASSA_PROXY": lambda b: (normalized_difference(b["B8"], b["B4"]) + 1) / 2,
+}
+
+
+class ImageExpr:
+    """Imagem (ee.Image ou compatível) com operadores Python, para avaliar INDEX_FORMULAS."""
+
+    def __init__(self, image):
+        self.image = image
+
+    @staticmethod
+    def _operand(other):
+        return other.image if isinstance(other, ImageExpr) else other
+
+    def __add__(self, other):
+        return ImageExpr(self.image.add(self._operand(other)))
+
+    def __sub__(self, other):
+        return ImageExpr(self.image.subtract(self._operand(other)))
+
+    def __mul__(self, other):
+        return ImageExpr(self.image.multiply(self._operand(other)))
+
+    def __truediv__(self, other):
+        return ImageExpr(self.image.divide(self._operand(other)))
+
+
+class ImageBands:
+    """b["B8"] -> ImageExpr(image.select("B8"))."""
+
+    def __init__(self, image):
+        self.image = image
+
+    def __getitem__(self, band: str) -> ImageExpr:
+        return ImageExpr(self.image.select(band))
@@ -0,0 +1,259 @@
+# instrumentation.py
+"""
+Per-request spans and Prometheus-style metrics for the metrics services.
+
+instrument_app() opens a RequestTrace for every request; code on the hot path
+wraps its stages in span("name") and the EE executor reports every getInfo via
+record_ee_call (the trace follows the request into executor threads through
+contextvars, also while a streamed NDJSON body is produced). Request latency and
+EE calls per request are recorded when the response is closed, after the last
+streamed chunk. Aggregates are exposed in Prometheus text format on GET /metrics;
+sending "X-Debug-Timing: 1" (or DEBUG_TIMING=1 in the .env) adds the request's
+own breakdown as an X-Debug-Timing response header. JSON results are only sized
+(json.dumps) for debug-timing requests and for a sample of the other calls.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# one JSON result in N is serialized to feed ee_response_bytes (0 = only debug-timing requests);
+# EE_RESPONSE_SIZE_SAMPLE_EVERY is read by instrument_app, after the services load their .env
+RESPONSE_SIZE_SAMPLE_EVERY = 20
+_ee_call_seq = itertools.count()
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.buckets, self.labels = name, help_text, buckets, labels
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # label values -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            row = self._series.setdefault(label_values, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, row in sorted(self._series.items()):
+                base = _labels(self.labels, label_values)
+                for bound, n in zip(self.buckets, row):
+                    lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le=bound)} {n:g}')
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le="+Inf")} {row[-1]:g}')
+                lines.append(f"{self.name}_sum{base} {row[-2]:.6f}")
+                lines.append(f"{self.name}_count{base} {row[-1]:g}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {v:g}")
+        return lines
+
+
+def _labels(names, values, le=None) -> str:
+    pairs = [f'{k}="{v}"' for k, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency (until the response body is sent).",
+                            LATENCY_BUCKETS, ("endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("request_stage_duration_seconds", "Time spent in each instrumented stage.",
+                          LATENCY_BUCKETS, ("endpoint", "stage"))
+EE_CALL_SECONDS = Histogram("ee_call_duration_seconds", "Latency of each Earth Engine getInfo call.",
+                            LATENCY_BUCKETS, ("outcome",))
+EE_RESPONSE_BYTES = Histogram("ee_response_bytes", "Size of Earth Engine results (pixel arrays, sampled JSON).",
+                              SIZE_BUCKETS)
+EE_CALLS_PER_REQUEST = Histogram("ee_calls_per_request", "getInfo round trips per request.",
+                                 (0, 1, 2, 5, 10, 20, 50, 100, 200), ("endpoint",))
+EE_CALLS = Counter("ee_calls_total", "Earth Engine getInfo calls.", ("outcome",))
+
+# extra gauges (e.g. cache hit ratio): name -> (help, callback returning a number or None)
+_gauges: Dict[str, Tuple[str, Callable[[], Optional[float]]]] = {}
+
+
+class RequestTrace:
+    """Spans and EE cost of a single request (shared with the executor threads)."""
+
+    def __init__(self, endpoint: str, debug: bool = False):
+        self.endpoint = endpoint
+        self.debug = debug  # X-Debug-Timing requested: every result is sized
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.ee_calls = 0
+        self.ee_seconds = 0.0
+        self.ee_bytes = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def add_ee_call(self, seconds: float, nbytes: int):
+        with self._lock:
+            self.ee_calls += 1
+            self.ee_seconds += seconds
+            self.ee_bytes += nbytes
+
+    def header_value(self) -> str:
+        total = time.perf_counter() - self.started
+        with self._lock:
+            parts = [f"{name};dur={sec * 1000:.1f}" for name, sec in self.spans]
+            parts.append(f"ee;calls={self.ee_calls};dur={self.ee_seconds * 1000:.1f};bytes={self.ee_bytes}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Mede um estágio da requisição atual (no-op fora de uma requisição)."""
+    trace = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            seconds = time.perf_counter() - started
+            trace.add_span(name, seconds)
+            STAGE_SECONDS.observe(seconds, trace.endpoint, name)
+
+
+def record_ee_call(seconds: float, result: Any = None, ok: bool = True):
+    """Chamado pelo executor a cada getInfo (latência, tamanho da resposta, sucesso)."""
+    outcome = "ok" if ok else "error"
+    EE_CALLS.inc(outcome)
+    EE_CALL_SECONDS.observe(seconds, outcome)
+    trace = _current.get()
+    nbytes = None
+    if ok:
+        # pixel downloads come back as arrays; everything else is JSON-like and
+        # serializing it again costs as much as parsing it, so it is sampled
+        nbytes = getattr(result, "nbytes", None)
+        seq = next(_ee_call_seq)
+        if nbytes is None and ((trace is not None and trace.debug)
+                               or (RESPONSE_SIZE_SAMPLE_EVERY and seq % RESPONSE_SIZE_SAMPLE_EVERY == 0)):
+            nbytes = len(json.dumps(result, separators=(",", ":"), default=str))
+        if nbytes is not None:
+            EE_RESPONSE_BYTES.observe(nbytes)
+    if trace is not None:
+        trace.add_ee_call(seconds, nbytes or 0)
+
+
+def register_gauge(name: str, help_text: str, callback: Callable[[], Optional[float]]):
+    _gauges[name] = (help_text, callback)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in (REQUEST_SECONDS, STAGE_SECONDS, EE_CALLS, EE_CALL_SECONDS, EE_RESPONSE_BYTES, EE_CALLS_PER_REQUEST):
+        lines.extend(metric.render())
+    for name, (help_text, callback) in _gauges.items():
+        try:
+            value = callback()
+        except Exception:
+            value = None
+        if value is None:
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {float(value):g}"])
+    return "\n".join(lines) + "\n"
+
+
+def _traced_iter(iterable, trace: RequestTrace):
+    """Streamed body: each chunk is produced with the request trace current (teardown already reset it)."""
+    it = iter(iterable)
+    try:
+        while True:
+            token = _current.set(trace)
+            try:
+                chunk = next(it)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        if hasattr(it, "close"):
+            it.close()
+
+
+def instrument_app(app) -> None:
+    """Abre um RequestTrace por requisição, registra os histogramas e adiciona GET /metrics."""
+    global RESPONSE_SIZE_SAMPLE_EVERY
+    always_debug = os.getenv("DEBUG_TIMING", "0") == "1"
+    RESPONSE_SIZE_SAMPLE_EVERY = int(os.getenv("EE_RESPONSE_SIZE_SAMPLE_EVERY", str(RESPONSE_SIZE_SAMPLE_EVERY)))
+
+    @app.before_request
+    def _start_trace():
+        trace = RequestTrace(request.url_rule.rule if request.url_rule else "unmatched",
+                             debug=always_debug or request.headers.get("X-Debug-Timing") in ("1", "true"))
+        g.request_trace_token = _current.set(trace)
+        g.request_trace = trace
+
+    @app.after_request
+    def _finish_trace(resp):
+        trace = g.pop("request_trace", None)
+        if trace is None:
+            return resp
+        method, status = request.method, str(resp.status_code)
+
+        def _observe():
+            # runs when the server closes the response, i.e. after an NDJSON body was fully streamed
+            REQUEST_SECONDS.observe(time.perf_counter() - trace.started, trace.endpoint, method, status)
+            if trace.endpoint != "/metrics":
+                EE_CALLS_PER_REQUEST.observe(trace.ee_calls, trace.endpoint)
+
+        if resp.is_streamed:
+            resp.response = _traced_iter(resp.response, trace)
+        resp.call_on_close(_observe)
+        if trace.debug:
+            resp.headers["X-Debug-Timing"] = trace.header_value()
+        return resp
+
+    @app.teardown_request
+    def _reset_trace(exc):
+        token = g.pop("request_trace_token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # streamed responses finish in another context; nothing to restore there
+                pass
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
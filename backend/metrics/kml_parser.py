@@ -0,0 +1,193 @@
+# kml_parser.py
+"""
+Streaming KML/KMZ parser shared by /compute and /clay.
+
+The document is fed to an incremental XML parser in chunks and every Polygon is
+converted (and its elements released) as soon as it closes, so memory stays
+bounded on large uploads. All Placemarks, MultiGeometry members and inner rings
+(holes) are kept; coordinate blocks are decoded into NumPy arrays in bulk.
+
+Documents without any <Polygon> fall back to the first <coordinates> block
+(a LinearRing or LineString outside a Polygon, or a bare <coordinates>), read
+as the exterior ring, which is what the older regex extraction accepted.
+
+A KML/KMZ sent inside the JSON body is already held in memory as a string;
+uploads sent as the raw request body (Content-Type KML_MIMETYPES, other fields
+in the query string) are parsed straight from the request stream.
+"""
+import base64
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Union
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import numpy as np
+
+from geometry_utils import polygons_to_geojson
+
+CHUNK_SIZE = 1 << 16
+# KMZ bodies are spooled to a temp file above this size (zipfile needs a seekable file)
+KMZ_SPOOL_BYTES = 8 << 20
+# raw request bodies accepted instead of JSON -> kind
+KML_MIMETYPES = {
+    "application/vnd.google-earth.kml+xml": "kml",
+    "application/vnd.google-earth.kmz": "kmz",
+}
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def decode_coordinates(text: str) -> np.ndarray:
+    """Bloco <coordinates> "lon,lat[,alt] lon,lat[,alt] ..." -> array (N, 2) de lon/lat."""
+    text = (text or "").strip()
+    if not text:
+        return np.empty((0, 2))
+    dims = text.split(None, 1)[0].count(",") + 1
+    values = np.array(text.replace(",", " ").split(), dtype=np.float64)
+    if dims >= 2 and values.size % dims == 0 and values.size // dims == text.count(",") // (dims - 1):
+        return values.reshape(-1, dims)[:, :2]
+    # mixed 2D/3D tuples: fall back to per-tuple decoding
+    return np.array([[float(v) for v in t.split(",")[:2]] for t in text.split()], dtype=np.float64)
+
+
+def _ring(text: str) -> List[List[float]]:
+    pts = decode_coordinates(text)
+    if len(pts) < 3:
+        raise ValueError("KML contém anel com menos de 3 vértices.")
+    if not np.array_equal(pts[0], pts[-1]):
+        pts = np.vstack((pts, pts[:1]))
+    return pts.tolist()
+
+
+def _polygon_rings(polygon_elem) -> List[List[List[float]]]:
+    outer, inner = [], []
+    for boundary in polygon_elem:
+        name = _local(boundary.tag)
+        if name not in ("outerBoundaryIs", "innerBoundaryIs"):
+            continue
+        for coords in boundary.iter():
+            if _local(coords.tag) == "coordinates":
+                (outer if name == "outerBoundaryIs" else inner).append(_ring(coords.text))
+    if not outer:
+        raise ValueError("KML Polygon sem outerBoundaryIs/<coordinates>.")
+    return [outer[0]] + inner
+
+
+def iter_kml_polygons(chunks: Iterable[Union[str, bytes]]) -> Iterator[List[List[List[float]]]]:
+    """
+    Emite cada Polygon (lista de anéis, exterior primeiro) à medida que o XML é lido. Sem nenhum
+    Polygon, emite o primeiro <coordinates> fora de Polygon como anel exterior (fallback).
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    in_polygon = 0
+    found = False
+    fallback = None
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                name = _local(elem.tag)
+                if name == "Polygon":
+                    in_polygon += 1 if event == "start" else -1
+                if event == "start":
+                    continue
+                if name == "Polygon":
+                    found = True
+                    yield _polygon_rings(elem)
+                    elem.clear()
+                elif name == "coordinates" and not in_polygon:
+                    if not found and fallback is None:
+                        fallback = elem.text or ""
+                    elem.clear()
+                elif name == "Placemark":
+                    elem.clear()
+        parser.close()
+    except ParseError as e:
+        raise ValueError(f"KML inválido: {e}")
+    if not found and fallback is not None:
+        yield [_ring(fallback)]
+
+
+def _text_chunks(text: Union[str, bytes]) -> Iterator[Union[str, bytes]]:
+    for i in range(0, len(text), CHUNK_SIZE):
+        yield text[i:i + CHUNK_SIZE]
+
+
+def _stream_chunks(stream) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_geojson(polygons: List) -> Dict[str, Any]:
+    if not polygons:
+        raise ValueError("KML não contém Polygon nem tag <coordinates>.")
+    return polygons_to_geojson(polygons)
+
+
+def kml_to_geojson(kml: Union[str, bytes]) -> Dict[str, Any]:
+    """KML (texto) -> GeoJSON Polygon ou MultiPolygon com todos os Placemarks e furos."""
+    return _to_geojson(list(iter_kml_polygons(_text_chunks(kml))))
+
+
+def _kmz_file_to_geojson(fileobj) -> Dict[str, Any]:
+    try:
+        with zipfile.ZipFile(fileobj) as zf:
+            names = [n for n in zf.namelist() if n.lower().endswith(".kml")]
+            if not names:
+                raise ValueError("KMZ não contém arquivo .kml.")
+            name = "doc.kml" if "doc.kml" in names else names[0]
+            with zf.open(name) as stream:
+                return _to_geojson(list(iter_kml_polygons(_stream_chunks(stream))))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"KMZ inválido: {e}")
+
+
+def kmz_to_geojson(kmz: Union[bytes, str]) -> Dict[str, Any]:
+    """KMZ (bytes ou base64) -> GeoJSON; lê o doc.kml (ou o primeiro .kml) do zip em streaming."""
+    if isinstance(kmz, str):
+        kmz = base64.b64decode(kmz)
+    return _kmz_file_to_geojson(io.BytesIO(kmz))
+
+
+def stream_to_geojson(stream, kind: str) -> Dict[str, Any]:
+    """
+    Corpo bruto da requisição (request.stream) -> GeoJSON. "kml" é lido em blocos de
+    CHUNK_SIZE; "kmz" passa por um SpooledTemporaryFile (memória até KMZ_SPOOL_BYTES, depois disco).
+    """
+    if kind == "kml":
+        return _to_geojson(list(iter_kml_polygons(_stream_chunks(stream))))
+    with tempfile.SpooledTemporaryFile(max_size=KMZ_SPOOL_BYTES) as spool:
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        spool.seek(0)
+        return _kmz_file_to_geojson(spool)
+
+
+def parse_query_fields(args) -> Dict[str, Any]:
+    """Campos da query string de um upload KML/KMZ bruto; valores JSON (true, 10, ["NDVI"]) são decodificados."""
+    out: Dict[str, Any] = {}
+    for key, value in args.items():
+        try:
+            out[key] = json.loads(value)
+        except ValueError:
+            out[key] = value
+    return out
+
+
+def read_request_body(req) -> Dict[str, Any]:
+    """
+    Corpo de uma rota que aceita geometria (req = flask.request): JSON, ou KML/KMZ bruto
+    (Content-Type em KML_MIMETYPES) lido em streaming como "geometry", com os demais campos
+    na query string. ValueError se o KML/KMZ for inválido.
+    """
+    kind = KML_MIMETYPES.get(req.mimetype)
+    if kind is None:
+        return req.get_json(force=True)
+    return {**parse_query_fields(req.args), "geometry": stream_to_geojson(req.stream, kind)}
@@ -0,0 +1,178 @@
+# local_indices.py
+"""
+Offline NumPy engine for the vegetation indices computed in agro_metrics.py.
+
+Backend "local" of calc_indices_from_image + reduce_image_over_region for local
+Sentinel-2 band stacks (.npy or GeoTIFF), so bulk reprocessing of our own
+rasters and offline checks don't need an Earth Engine session.
+
+Stacks are laid out as (bands, H, W) or (time, bands, H, W) with the bands in
+S2_BANDS order and raw L2A digital numbers (scaled by 1/10000 on load, like the
+divide(10000.0) step on EE).
+"""
+import json
+import os
+import sys
+import warnings
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from index_formulas import INDEX_FORMULAS, S2_BANDS
+
+INDEX_NAMES = list(INDEX_FORMULAS)
+REFLECTANCE_SCALE = 10000.0
+
+
+def load_band_stack(path: str, transform: Optional[Sequence[float]] = None, nodata: Optional[float] = None):
+    """
+    Lê um stack de bandas (.npy ou GeoTIFF) e retorna (stack float32 escalado, transform).
+    Para .npy o transform (affine a, b, c, d, e, f) vem do argumento ou de um sidecar <path>.json.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        raw = np.load(path, mmap_mode="r")
+        if transform is None:
+            meta_path = path + ".json"
+            if os.path.exists(meta_path):
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                transform = meta.get("transform")
+                if nodata is None:
+                    nodata = meta.get("nodata")
+    elif ext in (".tif", ".tiff"):
+        try:
+            import rasterio
+        except ImportError as e:
+            raise ImportError("Leitura de GeoTIFF requer o pacote 'rasterio'.") from e
+        with rasterio.open(path) as src:
+            raw = src.read()
+            if transform is None:
+                transform = tuple(src.transform)[:6]
+            if nodata is None:
+                nodata = src.nodata
+    else:
+        raise ValueError(f"Formato de stack não suportado: {ext}")
+
+    if raw.shape[-3] != len(S2_BANDS):
+        raise ValueError(f"Stack deve ter {len(S2_BANDS)} bandas na ordem {S2_BANDS}, recebido shape {raw.shape}")
+
+    stack = np.asarray(raw, dtype=np.float32) / np.float32(REFLECTANCE_SCALE)
+    if nodata is not None:
+        stack = np.where(np.asarray(raw) == nodata, np.float32(np.nan), stack)
+    return stack, (tuple(transform) if transform is not None else None)
+
+
+def calc_indices_from_array(stack: np.ndarray, indices: Optional[Sequence[str]] = None) -> np.ndarray:
+    """
+    Fórmulas de index_formulas.INDEX_FORMULAS (as mesmas do backend EE), vetorizadas sobre o stack.
+    Entrada (..., 10, H, W) em reflectância; saída (..., len(indices), H, W) na ordem de `indices`
+    (padrão: INDEX_NAMES). Divisões por zero viram NaN e são ignoradas nas estatísticas (o EE as mascara).
+    """
+    stack = np.asarray(stack, dtype=np.float32)
+    bands = {name: stack[..., i, :, :] for i, name in enumerate(S2_BANDS)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.stack([INDEX_FORMULAS[name](bands) for name in (indices or INDEX_NAMES)], axis=-3)
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def median_composite(stack: np.ndarray) -> np.ndarray:
+    """Mediana por pixel ao longo do tempo de um stack (time, bands, H, W), como o .median() da coleção no EE."""
+    stack = np.asarray(stack, dtype=np.float32)
+    if stack.ndim == 3:
+        return stack
+    with warnings.catch_warnings():
+        # pixels sem nenhuma data válida continuam NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(stack, axis=0)
+
+
+def polygon_mask(geojson: Dict[str, Any], transform: Sequence[float], shape: Sequence[int]) -> np.ndarray:
+    """
+    Rasteriza Polygon/MultiPolygon (GeoJSON, mesmo CRS do transform) numa máscara booleana (H, W).
+    Um pixel entra quando o seu centro está dentro do polígono (regra even-odd, furos incluídos).
+    """
+    if geojson.get("type") == "Feature":
+        geojson = geojson.get("geometry")
+    if geojson.get("type") == "Polygon":
+        rings = list(geojson["coordinates"])
+    elif geojson.get("type") == "MultiPolygon":
+        rings = [ring for poly in geojson["coordinates"] for ring in poly]
+    else:
+        raise ValueError("GeoJSON deve ser Polygon/MultiPolygon.")
+
+    a, b, c, d, e, f = transform[:6]
+    height, width = int(shape[0]), int(shape[1])
+    cols, rows = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    px = a * cols + b * rows + c
+    py = d * cols + e * rows + f
+
+    inside = np.zeros((height, width), dtype=bool)
+    for ring in rings:
+        pts = np.asarray(ring, dtype=np.float64)[:, :2]
+        x1, y1 = pts[:, 0], pts[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for xa, ya, xb, yb in zip(x1, y1, x2, y2):
+            if ya == yb:
+                continue
+            crosses = (ya > py) != (yb > py)
+            x_int = xa + (py - ya) * (xb - xa) / (yb - ya)
+            inside ^= crosses & (px < x_int)
+    return inside
+
+
+def reduce_array_over_region(indices: np.ndarray, mask: np.ndarray,
+                             names: Sequence[str] = INDEX_NAMES) -> List[Dict[str, Optional[float]]]:
+    """
+    mean/median/stdDev por banda dentro da máscara, com as mesmas chaves do reduceRegion
+    (NDVI_mean, NDVI_median, NDVI_stdDev, ...). Retorna uma lista de dicts (um por data do stack).
+    """
+    indices = np.asarray(indices, dtype=np.float32)
+    if indices.ndim == 3:
+        indices = indices[np.newaxis]
+    values = indices[..., mask]  # (T, bands, pixels)
+
+    valid = np.isfinite(values)
+    n = valid.sum(axis=-1)
+    filled = np.where(valid, values, 0).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = filled.sum(axis=-1) / n
+        std = np.sqrt(np.where(valid, (values - mean[..., np.newaxis]) ** 2, 0).sum(axis=-1) / n)
+    with warnings.catch_warnings():
+        # all-NaN slices (no valid pixel) are reported as None below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(np.where(valid, values, np.nan), axis=-1)
+
+    out = []
+    for t in range(values.shape[0]):
+        stats: Dict[str, Optional[float]] = {}
+        for i, name in enumerate(names):
+            empty = n[t, i] == 0
+            stats[f"{name}_mean"] = None if empty else float(mean[t, i])
+            stats[f"{name}_median"] = None if empty else float(median[t, i])
+            stats[f"{name}_stdDev"] = None if empty else float(std[t, i])
+        # reduceRegion().getInfo() returns keys sorted
+        out.append(dict(sorted(stats.items())))
+    return out
+
+
+def compute_local_metrics(path: str, geometry: Dict[str, Any], transform: Optional[Sequence[float]] = None,
+                          nodata: Optional[float] = None) -> List[Dict[str, Optional[float]]]:
+    """Pipeline completo: stack local -> índices -> stats mascaradas ao polígono."""
+    stack, transform = load_band_stack(path, transform=transform, nodata=nodata)
+    if transform is None:
+        raise ValueError("Stack sem transform: forneça o argumento ou o sidecar <arquivo>.json.")
+    indices = calc_indices_from_array(stack)
+    mask = polygon_mask(geometry, transform, indices.shape[-2:])
+    return reduce_array_over_region(indices, mask)
+
+
+if __name__ == "__main__":
+    # uso: python local_indices.py <stack.npy|stack.tif> <geometria.geojson>
+    if len(sys.argv) != 3:
+        print("uso: python local_indices.py <stack.npy|stack.tif> <geometria.geojson>")
+        sys.exit(1)
+    with open(sys.argv[2], "r") as f:
+        geom = json.load(f)
+    print(json.dumps(compute_local_metrics(sys.argv[1], geom), indent=2))
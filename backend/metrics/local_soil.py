@@ -0,0 +1,142 @@
+# local_soil.py
+"""
+Local backend for the OpenLandMap soil layers served by soil_metrics.py.
+
+The soil rasters are static, so they can be mirrored once and queried without
+Earth Engine. Each property lives in SOIL_LOCAL_DIR as <property>.tif (one band
+per depth, in DEPTH_TO_BAND order) or <property>.npy with shape (depths, H, W)
+plus a <property>.npy.json sidecar holding the affine transform and nodata.
+Only the window covering the polygon's bounding box is read (rasterio window
+or a slice of the memory-mapped array); the polygon is rasterized over that
+window with local_indices.polygon_mask and mean/min/max come from NumPy.
+Rasters are expected north-up (no rotation terms) in the CRS of the GeoJSON.
+"""
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry_utils import geojson_polygons
+from local_indices import polygon_mask
+
+
+class LocalSoilRaster:
+    """Um arquivo de propriedade (.tif ou .npy), aberto uma vez e lido por janelas."""
+
+    def __init__(self, path: str, scale_factor: float = 1.0):
+        self.path = path
+        self.scale_factor = scale_factor
+        self._lock = threading.Lock()
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npy":
+            self._array = np.load(path, mmap_mode="r")
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._src = None
+            self.transform = tuple(meta["transform"])[:6]
+            self.nodata = meta.get("nodata")
+            self.shape = tuple(self._array.shape[-2:])
+            self.count = self._array.shape[0]
+        elif ext in (".tif", ".tiff"):
+            try:
+                import rasterio
+            except ImportError as e:
+                raise ImportError("Leitura de GeoTIFF requer o pacote 'rasterio'.") from e
+            self._array = None
+            self._src = rasterio.open(path)
+            self.transform = tuple(self._src.transform)[:6]
+            self.nodata = self._src.nodata
+            self.shape = (self._src.height, self._src.width)
+            self.count = self._src.count
+        else:
+            raise ValueError(f"Formato de raster de solo não suportado: {ext}")
+        if self.transform[1] != 0 or self.transform[3] != 0:
+            raise ValueError(f"{path}: raster rotacionado não suportado.")
+
+    def window(self, geojson: Dict[str, Any]) -> Optional[Tuple[int, int, int, int]]:
+        """(row0, row1, col0, col1) cobrindo o bbox do polígono, ou None se fora do raster."""
+        pts = np.asarray([pt[:2] for poly in geojson_polygons(geojson) for pt in poly[0]], dtype=np.float64)
+        xmin, ymin = pts.min(axis=0)
+        xmax, ymax = pts.max(axis=0)
+        a, _, c, _, e, f = self.transform
+        cols = sorted(((xmin - c) / a, (xmax - c) / a))
+        rows = sorted(((ymin - f) / e, (ymax - f) / e))
+        col0, col1 = max(0, math.floor(cols[0])), min(self.shape[1], math.ceil(cols[1]))
+        row0, row1 = max(0, math.floor(rows[0])), min(self.shape[0], math.ceil(rows[1]))
+        if col0 >= col1 or row0 >= row1:
+            return None
+        return row0, row1, col0, col1
+
+    def read(self, bands: Sequence[int], win: Tuple[int, int, int, int]) -> np.ndarray:
+        """Bandas (índices 0-based) na janela -> float64 (k, h, w) na unidade final, nodata como NaN."""
+        row0, row1, col0, col1 = win
+        if self._src is not None:
+            from rasterio.windows import Window
+            with self._lock:
+                # datasets do rasterio não são thread-safe
+                raw = self._src.read([b + 1 for b in bands], window=Window(col0, row0, col1 - col0, row1 - row0))
+        else:
+            raw = self._array[list(bands), row0:row1, col0:col1]
+        out = np.asarray(raw, dtype=np.float64)
+        if self.nodata is not None:
+            out[np.asarray(raw) == self.nodata] = np.nan
+        if self.scale_factor != 1:
+            out *= self.scale_factor
+        return out
+
+    def window_transform(self, win: Tuple[int, int, int, int]) -> Tuple[float, ...]:
+        a, b, c, d, e, f = self.transform
+        return (a, b, c + win[2] * a, d, e, f + win[0] * e)
+
+
+class LocalSoilBackend:
+    """
+    Conjunto de rasters por propriedade. properties: {nome: {"scale_factor": ...}}
+    (ex.: SOIL_PROPERTIES); depths: rótulos na ordem das bandas dos arquivos.
+    """
+
+    def __init__(self, root_dir: str, properties: Dict[str, Dict[str, Any]], depths: Sequence[str]):
+        self.root_dir = root_dir
+        self.properties = properties
+        self.depths = list(depths)
+        self._rasters: Dict[str, LocalSoilRaster] = {}
+        self._lock = threading.Lock()
+
+    def raster(self, prop: str) -> LocalSoilRaster:
+        with self._lock:
+            if prop not in self._rasters:
+                for ext in (".tif", ".tiff", ".npy"):
+                    path = os.path.join(self.root_dir, prop + ext)
+                    if os.path.exists(path):
+                        self._rasters[prop] = LocalSoilRaster(path, self.properties[prop].get("scale_factor", 1))
+                        break
+                else:
+                    raise FileNotFoundError(f"Raster local de '{prop}' não encontrado em {self.root_dir}.")
+            return self._rasters[prop]
+
+    def profile_stats(self, geojson: Dict[str, Any], properties: Sequence[str],
+                      depths: Sequence[str]) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """Mesmo formato de soil_metrics.soil_profile_stats: {prop: {depth: {mean, min, max}}}."""
+        bands = [self.depths.index(d) for d in depths]
+        out: Dict[str, Dict[str, Dict[str, Optional[float]]]] = {}
+        for prop in properties:
+            raster = self.raster(prop)
+            win = raster.window(geojson)
+            if win is None:
+                values = np.empty((len(bands), 0))
+            else:
+                mask = polygon_mask(geojson, raster.window_transform(win), (win[1] - win[0], win[3] - win[2]))
+                values = raster.read(bands, win)[:, mask]                     # (depths, N)
+            out[prop] = {d: _stats(values[i]) for i, d in enumerate(depths)}
+        return out
+
+
+def _stats(values: np.ndarray) -> Dict[str, Optional[float]]:
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return {"mean": None, "min": None, "max": None}
+    return {"mean": float(values.mean()), "min": float(values.min()), "max": float(values.max())}
+
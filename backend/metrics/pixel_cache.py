@@ -0,0 +1,209 @@
+# pixel_cache.py
+"""
+Local pixel cache for the index rasters of an area and period.
+
+The first query for an (area, period, collection, indices, scale) downloads the
+composite index bands once (ee.data.computePixels, in tiles) and stores them as
+a float32 .npy stack plus the polygon mask (.mask.npy) and a JSON sidecar with
+the affine transform, band names and shape. Later whole-area stats, zone stats
+and histograms are computed from the memory-mapped arrays with NumPy (see
+local_indices.py), without going back to Earth Engine. The directory is bounded
+by size; the least recently used entries are evicted first.
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometry_utils import METERS_PER_DEGREE, geojson_polygons
+from local_indices import polygon_mask, reduce_array_over_region
+
+# value written by EE for masked pixels before download (became NaN locally)
+NODATA = -9999.0
+# computePixels tile side (pixels); keeps every request well under EE's size limit
+TILE_SIZE = 512
+
+
+def pixel_grid(geojson: Dict[str, Any], scale_m: float) -> Tuple[Tuple[float, ...], Tuple[int, int]]:
+    """
+    Grade em EPSG:4326 cobrindo o polígono com pixels de ~scale_m metros.
+    Retorna (transform (a, b, c, d, e, f), (H, W)), no mesmo formato de local_indices.
+    """
+    pts = np.asarray([pt[:2] for poly in geojson_polygons(geojson) for pt in poly[0]], dtype=np.float64)
+    xmin, ymin = pts.min(axis=0)
+    xmax, ymax = pts.max(axis=0)
+    sy = scale_m / METERS_PER_DEGREE
+    sx = sy / max(math.cos(math.radians((ymin + ymax) / 2)), 1e-6)
+    width = max(1, int(math.ceil((xmax - xmin) / sx)))
+    height = max(1, int(math.ceil((ymax - ymin) / sy)))
+    return (sx, 0.0, float(xmin), 0.0, -sy, float(ymax)), (height, width)
+
+
+def download_pixels(compute_pixels: Callable[[Dict[str, Any]], np.ndarray], expression: Any,
+                    bands: Sequence[str], transform: Sequence[float], shape: Sequence[int],
+                    tile_size: int = TILE_SIZE) -> np.ndarray:
+    """
+    Baixa a grade em tiles. compute_pixels(request) -> array estruturado (h, w) com um
+    campo por banda (formato NUMPY_NDARRAY do ee.data.computePixels). Retorna (bands, H, W).
+    """
+    a, _, c, _, e, f = transform[:6]
+    height, width = int(shape[0]), int(shape[1])
+    out = np.full((len(bands), height, width), np.nan, dtype=np.float32)
+    for row in range(0, height, tile_size):
+        for col in range(0, width, tile_size):
+            h, w = min(tile_size, height - row), min(tile_size, width - col)
+            tile = compute_pixels({
+                "expression": expression,
+                "fileFormat": "NUMPY_NDARRAY",
+                "bandIds": list(bands),
+                "grid": {
+                    "dimensions": {"width": w, "height": h},
+                    "affineTransform": {"scaleX": a, "shearX": 0, "translateX": c + col * a,
+                                        "shearY": 0, "scaleY": e, "translateY": f + row * e},
+                    "crsCode": "EPSG:4326",
+                },
+            })
+            for i, band in enumerate(bands):
+                out[i, row:row + h, col:col + w] = tile[band]
+    out[out == NODATA] = np.nan
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def histogram_counts(values: np.ndarray, mask: np.ndarray, bins: int,
+                     value_range: Sequence = (-1.0, 1.0)) -> np.ndarray:
+    """
+    Contagens (bands, bins) dos pixels válidos dentro da máscara, todas as bandas num só
+    bincount. value_range: (lo, hi) comum ou uma linha (lo, hi) por banda. Mesma regra do
+    ee.Reducer.fixedHistogram: bins em [lo, hi), valores == hi ficam de fora.
+    """
+    pixels = np.asarray(values)[:, mask]                                  # (bands, N)
+    bounds = np.broadcast_to(np.asarray(value_range, dtype=np.float64).reshape(-1, 2), (pixels.shape[0], 2))
+    lo, hi = bounds[:, :1], bounds[:, 1:]
+    valid = np.isfinite(pixels) & (pixels >= lo) & (pixels < hi)
+    # clip: só arredondamento de ponto flutuante logo abaixo de hi
+    idx = np.clip(((np.where(valid, pixels, lo) - lo) / (hi - lo) * bins).astype(np.int64), 0, bins - 1)
+    flat = (np.arange(pixels.shape[0])[:, None] * bins + idx)[valid]
+    return np.bincount(flat, minlength=pixels.shape[0] * bins).reshape(pixels.shape[0], bins)
+
+
+class PixelCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 2 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # cache_dir is only created by the first put(): importing the service writes nothing
+
+    def _paths(self, key: str) -> Dict[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return {"data": base + ".npy", "mask": base + ".mask.npy", "meta": base + ".json"}
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, Dict[str, Any]]]:
+        """(stack mmap (bands, H, W), máscara mmap (H, W), meta) ou None."""
+        paths = self._paths(key)
+        try:
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            data = np.load(paths["data"], mmap_mode="r")
+            mask = np.load(paths["mask"], mmap_mode="r")
+        except (OSError, ValueError):
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        now = time.time()
+        for path in paths.values():
+            # mtime = last access, used for LRU eviction
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        with self._lock:
+            self.counters["hits"] += 1
+        return data, mask, meta
+
+    def put(self, key: str, data: np.ndarray, mask: np.ndarray, meta: Dict[str, Any]):
+        paths = self._paths(key)
+        meta = {**meta, "shape": list(data.shape), "nbytes": int(data.nbytes + mask.nbytes),
+                "created_at": time.time()}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # data and mask first, the sidecar last: an entry only exists once its meta is in place
+        for name, value in (("data", np.ascontiguousarray(data, dtype=np.float32)),
+                            ("mask", np.ascontiguousarray(mask, dtype=bool))):
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, value)
+            os.replace(tmp, paths[name])
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, paths["meta"])
+        with self._lock:
+            self.counters["stores"] += 1
+        self._evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            paths = self._paths(key)
+            try:
+                size = sum(os.path.getsize(p) for p in paths.values() if os.path.exists(p))
+                entries.append((os.path.getmtime(paths["meta"]), size, key))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                for path in self._paths(key).values():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        with self._lock:
+            return {**self.counters, "entries": len(entries), "bytes": sum(s for _, s, _ in entries),
+                    "max_bytes": self.max_bytes, "cache_dir": self.cache_dir}
+
+
+def local_stats(data: np.ndarray, mask: np.ndarray, meta: Dict[str, Any],
+                zones: Optional[Sequence[Tuple[str, Dict[str, Any]]]] = None, histogram: Optional[int] = None,
+                value_ranges: Optional[Dict[str, Sequence[float]]] = None) -> Dict[str, Any]:
+    """
+    Estatísticas a partir do stack em cache: área inteira, cada zona (id, GeoJSON)
+    recortada pela área e, opcionalmente, histogramas de `histogram` bins por índice,
+    cada um na faixa de value_ranges[índice] (padrão (-1, 1)).
+    """
+    bands, transform = meta["bands"], meta["transform"]
+    mask = np.asarray(mask, dtype=bool)
+    out: Dict[str, Any] = {"metrics": reduce_array_over_region(data, mask, bands)[0]}
+    if zones:
+        out["zones"] = {zid: reduce_array_over_region(data, mask & polygon_mask(geom, transform, mask.shape), bands)[0]
+                        for zid, geom in zones}
+    if histogram:
+        ranges = [tuple((value_ranges or {}).get(band, (-1.0, 1.0))) for band in bands]
+        counts = histogram_counts(data, mask, histogram, ranges)
+        out["histograms"] = {band: {"range": list(ranges[i]), "bins": histogram, "counts": counts[i].tolist()}
+                             for i, band in enumerate(bands)}
+    return out
@@ -0,0 +1,173 @@
+# result_cache.py
+"""
+Response cache for the /compute endpoint.
+
+Two tiers: a size-bounded in-memory LRU and an optional on-disk JSON store that
+survives restarts. Keys are a canonical hash of the geometry plus the request
+fields that change the result. Sentinel-2 history is immutable, so windows that
+ended before today never expire; windows touching today expire after a short TTL.
+Results computed at a degraded (coarser) setting after an EE memory/timeout error
+also get a short TTL, so the next request retries the requested resolution.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+# decimal places kept when canonicalizing coordinates (~1 cm)
+COORD_PRECISION = 7
+
+
+def _round_coords(value):
+    if isinstance(value, (list, tuple)):
+        return [_round_coords(v) for v in value]
+    if isinstance(value, float):
+        return round(value, COORD_PRECISION)
+    return value
+
+
+def canonical_geometry(geojson: Dict[str, Any]) -> Dict[str, Any]:
+    """Polygon/MultiPolygon (Feature unwrapped) with rounded coordinates."""
+    if geojson.get("type") == "Feature":
+        geojson = geojson.get("geometry") or {}
+    return {"type": geojson.get("type"), "coordinates": _round_coords(geojson.get("coordinates"))}
+
+
+def make_cache_key(geojson: Dict[str, Any], params: Dict[str, Any]) -> str:
+    payload = {"geometry": canonical_geometry(geojson), "params": params}
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 512, disk_dir: Optional[str] = None,
+                 recent_ttl: int = 900, settle_days: int = 0, degraded_ttl: int = 900):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.recent_ttl = recent_ttl
+        self.degraded_ttl = degraded_ttl
+        self.settle_days = settle_days
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "disk_hits": 0, "stores": 0, "degraded_stores": 0, "expired": 0,
+                         "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---------- TTL ----------
+    def expires_at(self, end_date: str) -> Optional[float]:
+        """None (never expires) for windows fully in the past, now + recent_ttl otherwise."""
+        end = datetime.fromisoformat(end_date).date()
+        if end < date.today() - timedelta(days=self.settle_days):
+            return None
+        return time.time() + self.recent_ttl
+
+    @staticmethod
+    def is_degraded(reduction: Optional[Dict[str, Any]]) -> bool:
+        """True when adaptive_scale needed more than one attempt (coarser than the plan's first setting)."""
+        return bool(reduction) and reduction.get("attempts", 1) > 1
+
+    @staticmethod
+    def _alive(expires_at: Optional[float]) -> bool:
+        return expires_at is None or expires_at > time.time()
+
+    # ---------- disk tier ----------
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key: str):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._alive(entry.get("expires_at")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _disk_put(self, key: str, value: Dict[str, Any], expires_at: Optional[float],
+                  reduction: Optional[Dict[str, Any]] = None):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "reduction": reduction, "value": value}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("Falha ao gravar cache em disco:", e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # ---------- public API ----------
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if self._alive(expires_at):
+                    self._mem.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return value
+                del self._mem[key]
+                self.counters["expired"] += 1
+
+        if self.disk_dir:
+            disk_entry = self._disk_get(key)
+            if disk_entry is not None:
+                with self._lock:
+                    self._remember(key, disk_entry.get("expires_at"), disk_entry["value"])
+                    self.counters["hits"] += 1
+                    self.counters["disk_hits"] += 1
+                return disk_entry["value"]
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any], end_date: str, reduction: Optional[Dict[str, Any]] = None):
+        """
+        reduction: effective setting reported by adaptive_scale ({"scale_m", "tile_scale",
+        "attempts"}), kept with the entry; degraded results expire after degraded_ttl.
+        """
+        expires_at = self.expires_at(end_date)
+        degraded = self.is_degraded(reduction)
+        if degraded:
+            expires_at = min(expires_at or float("inf"), time.time() + self.degraded_ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self.counters["stores"] += 1
+            if degraded:
+                self.counters["degraded_stores"] += 1
+        if self.disk_dir:
+            self._disk_put(key, value, expires_at, reduction)
+
+    def _remember(self, key: str, expires_at: Optional[float], value: Dict[str, Any]):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "disk_dir": self.disk_dir,
+                "hit_ratio": (self.counters["hits"] / lookups) if lookups else None,
+            }
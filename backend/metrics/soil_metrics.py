@@ -1,82 +1,50 @@
 # clay_app.py
+import time
+_t0 = time.perf_counter()  # startup clock: import -> first request
 from flask import Flask, request, jsonify, make_response
 from typing import Optional, Any, Dict
 import ee
 import os
-import re
-import json
-from datetime import datetime
+import functools
+import math
 from dotenv import load_dotenv
+from geometry_utils import prepare_geometry, geometry_area_m2
+from adaptive_scale import reduction_plan, run_adaptive
+from kml_parser import KML_MIMETYPES, kml_to_geojson, kmz_to_geojson, parse_query_fields, read_request_body
+from local_soil import LocalSoilBackend
+from ee_executor import get_executor
+from ee_throttle import EEQuotaExceeded
+from instrumentation import instrument_app, register_gauge, span
+from gzip_requests import accept_gzip_requests
+from ee_init import StartupClock, register_startup_hooks, requires_ee
 
 app = Flask(__name__)
 app.config["JSON_SORT_KEYS"] = False
 
 # --------------------------------------------------------
-# Load .env and Earth Engine init (same auth system as your app.py)
+# Load .env and Earth Engine init (shared with agro_metrics.py, see ee_init.py)
 # --------------------------------------------------------
 basedir = os.path.dirname(__file__)
 env_path = os.path.join(basedir, ".env")
 load_dotenv(env_path)
 
-def init_ee():
-    service_account = os.getenv("SERVICE_ACCOUNT_EMAIL")
-    key_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_PATH")
-    project = os.getenv("GEE_PROJECT")
+# Inicializa o Earth Engine uma vez por processo, em background (ver ee_init.py)
+startup_clock = StartupClock(_t0)
+register_startup_hooks(app, startup_clock)
+# spans por requisição, GET /metrics e header X-Debug-Timing (ver instrumentation.py)
+instrument_app(app)
+# corpos Content-Encoding: gzip (polígonos grandes enviados pelo CRUD)
+accept_gzip_requests(app)
 
-    # try to extract key and user from key JSON if path exists
-    if (not project) and key_path and os.path.exists(key_path):
-        try:
-            with open(key_path, "r") as f:
-                jd = json.load(f)
-                if not service_account:
-                    service_account = jd.get("client_email")
-                if not project:
-                    project = jd.get("project_id")
-        except Exception as e:
-            print("Erro lendo JSON da chave:", e)
-
-    # try to initialize with service account credentials
-    if service_account and key_path and os.path.exists(key_path):
-        try:
-            creds = ee.ServiceAccountCredentials(service_account, key_path)
-            if project:
-                ee.Initialize(creds, project=project)
-            else:
-                ee.Initialize(creds)
-            print("EE initialized with Service Account:", service_account, "project:", project)
-            return
-        except Exception as e:
-            print("Falha ao inicializar EE com service account:", e)
+# pool compartilhado para chamadas getInfo (EE_MAX_IN_FLIGHT / EE_CALL_TIMEOUT)
+ee_executor = get_executor()
 
-    # fallback: try application-default or interactive
-    try:
-        ee.Initialize()
-        print("EE initialized with existing application-default/interactive credentials.")
-    except Exception:
-        print("Attempting interactive ee.Authenticate() - only for local dev.")
-        ee.Authenticate()
-        ee.Initialize()
-
-# Initialize Earth Engine once when app starts
-init_ee()
+# limite de vértices dos polígonos enviados ao EE (ver geometry_utils.prepare_geometry)
+GEOMETRY_MAX_VERTICES = int(os.getenv("GEOMETRY_MAX_VERTICES", "5000"))
 
 # --------------------------------------------------------
 # Mesmas funções auxiliares
 # --------------------------------------------------------
-def kml_to_polygon_coords(kml_text: str):
-    m = re.search(r"<coordinates>(.*?)</coordinates>", kml_text, re.DOTALL | re.IGNORECASE)
-    if not m:
-        raise ValueError("KML não contém tag <coordinates>")
-    coords_text = m.group(1).strip()
-    parts = re.split(r"\s+", coords_text)
-    polygon = []
-    for p in parts:
-        if not p.strip():
-            continue
-        lon, lat, *_ = p.split(",")
-        polygon.append([float(lon), float(lat)])
-    return [polygon]
-
 def geojson_to_ee_geometry(geojson):
     geom_type = geojson.get("type")
     if geom_type == "Feature":
@@ -89,7 +57,7 @@ def geojson_to_ee_geometry(geojson):
     raise ValueError("GeoJSON deve ser Polygon/MultiPolygon.")
 
 # --------------------------------------------------------
-# OpenLandMap ARGILA – configurações
+# OpenLandMap SOLO – catálogo de propriedades e profundidades
 # --------------------------------------------------------
 DEPTH_TO_BAND = {
     '0-5cm':     'b0',
@@ -100,26 +68,129 @@ DEPTH_TO_BAND = {
     '100-200cm': 'b200',
 }
 
+# propriedade -> asset (mesmas bandas de DEPTH_TO_BAND), fator para a unidade final e unidade
+SOIL_PROPERTIES = {
+    'clay':           {'asset': 'OpenLandMap/SOL/SOL_CLAY-WFRACTION_USDA-3A1A1A_M/v02',    'scale_factor': 1,   'unit': '%'},
+    'sand':           {'asset': 'OpenLandMap/SOL/SOL_SAND-WFRACTION_USDA-3A1A1A_M/v02',    'scale_factor': 1,   'unit': '%'},
+    'organic_carbon': {'asset': 'OpenLandMap/SOL/SOL_ORGANIC-CARBON_USDA-6A1C_M/v02',      'scale_factor': 5,   'unit': 'g/kg'},
+    'ph':             {'asset': 'OpenLandMap/SOL/SOL_PH-H2O_USDA-4C1A2A_M/v02',            'scale_factor': 0.1, 'unit': 'pH'},
+    'bulk_density':   {'asset': 'OpenLandMap/SOL/SOL_BULKDENS-FINEEARTH_USDA-4A1H_M/v02',  'scale_factor': 10,  'unit': 'kg/m3'},
+}
+
+SOIL_STATS = ("mean", "min", "max")
+
+CLAY_ASSET = SOIL_PROPERTIES['clay']['asset']
+
+def _normalize_selection(values, catalog, label: str) -> list:
+    """"all" -> todo o catálogo; string ou lista -> validada, na ordem do catálogo."""
+    if values == "all":
+        return list(catalog)
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, (list, tuple)) or not values:
+        raise ValueError(f"{label} deve ser \"all\" ou uma lista de: {list(catalog)}")
+    unknown = [v for v in values if v not in catalog]
+    if unknown:
+        raise ValueError(f"Valores inválidos em {label}: {unknown}. Use: {list(catalog)}")
+    return [v for v in catalog if v in values]
+
+def normalize_depths(depths) -> list:
+    return _normalize_selection(depths, DEPTH_TO_BAND, "depths")
+
+def normalize_properties(properties) -> list:
+    return _normalize_selection(properties, SOIL_PROPERTIES, "properties")
+
+def normalize_scale(scale):
+    """scale (m) do corpo: número finito e positivo (int é mantido). ValueError (HTTP 400) caso contrário."""
+    if isinstance(scale, str):
+        try:
+            scale = float(scale)
+        except ValueError:
+            pass
+    if isinstance(scale, bool) or not isinstance(scale, (int, float)) or not math.isfinite(scale) or scale <= 0:
+        raise ValueError("scale deve ser um número positivo (metros).")
+    return scale
+
+def _band_name(prop: str, depth_label: str) -> str:
+    # ("clay", "0-5cm") -> "clay_0_5cm" (nome de banda sem hífen)
+    return f"{prop}_" + depth_label.replace("-", "_")
+
+def get_soil_image(properties: list, depths: list) -> ee.Image:
+    """Uma imagem com uma banda por propriedade × profundidade, já na unidade final."""
+    images = []
+    for prop in properties:
+        spec = SOIL_PROPERTIES[prop]
+        img = ee.Image(spec['asset']).select([DEPTH_TO_BAND[d] for d in depths],
+                                             [_band_name(prop, d) for d in depths])
+        if spec['scale_factor'] != 1:
+            img = img.multiply(spec['scale_factor'])
+        images.append(img)
+    return ee.Image.cat(images)
+
+def soil_profile_stats(image: ee.Image, region: ee.Geometry, properties: list, depths: list, scale: int = 250,
+                       tile_scale: int = 1) -> dict:
+    """mean/min/max de todas as bandas num único reduceRegion -> {propriedade: {profundidade: {stat: valor}}}."""
+    reducer = ee.Reducer.mean() \
+              .combine(ee.Reducer.min(), sharedInputs=True) \
+              .combine(ee.Reducer.max(), sharedInputs=True)
+
+    result = ee_executor.get_info(image.reduceRegion(
+        reducer=reducer,
+        geometry=region,
+        scale=scale,
+        maxPixels=1e13,
+        tileScale=tile_scale
+    ))
+
+    return {
+        prop: {d: {stat: result.get(f"{_band_name(prop, d)}_{stat}") for stat in SOIL_STATS} for d in depths}
+        for prop in properties
+    }
+
+def columnar_profile(nested: dict) -> dict:
+    """{prop: {depth: {stat}}} -> arrays paralelos (property, depth, mean, min, max, unit)."""
+    rows = [(prop, d, stats) for prop, by_depth in nested.items() for d, stats in by_depth.items()]
+    out = {
+        "property": [prop for prop, _, _ in rows],
+        "depth": [d for _, d, _ in rows],
+        "unit": [SOIL_PROPERTIES[prop]['unit'] for prop, _, _ in rows],
+    }
+    out.update({stat: [stats.get(stat) for _, _, stats in rows] for stat in SOIL_STATS})
+    return out
+
+def get_clay_image_depths(depths: list) -> ee.Image:
+    """Uma imagem com uma banda por profundidade (clay_0_5cm, clay_5_15cm, ...)."""
+    return get_soil_image(['clay'], depths)
+
+def _clay_keys(stats: dict) -> dict:
+    return {"CLAY_mean_%": stats["mean"], "CLAY_min_%": stats["min"], "CLAY_max_%": stats["max"]}
+
+def clay_stats_depths(image: ee.Image, region: ee.Geometry, depths: list, scale: int = 250,
+                      tile_scale: int = 1) -> dict:
+    """mean/min/max de argila de todas as profundidades num único reduceRegion, indexado por profundidade."""
+    by_depth = soil_profile_stats(image, region, ['clay'], depths, scale, tile_scale)['clay']
+    return {d: _clay_keys(s) for d, s in by_depth.items()}
+
 def get_clay_image(depth_label: str) -> ee.Image:
     """Retorna imagem (%) de argila para a profundidade desejada."""
     band = DEPTH_TO_BAND[depth_label]
-    return (ee.Image('OpenLandMap/SOL/SOL_CLAY-WFRACTION_USDA-3A1A1A_M/v02')
+    return (ee.Image(CLAY_ASSET)
             .select(band)
             .rename('clay_pct'))
 
-def clay_stats(image: ee.Image, region: ee.Geometry, scale: int = 250) -> dict:
+def clay_stats(image: ee.Image, region: ee.Geometry, scale: int = 250, tile_scale: int = 1) -> dict:
     """Calcula mean/min/max de argila."""
     reducer = ee.Reducer.mean() \
               .combine(ee.Reducer.min(), sharedInputs=True) \
               .combine(ee.Reducer.max(), sharedInputs=True)
 
-    result = image.reduceRegion(
+    result = ee_executor.get_info(image.reduceRegion(
         reducer=reducer,
         geometry=region,
         scale=scale,
         maxPixels=1e13,
-        bestEffort=True
-    ).getInfo()
+        tileScale=tile_scale
+    ))
 
     return {
         "CLAY_mean_%": result.get("clay_pct_mean"),
@@ -127,62 +198,241 @@ def clay_stats(image: ee.Image, region: ee.Geometry, scale: int = 250) -> dict:
         "CLAY_max_%":  result.get("clay_pct_max"),
     }
 
+# --------------------------------------------------------
+# Backend local (rasters espelhados em SOIL_LOCAL_DIR, ver local_soil.py)
+# --------------------------------------------------------
+# "ee" (padrão) ou "local"; cada requisição pode escolher com o campo "backend"
+SOIL_BACKEND = os.getenv("SOIL_BACKEND", "ee")
+SOIL_BACKENDS = ("ee", "local")
+local_soil = LocalSoilBackend(os.getenv("SOIL_LOCAL_DIR") or os.path.join(basedir, "soil_rasters"),
+                              SOIL_PROPERTIES, list(DEPTH_TO_BAND))
+
+def local_clay_stats(geojson: dict, depth_label: str) -> dict:
+    """Mesmo dict de clay_stats, lido dos rasters locais."""
+    return _clay_keys(local_soil.profile_stats(geojson, ['clay'], [depth_label])['clay'][depth_label])
+
+def local_clay_stats_depths(geojson: dict, depths: list) -> dict:
+    """Mesmo dict de clay_stats_depths, lido dos rasters locais."""
+    by_depth = local_soil.profile_stats(geojson, ['clay'], depths)['clay']
+    return {d: _clay_keys(s) for d, s in by_depth.items()}
+
+def request_backend() -> str:
+    if request.mimetype in KML_MIMETYPES:
+        body = parse_query_fields(request.args)  # corpo é o KML/KMZ, lido só pela rota
+    else:
+        body = request.get_json(force=True, silent=True)
+    return (body.get("backend") if isinstance(body, dict) else None) or SOIL_BACKEND
+
+def requires_ee_backend(view):
+    """requires_ee apenas quando a requisição usa o backend do EE (o local funciona offline)."""
+    ee_view = requires_ee(view)
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request_backend() == "local":
+            return view(*args, **kwargs)
+        return ee_view(*args, **kwargs)
+    return wrapper
+
+def request_geometry(req: dict, scale):
+    """geometry / kml / kmz do corpo -> (GeoJSON preparado, info de vértices). ValueError se inválido."""
+    geometry = req.get("geometry")
+    kml = req.get("kml")
+    kmz = req.get("kmz")  # base64
+    if geometry:
+        raw_geom = geometry
+    elif kml or kmz:
+        raw_geom = kml_to_geojson(kml) if kml else kmz_to_geojson(kmz)
+    else:
+        raise ValueError("Forneça geometry (GeoJSON), kml (string) ou kmz (base64).")
+    prepared_geom, vertex_info = prepare_geometry(raw_geom, scale=scale, simplify=req.get("simplify", True),
+                                                  max_vertices=req.get("max_vertices", GEOMETRY_MAX_VERTICES))
+    return prepared_geom, vertex_info
+
 # --------------------------------------------------------
 # Endpoint para cálculo de argila
 # --------------------------------------------------------
 @app.route("/clay", methods=["POST"])
+@requires_ee_backend
 def compute_clay():
     try:
-        req = request.get_json(force=True)
+        req = read_request_body(request)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
     except Exception:
         return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
 
-    geometry = req.get("geometry")
-    kml = req.get("kml")
-
     depth = req.get("depth", "0-5cm")
-    scale = req.get("scale", 250)
-
-    # valida profundidade
-    if depth not in DEPTH_TO_BAND:
-        return make_response(jsonify({"detail": f"Profundidade inválida. Use uma de: {list(DEPTH_TO_BAND)}"}), 400)
+    # "depths": "all" ou lista -> todas numa só redução, resposta indexada por profundidade
+    depths = req.get("depths")
+    backend = request_backend()
+    if backend not in SOIL_BACKENDS:
+        return make_response(jsonify({"detail": f"backend inválido. Use um de: {list(SOIL_BACKENDS)}"}), 400)
+    try:
+        scale = normalize_scale(req.get("scale", 250))
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
 
-    # cria geometria
-    ee_geom = None
-    if geometry:
+    # valida profundidade(s)
+    if depths is not None:
         try:
-            ee_geom = geojson_to_ee_geometry(geometry)
+            depths = normalize_depths(depths)
         except ValueError as e:
             return make_response(jsonify({"detail": str(e)}), 400)
-    elif kml:
+    elif depth not in DEPTH_TO_BAND:
+        return make_response(jsonify({"detail": f"Profundidade inválida. Use uma de: {list(DEPTH_TO_BAND)}"}), 400)
+
+    # cria geometria (normalizada e simplificada na escala da redução)
+    with span("geometry"):
         try:
-            coords = kml_to_polygon_coords(kml)
-            ee_geom = ee.Geometry.Polygon(coords)
+            prepared_geom, vertex_info = request_geometry(req, scale)
         except ValueError as e:
             return make_response(jsonify({"detail": str(e)}), 400)
-    else:
-        return make_response(jsonify({"detail": "Forneça geometry (GeoJSON) ou kml (string)."}), 400)
 
-    # imagem alvo
+    if backend == "local":
+        try:
+            with span("local_read"):
+                stats = local_clay_stats_depths(prepared_geom, depths) if depths else local_clay_stats(prepared_geom, depth)
+        except (OSError, ValueError) as e:
+            return make_response(jsonify({"detail": f"Erro no backend local de solo: {e}"}), 500)
+        response = {
+            **({"depths": depths} if depths else {"depth": depth}),
+            "backend": "local",
+            "scale_m": None,  # resolução nativa do raster local
+            "metrics": stats,
+            "geometry_vertices": vertex_info,
+        }
+        return make_response(jsonify(response), 200)
+
+    # imagem alvo (uma banda por profundidade quando "depths" é usado)
     try:
-        clay_img = get_clay_image(depth)
+        ee_geom = geojson_to_ee_geometry(prepared_geom)
+        clay_img = get_clay_image_depths(depths) if depths else get_clay_image(depth)
     except Exception as e:
         return make_response(jsonify({"detail": f"Erro ao selecionar banda: {e}"}), 400)
 
-    # cálculo
+    # cálculo: escala/tileScale escolhidos pela área, mais grossos em caso de erro de memória/timeout
+    # (substitui o bestEffort, que mudava a escala sem informar)
+    plan = reduction_plan(geometry_area_m2(prepared_geom), vertex_info["simplified"], scale, base_tile_scale=1)
     try:
-        stats = clay_stats(clay_img, ee_geom, scale)
+        with span("reduce_region"):
+            if depths:
+                stats, reduction = run_adaptive(
+                    lambda scale, tile_scale: clay_stats_depths(clay_img, ee_geom, depths, scale, tile_scale), plan)
+            else:
+                stats, reduction = run_adaptive(
+                    lambda scale, tile_scale: clay_stats(clay_img, ee_geom, scale, tile_scale), plan)
+    except EEQuotaExceeded:
+        raise
     except Exception as e:
         return make_response(jsonify({"detail": f"Erro ao calcular estatísticas: {e}"}), 500)
 
     response = {
-        "depth": depth,
-        "scale_m": scale,
+        **({"depths": depths} if depths else {"depth": depth}),
+        "backend": "ee",
+        "scale_m": reduction["scale_m"],
         "metrics": stats,
+        "geometry_vertices": vertex_info,
+        "reduction": reduction,
     }
 
     return make_response(jsonify(response), 200)
 
+# --------------------------------------------------------
+# Perfil de solo: propriedades × profundidades numa só redução
+# --------------------------------------------------------
+@app.route("/soil/profile", methods=["POST"])
+@requires_ee_backend
+def compute_soil_profile():
+    """
+    Corpo: geometry/kml/kmz, properties ("all" ou lista de SOIL_PROPERTIES),
+    depths ("all" ou lista de DEPTH_TO_BAND), scale (m, padrão 250), backend ("ee" ou "local").
+    Resposta: "metrics" {propriedade: {profundidade: {mean, min, max}}} e
+    "columns" (arrays paralelos property/depth/unit/mean/min/max).
+    """
+    try:
+        req = read_request_body(request)
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+    except Exception:
+        return make_response(jsonify({"detail": "JSON inválido no corpo da requisição."}), 400)
+
+    backend = request_backend()
+    if backend not in SOIL_BACKENDS:
+        return make_response(jsonify({"detail": f"backend inválido. Use um de: {list(SOIL_BACKENDS)}"}), 400)
+    try:
+        scale = normalize_scale(req.get("scale", 250))
+        properties = normalize_properties(req.get("properties", "all"))
+        depths = normalize_depths(req.get("depths", "all"))
+    except ValueError as e:
+        return make_response(jsonify({"detail": str(e)}), 400)
+
+    with span("geometry"):
+        try:
+            prepared_geom, vertex_info = request_geometry(req, scale)
+        except ValueError as e:
+            return make_response(jsonify({"detail": str(e)}), 400)
+
+    if backend == "local":
+        try:
+            with span("local_read"):
+                nested = local_soil.profile_stats(prepared_geom, properties, depths)
+        except (OSError, ValueError) as e:
+            return make_response(jsonify({"detail": f"Erro no backend local de solo: {e}"}), 500)
+        reduction = None
+    else:
+        try:
+            nested, reduction = _ee_profile(prepared_geom, vertex_info, properties, depths, scale)
+        except EEQuotaExceeded:
+            raise
+        except ValueError as e:
+            return make_response(jsonify({"detail": str(e)}), 400)
+        except Exception as e:
+            return make_response(jsonify({"detail": f"Erro ao calcular estatísticas: {e}"}), 500)
+
+    response = {
+        "properties": properties,
+        "depths": depths,
+        "units": {prop: SOIL_PROPERTIES[prop]['unit'] for prop in properties},
+        "backend": backend,
+        "scale_m": reduction["scale_m"] if reduction else None,
+        "metrics": nested,
+        "columns": columnar_profile(nested),
+        "geometry_vertices": vertex_info,
+        **({"reduction": reduction} if reduction else {}),
+    }
+    return make_response(jsonify(response), 200)
+
+def _ee_profile(prepared_geom, vertex_info, properties, depths, scale):
+    ee_geom = geojson_to_ee_geometry(prepared_geom)
+    image = get_soil_image(properties, depths)
+    plan = reduction_plan(geometry_area_m2(prepared_geom), vertex_info["simplified"], scale, base_tile_scale=1)
+    with span("reduce_region"):
+        return run_adaptive(
+            lambda scale, tile_scale: soil_profile_stats(image, ee_geom, properties, depths, scale, tile_scale),
+            plan)
+
+
+# --------------------------------------------------------
+# Cota do Earth Engine (ver ee_throttle.py)
+# --------------------------------------------------------
+register_gauge("ee_throttle_retried", "getInfo attempts retried after a quota error.",
+               lambda: ee_executor.stats()["retried"])
+register_gauge("ee_throttle_throttled", "getInfo calls delayed by the rate/concurrency limits.",
+               lambda: ee_executor.stats()["throttled"])
+
+@app.route("/ee/stats", methods=["GET"])
+def ee_stats():
+    return make_response(jsonify(ee_executor.stats()), 200)
+
+@app.errorhandler(EEQuotaExceeded)
+def ee_quota_exceeded(e):
+    # tentativas esgotadas por cota do EE: 429 para o cliente recuar em vez de 500
+    resp = make_response(jsonify({"detail": str(e)}), 429)
+    resp.headers["Retry-After"] = str(int(e.retry_after))
+    return resp
+
+
+startup_clock.mark("import")
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8001, debug=True)
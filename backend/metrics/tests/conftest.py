@@ -0,0 +1,6 @@
+# tests/conftest.py
+# the service modules import each other flat (from geometry_utils import ...), like when run from backend/metrics
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+# tests/test_ee_throttle.py
+import pytest
+
+import ee_throttle
+from ee_throttle import EEQuotaExceeded, EEThrottle
+
+
+class FlakyCall:
+    """Falha com o erro de cota do EE nas primeiras `failures` chamadas."""
+
+    def __init__(self, failures, message="Too many concurrent aggregations."):
+        self.failures, self.message, self.calls = failures, message, 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise Exception(self.message)
+        return {"ok": True}
+
+
+@pytest.fixture
+def max_jitter(monkeypatch):
+    # full jitter no teto: backoff(attempt) == min(max_delay, base * 2^attempt)
+    monkeypatch.setattr(ee_throttle.random, "uniform", lambda lo, hi: hi)
+
+
+def make_throttle(sleeps, **kwargs):
+    return EEThrottle(rate=0, max_concurrent=1, base_delay=1, max_delay=4, sleep=sleeps.append, **kwargs)
+
+
+def test_retries_quota_errors_with_backoff(max_jitter):
+    sleeps = []
+    throttle = make_throttle(sleeps, max_retries=5)
+    fn = FlakyCall(3)
+
+    assert throttle.call(fn) == {"ok": True}
+    assert fn.calls == 4
+    assert sleeps == [1, 2, 4]
+    stats = throttle.stats()
+    assert (stats["calls"], stats["retried"], stats["succeeded"], stats["failed"]) == (1, 3, 1, 0)
+
+
+def test_backoff_is_capped(max_jitter):
+    sleeps = []
+    throttle = make_throttle(sleeps, max_retries=5)
+    throttle.call(FlakyCall(5))
+    assert sleeps == [1, 2, 4, 4, 4]
+
+
+def test_raises_quota_exceeded_when_retries_run_out(max_jitter):
+    sleeps = []
+    throttle = make_throttle(sleeps, max_retries=2)
+    fn = FlakyCall(10)
+
+    with pytest.raises(EEQuotaExceeded) as excinfo:
+        throttle.call(fn)
+    assert fn.calls == 3  # primeira tentativa + max_retries
+    assert sleeps == [1, 2]
+    assert excinfo.value.retry_after == 4
+    assert "3 tentativas" in str(excinfo.value)
+    stats = throttle.stats()
+    assert (stats["retried"], stats["failed"], stats["quota_exhausted"]) == (2, 1, 1)
+
+
+def test_non_quota_errors_are_not_retried():
+    sleeps = []
+    throttle = make_throttle(sleeps)
+    fn = FlakyCall(1, "Image.select: Pattern 'B99' did not match any bands.")
+
+    with pytest.raises(Exception, match="B99"):
+        throttle.call(fn)
+    assert fn.calls == 1
+    assert sleeps == []
@@ -0,0 +1,54 @@
+# tests/test_geometry_utils.py
+import math
+
+import pytest
+
+from geometry_utils import count_vertices, geojson_polygons, normalize_max_vertices, prepare_geometry
+
+SQUARE = [[-47.0, -15.0], [-46.99, -15.0], [-46.99, -14.99], [-47.0, -14.99], [-47.0, -15.0]]
+
+
+def test_square_is_closed_and_counterclockwise():
+    out, info = prepare_geometry({"type": "Polygon", "coordinates": [SQUARE[::-1]]})
+    ring = out["coordinates"][0]
+    assert ring[0] == ring[-1]
+    assert info["original"] == info["simplified"] == 4
+    assert sorted(ring[:4]) == sorted(SQUARE[:4])
+    # área assinada positiva = anti-horário (RFC 7946)
+    assert sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:])) > 0
+
+
+def test_collinear_and_repeated_points_are_dropped():
+    ring = [SQUARE[0], SQUARE[0], [-46.995, -15.0], *SQUARE[1:]]
+    _, info = prepare_geometry({"type": "Polygon", "coordinates": [ring]}, simplify=False)
+    assert info["simplified"] == 4
+
+
+@pytest.mark.parametrize("ring", [
+    [[0.0, 0.0], [0.0, 0.0], [1.0, 1.0], [0.0, 0.0]],  # 2 pontos distintos
+    [[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [0.0, 0.0]],
+])
+def test_degenerate_ring_raises_value_error(ring):
+    with pytest.raises(ValueError):
+        prepare_geometry({"type": "Polygon", "coordinates": [ring]})
+
+
+@pytest.mark.parametrize("value", ["abc", [5], {"n": 1}, True, 10.5, -1])
+def test_invalid_max_vertices_raises_value_error(value):
+    with pytest.raises(ValueError):
+        prepare_geometry({"type": "Polygon", "coordinates": [SQUARE]}, max_vertices=value)
+
+
+def test_max_vertices_accepts_integral_values():
+    assert normalize_max_vertices("500") == 500
+    assert normalize_max_vertices(500.0) == 500
+    assert normalize_max_vertices(None) == 0
+
+
+def test_vertex_budget_is_enforced():
+    circle = [[-47.0 + 0.01 * math.cos(2 * math.pi * i / 400), -15.0 + 0.01 * math.sin(2 * math.pi * i / 400)]
+              for i in range(400)]
+    circle.append(circle[0])
+    out, info = prepare_geometry({"type": "Polygon", "coordinates": [circle]}, max_vertices=20)
+    assert info["original"] == 400
+    assert count_vertices(geojson_polygons(out)) == info["simplified"] <= 20
@@ -0,0 +1,55 @@
+# tests/test_histogram_stats.py
+import math
+
+import numpy as np
+import pytest
+
+from histogram_stats import bin_edges, coefficient_of_variation, iqr, mean_std, percentiles, summarize
+
+
+def test_bin_edges_span_the_range():
+    np.testing.assert_allclose(bin_edges(4, (-1.0, 1.0)), [-1.0, -0.5, 0.0, 0.5, 1.0])
+    np.testing.assert_allclose(bin_edges(3, (-1.0, 2.0)), [-1.0, 0.0, 1.0, 2.0])  # faixa do EVI
+
+
+def test_percentiles_interpolate_inside_the_bin():
+    # bins [0,1) [1,2) [2,3) [3,4): 10 pixels em [1,2) e 10 em [2,3)
+    counts = [0, 10, 10, 0]
+    np.testing.assert_allclose(percentiles(counts, (25, 50, 75, 100), (0.0, 4.0)), [1.5, 2.0, 2.5, 3.0])
+    assert iqr(counts, (0.0, 4.0)) == pytest.approx(1.0)
+
+
+def test_percentiles_accept_fractional_counts():
+    # contagens ponderadas do fixedHistogram (pixels de borda contam pela fração coberta)
+    (median,) = percentiles([0.5, 1.5], (50,), (0.0, 2.0))
+    assert median == pytest.approx(1.0 + (1.0 - 0.5) / 1.5)
+
+
+def test_stacked_histograms_match_row_by_row():
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 50, size=(5, 20))
+    stacked = percentiles(counts, (10, 50, 90))
+    assert stacked.shape == (5, 3)
+    for row, expected in zip(counts, stacked):
+        np.testing.assert_allclose(percentiles(row, (10, 50, 90)), expected)
+
+
+def test_mean_std_from_bin_centers():
+    mean, std = mean_std([1, 0, 0, 1], (0.0, 4.0))  # centros 0.5 e 3.5
+    assert mean == pytest.approx(2.0)
+    assert std == pytest.approx(1.5)
+    assert coefficient_of_variation([1, 0, 0, 1], (0.0, 4.0)) == pytest.approx(0.75)
+
+
+def test_empty_histogram_gives_nan_and_none():
+    assert np.isnan(percentiles([0, 0, 0], (50,))).all()
+    mean, _ = mean_std([0, 0, 0])
+    assert math.isnan(mean)
+    out = summarize({"range": [-1.0, 1.0], "bins": 3, "counts": [0, 0, 0]}, qs=(25, 50))
+    assert out == {"p25": None, "p50": None, "iqr": None, "cv": None}
+
+
+def test_summarize_uses_the_histogram_range():
+    out = summarize({"range": [0.0, 4.0], "bins": 4, "counts": [0, 10, 10, 0]}, qs=(50,))
+    assert out["p50"] == pytest.approx(2.0)
+    assert out["iqr"] == pytest.approx(1.0)
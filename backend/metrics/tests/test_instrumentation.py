@@ -0,0 +1,58 @@
+# tests/test_instrumentation.py
+import time
+
+from flask import Flask, Response, stream_with_context
+
+import instrumentation
+from instrumentation import EE_CALLS_PER_REQUEST, REQUEST_SECONDS, instrument_app, record_ee_call
+
+
+def _series(histogram, endpoint):
+    # [bucket counts..., sum, count] das séries do endpoint
+    return [row for labels, row in histogram._series.items() if labels[0] == endpoint]
+
+
+def test_streamed_response_is_recorded_at_stream_end():
+    app = Flask(__name__)
+    instrument_app(app)
+
+    @app.route("/stream")
+    def stream():
+        def _gen():
+            for i in range(3):
+                time.sleep(0.05)
+                record_ee_call(0.01, {"i": i})
+                yield f"{i}\n"
+        return Response(stream_with_context(_gen()), mimetype="application/x-ndjson")
+
+    resp = app.test_client().get("/stream")
+    assert resp.data == b"0\n1\n2\n"
+    resp.close()
+
+    (calls,) = _series(EE_CALLS_PER_REQUEST, "/stream")
+    assert calls[-2:] == [3, 1]  # sum de chamadas, uma requisição
+    (latency,) = _series(REQUEST_SECONDS, "/stream")
+    assert latency[-1] == 1 and latency[-2] >= 0.15
+
+
+def test_json_results_sized_only_when_sampled_or_debug(monkeypatch):
+    monkeypatch.setattr(instrumentation, "RESPONSE_SIZE_SAMPLE_EVERY", 20)
+    monkeypatch.setenv("EE_RESPONSE_SIZE_SAMPLE_EVERY", "0")  # lido por instrument_app
+    sized = []
+    monkeypatch.setattr(instrumentation.EE_RESPONSE_BYTES, "observe", sized.append)
+    app = Flask(__name__)
+    instrument_app(app)
+
+    @app.route("/calls")
+    def calls():
+        record_ee_call(0.01, {"NDVI_mean": 0.5})
+        return instrumentation.current_trace().header_value()
+
+    client = app.test_client()
+    client.get("/calls").close()
+    assert sized == []
+
+    resp = client.get("/calls", headers={"X-Debug-Timing": "1"})
+    resp.close()
+    assert sized == [len('{"NDVI_mean":0.5}')]
+    assert f"bytes={sized[0]}" in resp.headers["X-Debug-Timing"]
@@ -0,0 +1,82 @@
+# tests/test_kml_parser.py
+import base64
+import io
+import zipfile
+
+import pytest
+
+from kml_parser import kml_to_geojson, kmz_to_geojson, parse_query_fields, stream_to_geojson
+
+NS = 'xmlns="http://www.opengis.net/kml/2.2"'
+SQUARE = "0,0,0 1,0,0 1,1,0 0,1,0 0,0,0"
+HOLE = "0.2,0.2 0.2,0.4 0.4,0.4 0.4,0.2 0.2,0.2"
+
+
+def polygon(outer, *holes):
+    inner = "".join(f"<innerBoundaryIs><LinearRing><coordinates>{h}</coordinates></LinearRing></innerBoundaryIs>"
+                    for h in holes)
+    return (f"<Polygon><outerBoundaryIs><LinearRing><coordinates>{outer}</coordinates></LinearRing>"
+            f"</outerBoundaryIs>{inner}</Polygon>")
+
+
+def kml(*placemarks):
+    return f"<kml {NS}><Document>" + "".join(f"<Placemark>{p}</Placemark>" for p in placemarks) + "</Document></kml>"
+
+
+def test_polygon_with_hole():
+    out = kml_to_geojson(kml(polygon(SQUARE, HOLE)))
+    assert out["type"] == "Polygon"
+    outer, hole = out["coordinates"]
+    assert outer == [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+    assert hole[0] == hole[-1] == [0.2, 0.2]
+
+
+def test_every_placemark_becomes_a_multipolygon_member():
+    shifted = "5,0 6,0 6,1 5,1"  # anel aberto: é fechado pelo parser
+    out = kml_to_geojson(kml(polygon(SQUARE), f"<MultiGeometry>{polygon(shifted)}</MultiGeometry>"))
+    assert out["type"] == "MultiPolygon"
+    assert len(out["coordinates"]) == 2
+    assert out["coordinates"][1][0][-1] == [5, 0]
+
+
+@pytest.mark.parametrize("geometry", [
+    f"<LineString><coordinates>{SQUARE}</coordinates></LineString>",
+    f"<LinearRing><coordinates>{SQUARE}</coordinates></LinearRing>",
+    f"<coordinates>{SQUARE}</coordinates>",
+])
+def test_coordinates_outside_polygon_fall_back_to_exterior_ring(geometry):
+    out = kml_to_geojson(kml(geometry))
+    assert out == {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+
+
+def test_polygons_win_over_the_fallback():
+    line = "<LineString><coordinates>9,9 10,9 10,10</coordinates></LineString>"
+    out = kml_to_geojson(kml(line, polygon(SQUARE)))
+    assert out["type"] == "Polygon" and out["coordinates"][0][0] == [0, 0]
+
+
+def test_invalid_documents_raise_value_error():
+    with pytest.raises(ValueError):
+        kml_to_geojson("<kml><Document>")
+    with pytest.raises(ValueError):
+        kml_to_geojson(kml("<Point><coordinates>1,1</coordinates></Point>"))  # menos de 3 vértices
+    with pytest.raises(ValueError):
+        kml_to_geojson(kml("<name>sem geometria</name>"))
+
+
+def test_request_body_stream_kml_and_kmz():
+    doc = kml(polygon(SQUARE, HOLE))
+    expected = kml_to_geojson(doc)
+    assert stream_to_geojson(io.BytesIO(doc.encode()), "kml") == expected
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("doc.kml", doc)
+    assert stream_to_geojson(io.BytesIO(buf.getvalue()), "kmz") == expected
+    assert kmz_to_geojson(base64.b64encode(buf.getvalue()).decode()) == expected
+
+
+def test_query_fields_decode_json_values():
+    fields = parse_query_fields({"start_date": "2024-01-01", "timeseries": "true", "indices": '["NDVI"]',
+                                 "max_images": "10"})
+    assert fields == {"start_date": "2024-01-01", "timeseries": True, "indices": ["NDVI"], "max_images": 10}
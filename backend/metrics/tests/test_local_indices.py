@@ -0,0 +1,111 @@
+# tests/test_local_indices.py
+"""
+Parity of the offline NumPy backend with the EE backend of agro_metrics.calc_indices_from_image.
+
+Both evaluate index_formulas.INDEX_FORMULAS; the EE side is exercised through
+ImageBands/ImageExpr over an image stand-in whose add/subtract/multiply/divide
+compute in float64, so the test checks the method chain EE receives, not a
+copy of the formulas.
+"""
+import numpy as np
+import pytest
+
+from index_formulas import INDEX_BANDS, INDEX_FORMULAS, ImageBands
+from local_indices import (INDEX_NAMES, S2_BANDS, calc_indices_from_array, median_composite, polygon_mask,
+                           reduce_array_over_region)
+
+# raw L2A digital numbers per pixel, one dict per pixel (2 x 2 image)
+PIXELS = [
+    {"B2": 400, "B3": 700, "B4": 600, "B5": 1200, "B6": 2200, "B7": 2600, "B8": 3000, "B8A": 3100, "B11": 1800, "B12": 900},
+    {"B2": 300, "B3": 550, "B4": 350, "B5": 900, "B6": 2600, "B7": 3100, "B8": 3600, "B8A": 3650, "B11": 1500, "B12": 700},
+    {"B2": 900, "B3": 1100, "B4": 1300, "B5": 1500, "B6": 1700, "B7": 1800, "B8": 1900, "B8A": 1950, "B11": 2400, "B12": 2100},
+    {"B2": 0, "B3": 0, "B4": 0, "B5": 0, "B6": 0, "B7": 0, "B8": 0, "B8A": 0, "B11": 0, "B12": 0},  # divisões por zero
+]
+
+
+class FakeImage:
+    """Stand-in de ee.Image: bandas float64 e os métodos que as fórmulas usam (sem EE)."""
+
+    def __init__(self, bands):
+        self.bands = bands
+
+    def select(self, name):
+        return FakeImage({name: self.bands[name]})
+
+    def _apply(self, other, fn):
+        value = next(iter(other.bands.values())) if isinstance(other, FakeImage) else other
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return FakeImage({k: fn(v, value) for k, v in self.bands.items()})
+
+    def add(self, other):
+        return self._apply(other, np.add)
+
+    def subtract(self, other):
+        return self._apply(other, np.subtract)
+
+    def multiply(self, other):
+        return self._apply(other, np.multiply)
+
+    def divide(self, other):
+        return self._apply(other, np.divide)
+
+
+def ee_backend(name):
+    """Valor de um índice pelo caminho do EE (ImageBands -> ImageExpr -> métodos da imagem)."""
+    img = FakeImage({b: np.array([px[b] for px in PIXELS], dtype=np.float64) / 10000.0 for b in S2_BANDS})
+    (values,) = INDEX_FORMULAS[name](ImageBands(img)).image.bands.values()
+    return values
+
+
+def stack():
+    raw = np.array([[[PIXELS[0][b], PIXELS[1][b]], [PIXELS[2][b], PIXELS[3][b]]] for b in S2_BANDS], dtype=np.float32)
+    return raw / np.float32(10000.0)
+
+
+def test_every_index_has_formula_and_bands():
+    assert INDEX_NAMES == list(INDEX_BANDS) == list(INDEX_FORMULAS)
+
+
+def test_indices_match_ee_backend():
+    out = calc_indices_from_array(stack())
+    assert out.shape == (len(INDEX_NAMES), 2, 2)
+    for i, name in enumerate(INDEX_NAMES):
+        expected = ee_backend(name)
+        for p, (row, col) in enumerate([(0, 0), (0, 1), (1, 0)]):
+            assert out[i, row, col] == pytest.approx(expected[p], abs=1e-5), (name, p)
+    # B8 + B4 == 0: o EE mascara o pixel; aqui vira NaN
+    assert np.isnan(out[:, 1, 1][[0, 2, 3, 4, 5, 6, 7]]).all()
+
+
+def test_indices_subset_in_requested_order():
+    out = calc_indices_from_array(stack(), ["NDRE", "NDVI"])
+    full = calc_indices_from_array(stack())
+    np.testing.assert_array_equal(out, full[[INDEX_NAMES.index("NDRE"), INDEX_NAMES.index("NDVI")]])
+
+
+def test_median_composite_ignores_missing_dates():
+    series = np.stack([stack(), stack() * 3, np.full_like(stack(), np.nan)])
+    np.testing.assert_allclose(median_composite(series), stack() * 2, rtol=1e-6)
+
+
+def test_reduce_matches_ee_stats_over_polygon():
+    # pixel de 1 grau, origem em (0, 2): o polígono cobre a linha de cima inteira e o pixel (1, 0)
+    transform = (1.0, 0.0, 0.0, 0.0, -1.0, 2.0)
+    geom = {"type": "Polygon", "coordinates": [[[0, 2], [2, 2], [2, 1], [1, 1], [1, 0], [0, 0], [0, 2]]]}
+    mask = polygon_mask(geom, transform, (2, 2))
+    assert mask.tolist() == [[True, True], [True, False]]
+
+    stats = reduce_array_over_region(calc_indices_from_array(stack()), mask)[0]
+    for name in INDEX_NAMES:
+        values = ee_backend(name)[:3]
+        # ee.Reducer.stdDev é o desvio populacional
+        assert stats[f"{name}_mean"] == pytest.approx(values.mean(), abs=1e-5)
+        assert stats[f"{name}_median"] == pytest.approx(np.median(values), abs=1e-5)
+        assert stats[f"{name}_stdDev"] == pytest.approx(values.std(), abs=1e-5)
+    # chaves ordenadas, como reduceRegion().getInfo()
+    assert list(stats) == sorted(stats)
+
+
+def test_reduce_empty_mask_returns_none():
+    stats = reduce_array_over_region(calc_indices_from_array(stack()), np.zeros((2, 2), dtype=bool))[0]
+    assert all(v is None for v in stats.values())
@@ -0,0 +1,75 @@
+# tests/test_local_soil.py
+import json
+
+import numpy as np
+import pytest
+
+from local_soil import LocalSoilBackend
+
+DEPTHS = ["0-5cm", "5-15cm", "15-30cm"]
+PIXEL = 0.01
+TRANSFORM = [PIXEL, 0, -48.0, 0, -PIXEL, -15.0]
+NODATA = -1
+
+
+@pytest.fixture
+def raster(tmp_path):
+    rng = np.random.default_rng(7)
+    values = rng.integers(5, 60, size=(len(DEPTHS), 40, 50), dtype=np.int16)
+    values[:, 10:13, 20:24] = NODATA
+    np.save(tmp_path / "clay.npy", values)
+    with open(tmp_path / "clay.npy.json", "w", encoding="utf-8") as f:
+        json.dump({"transform": TRANSFORM, "nodata": NODATA}, f)
+    return tmp_path, values
+
+
+def brute_force(values, geojson, scale_factor=1.0):
+    """Pixel a pixel: centro dentro do polígono (ray casting), nodata fora, mean/min/max."""
+    ring = geojson["coordinates"][0]
+    rows, cols = values.shape[1:]
+    inside = np.zeros((rows, cols), dtype=bool)
+    for r in range(rows):
+        for c in range(cols):
+            x = TRANSFORM[2] + (c + 0.5) * PIXEL
+            y = TRANSFORM[5] - (r + 0.5) * PIXEL
+            hit = False
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    hit = not hit
+            inside[r, c] = hit
+    out = {}
+    for i, depth in enumerate(DEPTHS):
+        v = values[i][inside & (values[i] != NODATA)].astype(np.float64) * scale_factor
+        out[depth] = {"mean": v.mean(), "min": v.min(), "max": v.max()} if v.size else None
+    return out
+
+
+def test_profile_stats_match_brute_force(raster):
+    root, values = raster
+    backend = LocalSoilBackend(str(root), {"clay": {"scale_factor": 1}}, DEPTHS)
+    # triângulo irregular cobrindo parte do bloco de nodata (vértices fora da grade de centros)
+    geom = {"type": "Polygon", "coordinates": [[[-47.8713, -15.0417], [-47.6129, -15.0931], [-47.7234, -15.3321],
+                                                [-47.8713, -15.0417]]]}
+
+    stats = backend.profile_stats(geom, ["clay"], ["0-5cm", "15-30cm"])["clay"]
+
+    expected = brute_force(values, geom)
+    assert list(stats) == ["0-5cm", "15-30cm"]
+    for depth in stats:
+        for k in ("mean", "min", "max"):
+            assert stats[depth][k] == pytest.approx(expected[depth][k], abs=1e-9)
+
+
+def test_scale_factor_and_outside_raster(raster):
+    root, values = raster
+    backend = LocalSoilBackend(str(root), {"clay": {"scale_factor": 0.1}}, DEPTHS)
+    square = {"type": "Polygon", "coordinates": [[[-47.9, -15.1], [-47.8, -15.1], [-47.8, -15.2], [-47.9, -15.2],
+                                                  [-47.9, -15.1]]]}
+    stats = backend.profile_stats(square, ["clay"], DEPTHS)["clay"]
+    expected = brute_force(values, square, 0.1)
+    for depth in DEPTHS:
+        assert stats[depth]["mean"] == pytest.approx(expected[depth]["mean"], abs=1e-9)
+
+    far = {"type": "Polygon", "coordinates": [[[10, 10], [11, 10], [11, 11], [10, 10]]]}
+    assert backend.profile_stats(far, ["clay"], ["0-5cm"])["clay"]["0-5cm"] == {"mean": None, "min": None,
+                                                                               "max": None}
@@ -0,0 +1,97 @@
+# tests/test_pixel_cache.py
+import numpy as np
+import pytest
+
+from pixel_cache import NODATA, PixelCache, download_pixels, local_stats
+
+BANDS = ["NDVI", "EVI"]
+# pixel de 0.1 grau, canto superior esquerdo em (-47, -15)
+TRANSFORM = (0.1, 0.0, -47.0, 0.0, -0.1, -15.0)
+
+
+def known_stack(shape=(7, 10)):
+    rng = np.random.default_rng(42)
+    stack = rng.uniform(-0.2, 0.9, size=(len(BANDS),) + shape).astype(np.float32)
+    stack[1] *= 1.8  # EVI passa de 1
+    return stack
+
+
+class ComputePixels:
+    """Stand-in do ee.data.computePixels: recorta o tile pedido de um array conhecido."""
+
+    def __init__(self, stack):
+        self.stack, self.requests = stack, []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        grid = request["grid"]
+        a = grid["affineTransform"]
+        col = int(round((a["translateX"] - TRANSFORM[2]) / TRANSFORM[0]))
+        row = int(round((a["translateY"] - TRANSFORM[5]) / TRANSFORM[4]))
+        h, w = grid["dimensions"]["height"], grid["dimensions"]["width"]
+        tile = np.zeros((h, w), dtype=[(b, "<f4") for b in request["bandIds"]])
+        for i, band in enumerate(BANDS):
+            if band in request["bandIds"]:
+                tile[band] = self.stack[i, row:row + h, col:col + w]
+        return tile
+
+
+def test_download_pixels_reassembles_tiles():
+    stack = known_stack()
+    stack[0, 2, 3] = NODATA  # pixel mascarado pelo EE
+    compute = ComputePixels(stack)
+
+    out = download_pixels(compute, "expr", BANDS, TRANSFORM, stack.shape[1:], tile_size=4)
+
+    assert len(compute.requests) == 2 * 3  # 7x10 em tiles de 4x4
+    assert {r["fileFormat"] for r in compute.requests} == {"NUMPY_NDARRAY"}
+    assert out.shape == stack.shape
+    assert np.isnan(out[0, 2, 3])
+    expected = stack.copy()
+    expected[0, 2, 3] = np.nan
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_local_stats_match_masked_numpy():
+    stack = known_stack()
+    stack[1, 5, 8] = np.nan  # sem dado dentro da máscara
+    stack[0, 2, 4] = 1.0  # == limite superior do NDVI: fora do histograma, como no fixedHistogram
+    mask = np.zeros(stack.shape[1:], dtype=bool)
+    mask[1:6, 2:9] = True
+    zone = {"type": "Polygon", "coordinates": [[[-46.8, -15.1], [-46.5, -15.1], [-46.5, -15.4], [-46.8, -15.4],
+                                                [-46.8, -15.1]]]}
+    ranges = {"NDVI": (-1.0, 1.0), "EVI": (-1.0, 2.0)}
+
+    out = local_stats(stack, mask, {"bands": BANDS, "transform": list(TRANSFORM)}, zones=[("z1", zone)],
+                      histogram=10, value_ranges=ranges)
+
+    zone_mask = np.zeros_like(mask)
+    zone_mask[1:4, 2:5] = True
+    for i, band in enumerate(BANDS):
+        values = stack[i][mask]
+        values = values[np.isfinite(values)].astype(np.float64)
+        assert out["metrics"][f"{band}_mean"] == pytest.approx(values.mean(), abs=1e-6)
+        assert out["metrics"][f"{band}_median"] == pytest.approx(np.median(values), abs=1e-6)
+        assert out["metrics"][f"{band}_stdDev"] == pytest.approx(values.std(), abs=1e-6)
+        zone_values = stack[i][zone_mask].astype(np.float64)
+        assert out["zones"]["z1"][f"{band}_mean"] == pytest.approx(zone_values.mean(), abs=1e-6)
+
+        hist = out["histograms"][band]
+        assert hist["range"] == list(ranges[band])
+        in_range = values[values < ranges[band][1]]  # bins em [lo, hi)
+        assert hist["counts"] == np.histogram(in_range, bins=10, range=ranges[band])[0].tolist()
+    assert sum(out["histograms"]["NDVI"]["counts"]) == np.isfinite(stack[0][mask]).sum() - 1
+
+
+def test_pixel_cache_roundtrip(tmp_path):
+    cache = PixelCache(str(tmp_path / "pixels"))
+    stack = known_stack()
+    mask = np.ones(stack.shape[1:], dtype=bool)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert not (tmp_path / "pixels").exists()  # criado só na primeira gravação
+
+    cache.put("k", stack, mask, {"bands": BANDS, "transform": list(TRANSFORM)})
+    data, cached_mask, meta = cache.get("k")
+    np.testing.assert_array_equal(data, stack)
+    assert cached_mask.all() and meta["shape"] == list(stack.shape)
@@ -0,0 +1,89 @@
+# tests/test_result_cache.py
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from result_cache import ResultCache
+
+PAST = "2020-01-31"
+
+
+def test_past_window_never_expires():
+    cache = ResultCache()
+    cache.put("k", {"metrics": {}}, PAST, {"scale_m": 10, "tile_scale": 4, "attempts": 1})
+    assert cache._mem["k"][0] is None
+    assert cache.get("k") == {"metrics": {}}
+
+
+def test_degraded_result_gets_short_ttl(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), degraded_ttl=60)
+    reduction = {"scale_m": 40, "tile_scale": 16, "attempts": 3}
+    cache.put("ab12", {"metrics": {}, "reduction": reduction}, PAST, reduction)
+    expires_at = cache._mem["ab12"][0]
+    assert expires_at is not None
+    assert cache.stats()["degraded_stores"] == 1
+
+    with open(os.path.join(str(tmp_path), "ab", "ab12.json"), encoding="utf-8") as f:
+        entry = json.load(f)
+    assert entry["expires_at"] == expires_at
+    assert entry["reduction"] == reduction
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"v": 1}, PAST)
+    cache.put("b", {"v": 2}, PAST)
+    assert cache.get("a") == {"v": 1}  # "a" passa a ser o mais recente
+    cache.put("c", {"v": 3}, PAST)
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+
+
+def test_hit_miss_and_expired_counters(monkeypatch):
+    cache = ResultCache(recent_ttl=60)
+    cache.put("k", {"v": 1}, date.today().isoformat())
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("other") is None
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 2, 1)
+    assert stats["hit_ratio"] == 1 / 3
+
+
+def test_recent_window_gets_recent_ttl():
+    cache = ResultCache(recent_ttl=120)
+    before = time.time()
+    cache.put("k", {"v": 1}, date.today().isoformat())
+    assert before + 120 <= cache._mem["k"][0] <= time.time() + 120
+
+    settling = ResultCache(settle_days=3)
+    assert settling.expires_at((date.today() - timedelta(days=2)).isoformat()) is not None
+    assert settling.expires_at((date.today() - timedelta(days=4)).isoformat()) is None
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).put("cd34", {"v": 1}, PAST)
+
+    cache = ResultCache(disk_dir=str(tmp_path))
+    assert cache.get("cd34") == {"v": 1}
+    assert cache.get("cd34") == {"v": 1}  # segunda leitura já vem da memória
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 0)
+
+
+def test_expired_disk_entry_is_removed(tmp_path, monkeypatch):
+    cache = ResultCache(disk_dir=str(tmp_path), recent_ttl=60)
+    cache.put("ef56", {"v": 1}, date.today().isoformat())
+    path = os.path.join(str(tmp_path), "ef", "ef56.json")
+    assert os.path.exists(path)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert ResultCache(disk_dir=str(tmp_path)).get("ef56") is None
+    assert not os.path.exists(path)